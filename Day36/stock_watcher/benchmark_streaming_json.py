@@ -0,0 +1,150 @@
+"""
+Benchmark: `response.json()` + parse_series() vs. the streaming parser (parse_series_stream()).
+
+Writes a full-history TIME_SERIES_DAILY fixture (same layout as Alpha Vantage's, several MB),
+serves it from a local HTTP stand-in and measures, for the newest bars the watcher needs,
+the latency, the peak Python memory (tracemalloc) and the bytes read from the socket.
+
+Usage:
+    python benchmark_streaming_json.py [number_of_bars] [rounds]
+"""
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import requests
+
+import repo_root
+from common.json_stream import STREAM_CHUNK_SIZE
+
+from market_data import EQUITY, parse_series, parse_series_stream
+from move_detector import DEFAULT_BARS
+
+
+def write_fixture(path, number_of_bars):
+    """Writes a daily series, newest bar first, like outputsize=full."""
+    random.seed(36)
+    price = 100.0
+    series = {}
+    day = date(2025, 1, 31)
+    for _ in range(number_of_bars):
+        price *= 1 + random.gauss(0, 0.02)
+        series[day.isoformat()] = {
+            "1. open": f"{price * 0.99:.4f}",
+            "2. high": f"{price * 1.02:.4f}",
+            "3. low": f"{price * 0.97:.4f}",
+            "4. close": f"{price:.4f}",
+            "5. volume": str(random.randint(1_000_000, 90_000_000)),
+        }
+        day -= timedelta(days=1)
+    document = {
+        "Meta Data": {
+            "1. Information": "Daily Prices (open, high, low, close) and Volumes",
+            "2. Symbol": "BENCH",
+            "3. Last Refreshed": date(2025, 1, 31).isoformat(),
+            "4. Output Size": "Full size",
+            "5. Time Zone": "US/Eastern",
+        },
+        "Time Series (Daily)": series,
+    }
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(document, file, indent=4)
+
+
+def start_stand_in(path):
+    """Serves the fixture over HTTP (in 64 KB writes, like a real chunked download) in a background thread."""
+    with open(path, "rb") as file:
+        body = file.read()
+
+    class StandInHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            try:
+                for start in range(0, len(body), STREAM_CHUNK_SIZE):
+                    self.wfile.write(body[start:start + STREAM_CHUNK_SIZE])
+            except (BrokenPipeError, ConnectionResetError):
+                pass    # The streaming client stopped reading early
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/query"
+
+
+class CountingChunks:
+    """Wraps a chunk iterator and counts the bytes taken from it."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.bytes_read = 0
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            self.bytes_read += len(chunk)
+            yield chunk
+
+
+def full_parse(session, url, bars):
+    response = session.get(url)
+    response.raise_for_status()
+    dates, closes = parse_series(response.json(), EQUITY, max_bars=bars)
+    return dates, closes, len(response.content)
+
+
+def streaming_parse(session, url, bars):
+    with session.get(url, stream=True) as response:
+        response.raise_for_status()
+        counted = CountingChunks(response.iter_content(STREAM_CHUNK_SIZE))
+        dates, closes = parse_series_stream(counted, EQUITY, max_bars=bars)
+    return dates, closes, counted.bytes_read
+
+
+def measure(parse, session, url, bars, rounds):
+    """Returns (average ms, peak MB, bytes read, closes) over the rounds."""
+    elapsed = 0.0
+    peak = 0
+    for _ in range(rounds):
+        tracemalloc.start()
+        start = time.perf_counter()
+        dates, closes, bytes_read = parse(session, url, bars)
+        elapsed += time.perf_counter() - start
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return elapsed / rounds * 1000, peak / 1024 / 1024, bytes_read, closes
+
+
+if __name__ == "__main__":
+    number_of_bars = int(sys.argv[1]) if len(sys.argv) > 1 else 25000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    bars = DEFAULT_BARS + 1
+
+    with tempfile.TemporaryDirectory() as directory:
+        fixture = os.path.join(directory, "time_series_daily_full.json")
+        write_fixture(fixture, number_of_bars)
+        size = os.path.getsize(fixture)
+        server, url = start_stand_in(fixture)
+        session = requests.Session()
+
+        full_ms, full_mb, full_bytes, full_closes = measure(full_parse, session, url, bars, rounds)
+        stream_ms, stream_mb, stream_bytes, stream_closes = measure(streaming_parse, session, url, bars, rounds)
+        server.shutdown()
+
+    assert (full_closes == stream_closes).all()
+    print(f"📊 Newest {bars} of {number_of_bars} daily bars from a {size / 1024 / 1024:.1f} MB response "
+          f"({rounds} rounds)")
+    print(f"   response.json():  {full_ms:8.2f} ms  peak {full_mb:7.2f} MB  read {full_bytes / 1024:9.0f} KB")
+    print(f"   Streaming parser: {stream_ms:8.2f} ms  peak {stream_mb:7.2f} MB  read {stream_bytes / 1024:9.0f} KB")
+    print(f"   {full_ms / stream_ms:.1f}x faster, {full_mb / stream_mb:.1f}x less memory")
@@ -0,0 +1,154 @@
+from datetime import date
+import os
+import tempfile
+import time
+import numpy as np
+
+from market_data import fetch_series
+
+DEFAULT_HISTORY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "history")
+
+# One fixed-size record per daily bar, appended to one binary file per symbol
+RECORD_DTYPE = np.dtype([("date", "<M8[D]"), ("close", "<f8")])
+
+# A compact response holds the latest 100 bars: with a longer gap (~100 trading days) the full history is needed
+COMPACT_COVERAGE_DAYS = 100
+# Symbols updated less than 6 hours ago are not requested again
+DEFAULT_MAX_AGE_SECONDS = 6 * 60 * 60
+
+
+class HistoryStore:
+    """
+    This class keeps the daily closes of every symbol on disk (one memory-mapped binary file per symbol),
+    so each run only downloads the compact series and merges in the bars it doesn't have yet.
+    """
+
+    def __init__(self, directory=None, max_age_seconds=None):
+        """
+        Initializes the store.
+
+        Args:
+            directory (str): Folder for the symbol files. Defaults to STOCK_HISTORY_DIR or ./history.
+            max_age_seconds (float): Symbols refreshed more recently are not requested again.
+                Defaults to STOCK_HISTORY_MAX_AGE_HOURS or 6 hours.
+        """
+        self.directory = directory or os.getenv("STOCK_HISTORY_DIR", DEFAULT_HISTORY_DIR)
+        if max_age_seconds is None:
+            max_age_seconds = float(os.getenv("STOCK_HISTORY_MAX_AGE_HOURS", DEFAULT_MAX_AGE_SECONDS / 3600)) * 3600
+        self.max_age_seconds = max_age_seconds
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, symbol, kind):
+        """Returns the file used for a symbol, e.g. history/equity-TSLA.bin"""
+        return os.path.join(self.directory, f"{kind}-{symbol.upper()}.bin")
+
+    def load(self, symbol, kind):
+        """
+        Maps the stored bars of a symbol (read-only, nothing is copied until used).
+
+        Returns:
+            tuple: (dates, closes) arrays, oldest first (empty if nothing is stored).
+        """
+        path = self._path(symbol, kind)
+        # A partially written last record (e.g. crash during append) is ignored
+        count = os.path.getsize(path) // RECORD_DTYPE.itemsize if os.path.exists(path) else 0
+        if count == 0:
+            return np.empty(0, dtype="datetime64[D]"), np.empty(0, dtype=np.float64)
+        records = np.memmap(path, dtype=RECORD_DTYPE, mode="r", shape=(count,))
+        return records["date"], records["close"]
+
+    def is_fresh(self, symbol, kind):
+        """Returns True if the symbol was refreshed within max_age_seconds."""
+        path = self._path(symbol, kind)
+        return os.path.exists(path) and time.time() - os.path.getmtime(path) < self.max_age_seconds
+
+    def merge(self, symbol, kind, dates, closes):
+        """
+        Merges downloaded bars into the symbol's file.
+        Newer bars are appended and the last stored bar is overwritten (today's close may have changed);
+        older bars (a backfill) rewrite the file atomically with the union of both.
+
+        Args:
+            symbol (str): Ticker.
+            kind (str): EQUITY or CRYPTO.
+            dates (numpy.ndarray): datetime64[D] dates, oldest first.
+            closes (numpy.ndarray): Closes for those dates.
+
+        Returns:
+            int: Bars that were not stored before.
+        """
+        path = self._path(symbol, kind)
+        stored_dates, stored_closes = self.load(symbol, kind)
+        if len(dates) == 0:
+            return 0
+
+        if len(stored_dates) and dates[0] >= stored_dates[0]:
+            last = stored_dates[-1]
+            newer = dates > last
+            records = np.empty(int(newer.sum()), dtype=RECORD_DTYPE)
+            records["date"], records["close"] = dates[newer], closes[newer]
+            with open(path, "r+b") as file:
+                same_day = np.flatnonzero(dates == last)
+                if len(same_day):
+                    file.seek((len(stored_dates) - 1) * RECORD_DTYPE.itemsize)
+                    np.array([(last, closes[same_day[-1]])], dtype=RECORD_DTYPE).tofile(file)
+                file.seek(len(stored_dates) * RECORD_DTYPE.itemsize)
+                file.truncate()
+                records.tofile(file)
+            return len(records)
+
+        # First download or backfill: rewrite with the union (downloaded values win)
+        all_dates = np.concatenate([dates, stored_dates])
+        all_closes = np.concatenate([closes, stored_closes])
+        unique_dates, first = np.unique(all_dates, return_index=True)
+        records = np.empty(len(unique_dates), dtype=RECORD_DTYPE)
+        records["date"], records["close"] = unique_dates, all_closes[first]
+        added = len(records) - len(stored_dates)
+        del stored_dates, stored_closes    # Release the memory map before replacing the file
+        file_descriptor, temp_path = tempfile.mkstemp(dir=self.directory, prefix=".history_")
+        with os.fdopen(file_descriptor, "wb") as file:
+            records.tofile(file)
+        os.replace(temp_path, path)
+        return added
+
+    def refresh(self, session, symbol, kind, api_key, market="USD", backfill=False):
+        """
+        Brings a symbol up to date with one request: compact (latest 100 bars) normally,
+        full history for a backfill or when the stored data is older than a compact response covers.
+        Nothing is requested if the symbol was refreshed recently.
+
+        Args:
+            session (requests.Session): Session used for the request.
+            symbol (str): Ticker.
+            kind (str): EQUITY or CRYPTO.
+            api_key (str): Alpha Vantage API key.
+            market (str): Quote currency of crypto symbols.
+            backfill (bool): Download the full history even if recent bars are stored.
+
+        Returns:
+            int: New bars stored (0 if nothing was requested).
+        """
+        if not backfill and self.is_fresh(symbol, kind):
+            return 0
+
+        stored_dates, _ = self.load(symbol, kind)
+        since = None
+        outputsize = "full" if backfill else "compact"
+        if len(stored_dates) and not backfill:
+            last = stored_dates[-1].astype(date)
+            since = last.isoformat()
+            if (date.today() - last).days > COMPACT_COVERAGE_DAYS:
+                outputsize = "full"
+        del stored_dates
+
+        dates, closes = fetch_series(session, symbol, kind, api_key, market=market, outputsize=outputsize, since=since)
+        added = self.merge(symbol, kind, dates, closes)
+        # Remember when the symbol was checked, even if there was no new bar
+        if os.path.exists(self._path(symbol, kind)):
+            os.utime(self._path(symbol, kind))
+        return added
+
+    def recent(self, symbol, kind, bars):
+        """Returns (dates, closes) of the newest `bars` stored bars, oldest first."""
+        dates, closes = self.load(symbol, kind)
+        return np.array(dates[-bars:]), np.array(closes[-bars:])
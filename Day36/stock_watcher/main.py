@@ -0,0 +1,246 @@
+from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+import csv
+import os
+import time
+import numpy as np
+
+import repo_root
+from common.lazy_session import LazySession
+
+# requests, the notification sinks and the news index are imported only when they are needed:
+# most runs find a fresh history and no significant move, and end without any request
+from history_store import HistoryStore
+from market_data import STOCK_ENDPOINT, EQUITY, CRYPTO, AlphaVantageError
+from move_detector import (align_closes, detect_moves, DEFAULT_BARS, DEFAULT_THRESHOLD_PERCENT,
+                           TRADING_DAYS_PER_YEAR, CALENDAR_DAYS_PER_YEAR)
+
+NEWS_ENDPOINT = "https://newsapi.org/v2/everything"
+DEFAULT_WATCHLIST = Path(__file__).resolve().parent / "watchlist.csv"
+DEFAULT_FETCH_CONCURRENCY = 4
+DEFAULT_NEWS_CONCURRENCY = 4
+# Some extra articles are requested so there are still 3 left once the ones already sent are removed
+NEWS_PAGE_SIZE = 10
+ARTICLES_PER_SYMBOL = 3
+
+# Load environment variables from .env file
+load_dotenv()
+ALPHAVANTAGE_API_KEY = os.getenv("ALPHAVANTAGE_API_KEY")
+NEWS_API_KEY = os.getenv("NEWS_API_KEY")
+
+
+def load_watchlist():
+    """
+    Reads the symbols to watch.
+    WATCHLIST (e.g. "TSLA,AAPL,XRP:crypto") wins over the CSV file in WATCHLIST_FILE (default watchlist.csv).
+    Entries with an unknown kind (e.g. a typo like "etf") are skipped with a message.
+
+    Returns:
+        list: Dictionaries with "symbol", "name", "kind" and "threshold".
+    """
+    if os.getenv("WATCHLIST"):
+        entries = []
+        for entry in os.getenv("WATCHLIST").split(","):
+            symbol, _, kind = entry.strip().partition(":")
+            if symbol:
+                entries.append({"symbol": symbol.upper(), "name": symbol.upper(),
+                                "kind": (kind or EQUITY).strip().lower(), "threshold": DEFAULT_THRESHOLD_PERCENT})
+    else:
+        with open(os.getenv("WATCHLIST_FILE", DEFAULT_WATCHLIST), newline="", encoding="utf-8") as file:
+            entries = [{
+                "symbol": row["symbol"].strip().upper(),
+                "name": row.get("name") or row["symbol"],
+                "kind": (row.get("kind") or EQUITY).strip().lower(),
+                "threshold": float(row.get("threshold") or DEFAULT_THRESHOLD_PERCENT),
+            } for row in csv.DictReader(file) if row.get("symbol")]
+
+    watchlist = []
+    for item in entries:
+        if item["kind"] not in (EQUITY, CRYPTO):
+            print(f"⚠️ {item['symbol']}: unknown kind '{item['kind']}' (use '{EQUITY}' or '{CRYPTO}'), skipping")
+            continue
+        watchlist.append(item)
+    return watchlist
+
+
+def fetch_all(session, history, watchlist, bars, backfill=False):
+    """
+    Brings the local history of every symbol up to date concurrently (the rate limiter keeps the pace)
+    and reads the newest bars from it. Symbols refreshed recently are read straight from disk.
+
+    Returns:
+        list: (dates, closes) per symbol, None for the symbols without data.
+    """
+    def read(item):
+        dates, closes = history.recent(item["symbol"], item["kind"], bars + 1)
+        return (dates, closes) if len(closes) else None
+
+    stale = [item for item in watchlist if backfill or not history.is_fresh(item["symbol"], item["kind"])]
+    if not stale:
+        return [read(item) for item in watchlist]
+
+    import requests
+
+    def fetch(item):
+        try:
+            added = history.refresh(session, item["symbol"], item["kind"], ALPHAVANTAGE_API_KEY, backfill=backfill)
+            if added:
+                print(f"📥 {item['symbol']}: {added} new bars")
+        except (requests.exceptions.RequestException, AlphaVantageError, ValueError) as e:
+            # The stored history (if any) is still used
+            print(f"❌ {item['symbol']}: {e}")
+        return read(item)
+
+    workers = int(os.getenv("WATCHER_CONCURRENCY", DEFAULT_FETCH_CONCURRENCY))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(fetch, watchlist))
+
+
+def fetch_news(session, company_name, since=None):
+    """
+    Returns the latest articles about a company.
+
+    Args:
+        session (requests.Session): Session used for the request.
+        company_name (str): Searched in the article titles.
+        since (float): Only articles published after this Unix time are requested (all if None).
+
+    Returns:
+        list: The articles, newest first (None on errors).
+    """
+    import requests
+
+    news_params = {
+        "apiKey": NEWS_API_KEY,
+        "qInTitle": company_name,
+        "sortBy": "publishedAt",
+        "language": "en",
+        "pageSize": NEWS_PAGE_SIZE,
+    }
+    if since is not None:
+        news_params["from"] = datetime.fromtimestamp(since, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+    try:
+        response = session.get(NEWS_ENDPOINT, params=news_params)
+        response.raise_for_status()
+        return response.json().get("articles", [])
+    except (requests.exceptions.RequestException, ValueError) as e:
+        print(f"❌ Error fetching news for {company_name}: {e}")
+        return None
+
+
+def fetch_all_news(session, news_index, names):
+    """
+    Queries NewsAPI for every company concurrently (the rate limiter keeps the pace),
+    each query asking only for the articles published since it last ran.
+
+    Returns:
+        list: (articles, query start time) per company, articles is None for the failed queries.
+    """
+    def fetch(name):
+        started = time.time()
+        return fetch_news(session, name, since=news_index.last_fetched(name)), started
+
+    workers = int(os.getenv("NEWS_CONCURRENCY", DEFAULT_NEWS_CONCURRENCY))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(fetch, names))
+
+
+def main(watchlist=None, account_sid_var="TWILIO_SID"):
+    """
+    Refreshes the prices, detects the significant moves and sends the news of the symbols that moved.
+
+    Args:
+        watchlist (list): Symbols to watch, as returned by load_watchlist(). Defaults to load_watchlist().
+        account_sid_var (str): Environment variable holding the Twilio account SID.
+    """
+    # Every API call (Alpha Vantage, NewsAPI, Twilio) goes through the shared rate limiter,
+    # built on the first request. Premium Alpha Vantage keys allow more than the free 5 calls per minute
+    session = LazySession(lambda session: session.rate_limits.configure(
+        STOCK_ENDPOINT, float(os.getenv("ALPHAVANTAGE_REQUESTS_PER_MINUTE", 5)) / 60, burst=1
+    ))
+
+    watchlist = watchlist or load_watchlist()
+    bars = int(os.getenv("WATCHER_BARS", DEFAULT_BARS))
+    print(f"📈 Watching {len(watchlist)} symbols...")
+    # WATCHER_BACKFILL=1 downloads the full history once (e.g. after adding symbols)
+    backfill = os.getenv("WATCHER_BACKFILL", "").lower() in ("1", "true", "yes")
+    series = fetch_all(session, HistoryStore(), watchlist, bars, backfill)
+
+    # Only the symbols that downloaded correctly go into the matrix
+    valid = [index for index, item in enumerate(series) if item is not None]
+    symbols = [watchlist[index] for index in valid]
+    if not symbols:
+        print("❌ No price data retrieved.")
+        return
+
+    closes = align_closes([series[index] for index in valid], bars)
+    thresholds = np.array([item["threshold"] for item in symbols])
+    periods_per_year = np.array([CALENDAR_DAYS_PER_YEAR if item["kind"] == CRYPTO else TRADING_DAYS_PER_YEAR
+                                 for item in symbols])
+    moves = detect_moves(closes, thresholds, periods_per_year=periods_per_year)
+
+    # Biggest moves (in standard deviations) first
+    print(f"\n{'Symbol':<8}{'Close':>12}{'Move':>9}{'Vol (ann.)':>12}{'Vol ratio':>11}{'Z':>7}")
+    for index in np.argsort(-np.nan_to_num(np.abs(moves["z_score"]), nan=-1)):
+        flag = " 🚨" if moves["crossed"][index] else ""
+        print(f"{symbols[index]['symbol']:<8}{moves['close'][index]:>12.4f}{moves['move_pct'][index]:>+8.2f}%"
+              f"{moves['volatility_pct'][index]:>11.1f}%{moves['volatility_ratio'][index]:>11.2f}"
+              f"{moves['z_score'][index]:>7.2f}{flag}")
+
+    crossed = np.flatnonzero(moves["crossed"])
+    if len(crossed) == 0:
+        print("\nNo significant price change — no news will be sent.")
+        return
+
+    from common.notifications import NotificationDispatcher, SmsSink, sinks_from_env
+    from news_index import NewsIndex
+
+    # SMS plus any email / webhook / file sink configured in .env, all sent at the same time
+    sms_sink = SmsSink.from_env(
+        session=session,
+        account_sid_var=account_sid_var,
+        auth_token_var="TWILIO_AUTH_TOKEN",
+        from_var="TWILIO_PHONE",  # Twilio phone number
+        to_var="MY_PHONE"         # Your personal phone number
+    )
+    dispatcher = NotificationDispatcher([sms_sink] + sinks_from_env(session=session))
+
+    news_index = NewsIndex()
+    print(f"\n📰 Fetching news for {len(crossed)} symbols...")
+    news = fetch_all_news(session, news_index, [symbols[index]["name"] for index in crossed])
+
+    # Symbols are handled one after the other, so an article sent for one isn't sent again for another
+    for index, (articles, started) in zip(crossed, news):
+        item = symbols[index]
+        move = moves["move_pct"][index]
+        up_down = "🔺" if move > 0 else "🔻"
+        if articles is None:
+            continue
+        new_articles = news_index.filter_new(articles)[:ARTICLES_PER_SYMBOL]
+        print(f"\n{item['symbol']}: {up_down}{abs(move):.2f}% — {len(new_articles)} new articles")
+        delivered_all = True
+        for article in new_articles:
+            message = (
+                f"{item['symbol']}: {up_down}{abs(move):.2f}%\n"
+                f"Headline: {article.get('title')}\n"
+                f"Brief: {article.get('description')}"
+            )
+            results = dispatcher.dispatch(message, subject=f"{item['symbol']}: {up_down}{abs(move):.2f}%")
+            print(f"✅ Message sent: {results}")
+            if any(results.values()):
+                news_index.record([article])
+            else:
+                delivered_all = False
+        # An article that couldn't be delivered is requested again next run
+        if delivered_all:
+            news_index.set_fetched(item["name"], started)
+
+    print(f"\n🗂️ Articles already sent (skipped): {news_index.duplicates}")
+    news_index.close()
+    dispatcher.close()
+
+
+if __name__ == "__main__":
+    main()
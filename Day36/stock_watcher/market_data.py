@@ -0,0 +1,159 @@
+from itertools import islice
+import numpy as np
+
+import repo_root
+from common.json_stream import MissingKeyError, STREAM_CHUNK_SIZE, iter_object_items
+
+STOCK_ENDPOINT = "https://www.alphavantage.co/query"
+
+# Kinds of symbols and the Alpha Vantage series used for each
+EQUITY = "equity"
+CRYPTO = "crypto"
+SERIES_FUNCTIONS = {
+    EQUITY: "TIME_SERIES_DAILY",
+    CRYPTO: "DIGITAL_CURRENCY_DAILY",
+}
+SERIES_KEYS = {
+    EQUITY: "Time Series (Daily)",
+    CRYPTO: "Time Series (Digital Currency Daily)",
+}
+# Crypto bars used "4a. close (USD)" before Alpha Vantage simplified the format
+CLOSE_KEYS = ("4. close", "4a. close (USD)")
+
+
+class AlphaVantageError(Exception):
+    """Raised when Alpha Vantage answers without the expected time series (bad symbol, quota, key...)."""
+
+
+def series_params(symbol, kind, api_key, market="USD", outputsize="compact"):
+    """
+    Builds the query parameters of a daily series.
+
+    Args:
+        symbol (str): Ticker, e.g. "TSLA" or "XRP".
+        kind (str): EQUITY or CRYPTO.
+        api_key (str): Alpha Vantage API key.
+        market (str): Quote currency of crypto symbols.
+        outputsize (str): "compact" (latest 100 bars) or "full" (equities only).
+
+    Returns:
+        dict: The parameters.
+    """
+    params = {"function": SERIES_FUNCTIONS[kind], "symbol": symbol, "apikey": api_key}
+    if kind == CRYPTO:
+        params["market"] = market
+    else:
+        params["outputsize"] = outputsize
+    return params
+
+
+def _error_message(data):
+    """Returns the explanation Alpha Vantage gives instead of a series (quota, bad symbol...)."""
+    if not isinstance(data, dict):
+        return str(data)
+    return str(next((data[key] for key in ("Error Message", "Note", "Information") if key in data), data))
+
+
+def _read_bars(bars, max_bars=None, since=None):
+    """
+    Reads (date, bar) pairs, newest first, into NumPy arrays.
+    Reading stops after max_bars pairs or at the first bar older than `since`,
+    so the remaining bars are never requested from the iterator.
+
+    Returns:
+        tuple: (dates as datetime64[D], closes as float64), both oldest first.
+    """
+    dates = []
+    closes = []
+    close_key = None
+    for day, bar in islice(bars, max_bars):
+        if since is not None and day < since:
+            break
+        if close_key is None:
+            close_key = next((key for key in CLOSE_KEYS if key in bar), None)
+            if close_key is None:
+                raise AlphaVantageError(f"No close price in bar: {bar}")
+        dates.append(day)
+        closes.append(float(bar[close_key]))
+
+    dates = np.array(dates, dtype="datetime64[D]")
+    closes = np.array(closes, dtype=np.float64)
+    order = np.argsort(dates)
+    return dates[order], closes[order]
+
+
+def parse_series(data, kind, max_bars=None, since=None):
+    """
+    Converts a decoded Alpha Vantage daily series into NumPy arrays.
+    Alpha Vantage lists the newest bar first, so reading stops after max_bars entries
+    or at the first bar older than `since`.
+
+    Args:
+        data (dict): The decoded response.
+        kind (str): EQUITY or CRYPTO.
+        max_bars (int): Only the newest max_bars bars are kept (all if None).
+        since (str): Only bars on or after this "YYYY-MM-DD" date are kept (all if None).
+
+    Returns:
+        tuple: (dates as datetime64[D], closes as float64), both oldest first.
+
+    Raises:
+        AlphaVantageError: If the response doesn't contain the series.
+    """
+    series = data.get(SERIES_KEYS[kind]) if isinstance(data, dict) else None
+    if not series:
+        raise AlphaVantageError(_error_message(data))
+    return _read_bars(iter(series.items()), max_bars, since)
+
+
+def parse_series_stream(chunks, kind, max_bars=None, since=None):
+    """
+    Same as parse_series(), but reads the raw response incrementally:
+    only the bars that are kept are decoded and the rest of the body is never read.
+
+    Args:
+        chunks (bytes/iterable): The response body or its byte chunks (e.g. response.iter_content()).
+        kind (str): EQUITY or CRYPTO.
+        max_bars (int): Only the newest max_bars bars are kept (all if None).
+        since (str): Only bars on or after this "YYYY-MM-DD" date are kept (all if None).
+
+    Returns:
+        tuple: (dates as datetime64[D], closes as float64), both oldest first.
+
+    Raises:
+        AlphaVantageError: If the response doesn't contain the series.
+    """
+    bars = iter_object_items(chunks, SERIES_KEYS[kind])
+    try:
+        dates, closes = _read_bars(bars, max_bars, since)
+    except MissingKeyError as e:
+        raise AlphaVantageError(_error_message(e.top_level)) from None
+    finally:
+        bars.close()
+    if len(dates) == 0 and since is None:
+        raise AlphaVantageError(f"Empty series: {SERIES_KEYS[kind]}")
+    return dates, closes
+
+
+def fetch_series(session, symbol, kind, api_key, max_bars=None, market="USD", outputsize="compact", since=None):
+    """
+    Downloads and parses the daily closes of a symbol.
+
+    Args:
+        session (requests.Session): Session used for the request (e.g. the shared RateLimitedSession).
+        symbol (str): Ticker.
+        kind (str): EQUITY or CRYPTO.
+        api_key (str): Alpha Vantage API key.
+        max_bars (int): Only the newest max_bars bars are kept.
+        market (str): Quote currency of crypto symbols.
+        outputsize (str): "compact" (latest 100 bars) or "full" history (equities only, crypto is always full).
+        since (str): Only bars on or after this "YYYY-MM-DD" date are kept.
+
+    Returns:
+        tuple: (dates, closes) NumPy arrays, oldest first.
+    """
+    # The body is streamed: once the bars needed are read, the rest of a full history is not downloaded
+    with session.get(STOCK_ENDPOINT, params=series_params(symbol, kind, api_key, market, outputsize),
+                     stream=True) as response:
+        response.raise_for_status()
+        return parse_series_stream(response.iter_content(STREAM_CHUNK_SIZE), kind, max_bars, since)
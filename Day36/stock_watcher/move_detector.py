@@ -0,0 +1,90 @@
+import warnings
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Detection defaults
+DEFAULT_BARS = 60                 # Closes per symbol used for the statistics
+DEFAULT_VOLATILITY_WINDOW = 20    # Rolling volatility over ~one trading month
+DEFAULT_THRESHOLD_PERCENT = 5.0   # Same rule as the course: a move above 5% is news
+TRADING_DAYS_PER_YEAR = 252       # Equities
+CALENDAR_DAYS_PER_YEAR = 365      # Crypto trades every day
+
+
+def align_closes(series, bars=DEFAULT_BARS):
+    """
+    Stacks the newest closes of every symbol into one matrix.
+    Symbols with a shorter history are padded with NaN on the left (oldest side).
+
+    Args:
+        series (list): (dates, closes) tuples, oldest first (see market_data.parse_series).
+        bars (int): Columns of the matrix.
+
+    Returns:
+        numpy.ndarray: (symbols x bars) closes, newest in the last column.
+    """
+    matrix = np.full((len(series), bars), np.nan)
+    for row, (_, closes) in enumerate(series):
+        recent = closes[-bars:]
+        if len(recent):
+            matrix[row, bars - len(recent):] = recent
+    return matrix
+
+
+def detect_moves(closes, thresholds=DEFAULT_THRESHOLD_PERCENT, volatility_window=DEFAULT_VOLATILITY_WINDOW,
+                 periods_per_year=TRADING_DAYS_PER_YEAR):
+    """
+    Computes the latest move of every symbol and whether it crosses its threshold, in one vectorized pass.
+
+    Args:
+        closes (numpy.ndarray): (symbols x bars) closes, newest last, NaN where missing.
+        thresholds (float/array): Move (in %) that counts as significant, per symbol or for all.
+        volatility_window (int): Returns per rolling volatility window.
+        periods_per_year (float/array): Bars per year, to annualize the volatility (252 equities, 365 crypto).
+
+    Returns:
+        dict: Arrays (one value per symbol):
+            "close": latest close,
+            "move_pct": latest close vs the previous one, in %,
+            "previous_move_pct": the move of the bar before,
+            "volatility_pct": annualized volatility of the latest window, in %,
+            "volatility_ratio": latest window volatility / mean rolling volatility (>1 = more agitated than usual),
+            "z_score": latest log return in standard deviations of the window before it,
+            "crossed": |move| >= threshold,
+            "new_crossing": crossed now but not on the previous bar.
+    """
+    closes = np.asarray(closes, dtype=float)
+    thresholds = np.broadcast_to(np.asarray(thresholds, dtype=float), closes.shape[:1])
+    periods_per_year = np.broadcast_to(np.asarray(periods_per_year, dtype=float), closes.shape[:1])
+
+    # Symbols with too little history produce NaN rows, their warnings are expected
+    with warnings.catch_warnings(), np.errstate(invalid="ignore", divide="ignore"):
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        moves = (closes[:, 1:] / closes[:, :-1] - 1) * 100
+        log_returns = np.log(closes[:, 1:] / closes[:, :-1])
+
+        if log_returns.shape[1] >= volatility_window + 1:
+            rolling_std = np.nanstd(sliding_window_view(log_returns, volatility_window, axis=1), axis=-1)
+            latest_std = rolling_std[:, -1]
+            prior_std = rolling_std[:, -2]
+            volatility_ratio = latest_std / np.nanmean(rolling_std, axis=1)
+        else:
+            latest_std = prior_std = volatility_ratio = np.full(closes.shape[0], np.nan)
+
+        move_pct = moves[:, -1]
+        previous_move_pct = moves[:, -2] if moves.shape[1] > 1 else np.full(closes.shape[0], np.nan)
+        z_score = np.where(prior_std > 0, log_returns[:, -1] / prior_std, np.nan)
+        volatility_pct = latest_std * np.sqrt(periods_per_year) * 100
+
+        crossed = np.abs(move_pct) >= thresholds
+        previously_crossed = np.abs(previous_move_pct) >= thresholds
+
+    return {
+        "close": closes[:, -1],
+        "move_pct": move_pct,
+        "previous_move_pct": previous_move_pct,
+        "volatility_pct": volatility_pct,
+        "volatility_ratio": volatility_ratio,
+        "z_score": z_score,
+        "crossed": crossed,
+        "new_crossing": crossed & ~previously_crossed,
+    }
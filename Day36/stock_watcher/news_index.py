@@ -0,0 +1,187 @@
+from urllib.parse import urlsplit
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import numpy as np
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "news_index.sqlite3")
+# Articles are remembered for 30 days
+DEFAULT_RETENTION_SECONDS = 30 * 24 * 60 * 60
+# Titles whose 64-bit SimHash differ in at most 3 bits are the same story
+# (e.g. "Tesla shares jump 8%" vs "Tesla shares jump 8% after earnings")
+DEFAULT_MAX_DISTANCE = 3
+# The fingerprint is split into 4 bands of 16 bits: two fingerprints within 3 bits share at least one band
+BANDS = 4
+BAND_BITS = 64 // BANDS
+
+_WORD = re.compile(r"\w+")
+_BIT_POSITIONS = np.arange(64, dtype=np.uint64)
+
+
+def url_key(url):
+    """Normalizes an article URL (no scheme, query or fragment, lower-case host) and hashes it."""
+    parts = urlsplit((url or "").strip())
+    normalized = f"{parts.netloc.lower()}{parts.path.rstrip('/')}"
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+
+def simhash(text):
+    """
+    Computes the 64-bit SimHash of a text from its words and word pairs.
+    Similar texts get fingerprints that differ in only a few bits.
+
+    Args:
+        text (str): Usually the article title.
+
+    Returns:
+        int: The fingerprint (0 for a text without words).
+    """
+    words = _WORD.findall((text or "").lower())
+    features = words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+    if not features:
+        return 0
+    hashes = np.array([int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+                       for feature in features], dtype=np.uint64)
+    # One row per feature, one column per bit: every bit votes +1 / -1
+    bits = (hashes[:, None] >> _BIT_POSITIONS) & np.uint64(1)
+    votes = bits.astype(np.int64).sum(axis=0) * 2 - len(features)
+    return int(np.sum((votes > 0).astype(np.uint64) << _BIT_POSITIONS))
+
+
+def _bands(fingerprint):
+    return [(fingerprint >> (band * BAND_BITS)) & ((1 << BAND_BITS) - 1) for band in range(BANDS)]
+
+
+def _to_signed(value):
+    """SQLite integers are signed 64-bit."""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _to_unsigned(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+class NewsIndex:
+    """
+    This class is a persistent (SQLite) index of the articles already sent, so the same story
+    isn't sent twice: exact repeats are found by URL hash, rewrites of the same headline by SimHash.
+    It also remembers when each news query was last made, so only newer articles are requested.
+    """
+
+    def __init__(self, path=None, max_distance=DEFAULT_MAX_DISTANCE, retention_seconds=DEFAULT_RETENTION_SECONDS):
+        """
+        Opens (or creates) the index and forgets articles older than the retention period.
+
+        Args:
+            path (str): Location of the SQLite file. Defaults to NEWS_INDEX_PATH or a file next to this module.
+            max_distance (int): Maximum differing bits for two titles to be near-duplicates (at most 3).
+            retention_seconds (float): How long sent articles are remembered.
+        """
+        self.path = path or os.getenv("NEWS_INDEX_PATH", DEFAULT_INDEX_PATH)
+        self.max_distance = min(max_distance, BANDS - 1)
+        self.duplicates = 0
+        self._lock = threading.Lock()
+
+        # The connection is shared by the fetch threads, access is serialized with the lock
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS articles (
+                url_hash TEXT PRIMARY KEY,
+                simhash INTEGER NOT NULL,
+                band0 INTEGER NOT NULL,
+                band1 INTEGER NOT NULL,
+                band2 INTEGER NOT NULL,
+                band3 INTEGER NOT NULL,
+                title TEXT,
+                seen_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_band0 ON articles (band0);
+            CREATE INDEX IF NOT EXISTS idx_band1 ON articles (band1);
+            CREATE INDEX IF NOT EXISTS idx_band2 ON articles (band2);
+            CREATE INDEX IF NOT EXISTS idx_band3 ON articles (band3);
+            CREATE TABLE IF NOT EXISTS queries (
+                query TEXT PRIMARY KEY,
+                fetched_at REAL NOT NULL
+            );
+            """
+        )
+        self._connection.execute("DELETE FROM articles WHERE seen_at < ?", (time.time() - retention_seconds,))
+        self._connection.commit()
+
+    def _is_known(self, key, fingerprint):
+        """Checks the URL hash, then the titles sharing a band with the fingerprint."""
+        if self._connection.execute("SELECT 1 FROM articles WHERE url_hash = ?", (key,)).fetchone():
+            return True
+        if not fingerprint:
+            return False
+        bands = _bands(fingerprint)
+        candidates = self._connection.execute(
+            "SELECT simhash FROM articles WHERE band0 = ? OR band1 = ? OR band2 = ? OR band3 = ?", bands
+        )
+        return any(bin(_to_unsigned(other) ^ fingerprint).count("1") <= self.max_distance
+                   for (other,) in candidates)
+
+    def _insert(self, key, fingerprint, title, seen_at):
+        self._connection.execute(
+            "INSERT OR REPLACE INTO articles (url_hash, simhash, band0, band1, band2, band3, title, seen_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [key, _to_signed(fingerprint)] + _bands(fingerprint) + [title, seen_at]
+        )
+
+    def filter_new(self, articles):
+        """
+        Keeps the articles that were never sent and are not near-duplicates of one another.
+
+        Args:
+            articles (list): NewsAPI article dictionaries ("url", "title", ...).
+
+        Returns:
+            list: The new articles, in the same order.
+        """
+        new_articles = []
+        batch = []    # (url hash, fingerprint) of the articles kept so far
+        with self._lock:
+            for article in articles:
+                key = url_key(article.get("url"))
+                fingerprint = simhash(article.get("title"))
+                in_batch = any(key == other_key or (fingerprint and other and
+                                                    bin(fingerprint ^ other).count("1") <= self.max_distance)
+                               for other_key, other in batch)
+                if in_batch or self._is_known(key, fingerprint):
+                    self.duplicates += 1
+                    continue
+                batch.append((key, fingerprint))
+                new_articles.append(article)
+        return new_articles
+
+    def record(self, articles):
+        """Remembers articles that were sent."""
+        now = time.time()
+        with self._lock:
+            for article in articles:
+                self._insert(url_key(article.get("url")), simhash(article.get("title")), article.get("title"), now)
+            self._connection.commit()
+
+    def last_fetched(self, query):
+        """Returns when a news query was last made (Unix time), or None."""
+        with self._lock:
+            row = self._connection.execute("SELECT fetched_at FROM queries WHERE query = ?", (query,)).fetchone()
+        return row[0] if row else None
+
+    def set_fetched(self, query, fetched_at=None):
+        """Records that a news query was made (defaults to now)."""
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO queries (query, fetched_at) VALUES (?, ?)",
+                (query, fetched_at if fetched_at is not None else time.time())
+            )
+            self._connection.commit()
+
+    def close(self):
+        """Closes the underlying database connection."""
+        with self._lock:
+            self._connection.close()
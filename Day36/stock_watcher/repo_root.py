@@ -0,0 +1,10 @@
+"""
+Puts the repository root on sys.path, so the helpers shared by all the days in common/ can be imported.
+The modules of this day import it before their first `from common... import`.
+"""
+from pathlib import Path
+import sys
+
+ROOT = str(Path(__file__).resolve().parents[2])
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
@@ -1,8 +1,13 @@
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
-import requests
 import os
 
+import repo_root
+from common.lazy_session import LazySession
+
+from pixel_mirror import PixelMirror
+from pixela_client import PixelaClient
+
 # ------🔐 1. Load environment variables ------
 load_dotenv()
 TOKEN = os.getenv("PIXELA_TOKEN")
@@ -20,6 +25,10 @@ headers = {
     "X-USER-TOKEN": TOKEN
 }
 
+# Every Pixela call goes through the shared rate limiter,
+# built (and requests imported) only when the mirror actually needs to send a request
+session = LazySession()
+
 # ------👤 3. Create a user account (run once) ------
 user_params = {
     "token": TOKEN,
@@ -29,7 +38,7 @@ user_params = {
 }
 
 # Uncomment to create the user (run only once)
-# response = requests.post(url=pixela_endpoint, json=user_params)
+# response = session.post(url=pixela_endpoint, json=user_params)
 # print(response.status_code)
 # print(response.text)
 
@@ -46,7 +55,7 @@ graph_config = {
 }
 
 # Uncomment to create the graph (run only once)
-# response = requests.post(url=graph_endpoint, json=graph_config, headers=headers)
+# response = session.post(url=graph_endpoint, json=graph_config, headers=headers)
 # print(response.status_code)
 # print(response.text)
 
@@ -63,7 +72,7 @@ pixel_config = {
 }
 
 # Uncomment to add today's pixel
-# response = requests.post(url=pixel_endpoint, json=pixel_config, headers=headers)
+# response = session.post(url=pixel_endpoint, json=pixel_config, headers=headers)
 # print(response.status_code)
 # print(response.text)
 
@@ -75,16 +84,31 @@ pixel_update = {
     "quantity": "2.0"
 }
 
-# Uncomment to update yesterday's pixel
-response = requests.put(url=update_endpoint, json=pixel_update, headers=headers)
-print(response.status_code)
-print(response.text)
+# Direct request (always sent, even if the quantity didn't change):
+# response = session.put(url=update_endpoint, json=pixel_update, headers=headers)
+# print(response.status_code)
+# print(response.text)
+
+# The write goes through the local mirror of the graph instead: the PUT is skipped
+# when yesterday's pixel already has this quantity
+mirror = PixelMirror(PixelaClient(USERNAME, TOKEN, graph_config["id"], session=session))
+mirror.refresh()    # Only lists the days since the last refresh (nothing at all if it is recent)
+if mirror.set(yesterday, pixel_update["quantity"]):
+    print(f"✏️ Pixel of {yesterday} set to {pixel_update['quantity']}")
+else:
+    print(f"⏭️ Pixel of {yesterday} already is {pixel_update['quantity']}, no request sent")
 
 # ------❌ 7. Delete yesterday's pixel with DELETE ------
 delete_endpoint = f"{pixel_endpoint}/{yesterday}"
 
-# Uncomment to delete yesterday's pixel
-# response = requests.delete(url=delete_endpoint, headers=headers)
+# Uncomment to delete yesterday's pixel (or use mirror.delete(yesterday) to keep the mirror in sync)
+# response = session.delete(url=delete_endpoint, headers=headers)
 # print(response.status_code)
 # print(response.text)
-# https://pixe.la/v1/users/jose13esc/graphs/graph13.html
\ No newline at end of file
+# https://pixe.la/v1/users/jose13esc/graphs/graph13.html
+
+# ------📈 8. Stats answered from the local mirror (no requests) ------
+print(f"📅 Logged today: {'yes' if mirror.logged() else 'not yet'}")
+print(f"🔥 Current streak: {mirror.streak()} days (longest: {mirror.longest_streak()})")
+for monday, total in mirror.weekly_totals(weeks=4):
+    print(f"   Week of {monday:%Y-%m-%d}: {total:g} {graph_config['unit'].lower()}")
\ No newline at end of file
@@ -0,0 +1,251 @@
+from array import array
+from datetime import date, timedelta
+import json
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from pixela_client import DATE_FORMAT, normalize_quantity, parse_day
+
+# A full refresh lists the last year; later refreshes only the days since the previous one,
+# plus a week back in case a recent pixel was edited on the website
+DEFAULT_HISTORY_DAYS = 365
+DEFAULT_OVERLAP_DAYS = 7
+# The mirror is considered up to date for one hour
+DEFAULT_MAX_AGE_SECONDS = 60 * 60
+
+
+def _as_date(day):
+    """Accepts a date, a "yyyyMMdd" or a "YYYY-MM-DD" string."""
+    return day if isinstance(day, date) else parse_day(day)
+
+
+class PixelMirror:
+    """
+    This class keeps a local copy of a Pixela graph: one float per day (NaN = no pixel) in a compact
+    array indexed by the number of days since the first stored day, saved to a small binary file.
+    Questions like "did I log today?", streaks and weekly totals are answered without any request,
+    and writes go through the mirror so a pixel that already has the quantity is not sent again.
+    """
+
+    def __init__(self, client, path=None, history_days=None, overlap_days=None, max_age_seconds=None):
+        """
+        Opens the mirror (nothing is requested until refresh()).
+
+        Args:
+            client (PixelaClient): Client of the mirrored graph.
+            path (str): Location of the file. Defaults to PIXELA_MIRROR_PATH or pixela_mirror_<graph>.bin here.
+            history_days (int): Days listed by a full refresh. Defaults to PIXELA_MIRROR_HISTORY_DAYS or 365.
+            overlap_days (int): Days re-listed before the last refreshed one. Defaults to PIXELA_MIRROR_OVERLAP_DAYS or 7.
+            max_age_seconds (float): refresh() does nothing if the mirror is younger.
+                Defaults to PIXELA_MIRROR_MAX_AGE_MINUTES or 60 minutes.
+        """
+        self.client = client
+        self.path = path or os.getenv("PIXELA_MIRROR_PATH") or os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), f"pixela_mirror_{client.graph_id}.bin")
+        self.history_days = history_days or int(os.getenv("PIXELA_MIRROR_HISTORY_DAYS", DEFAULT_HISTORY_DAYS))
+        self.overlap_days = overlap_days if overlap_days is not None else int(
+            os.getenv("PIXELA_MIRROR_OVERLAP_DAYS", DEFAULT_OVERLAP_DAYS))
+        if max_age_seconds is None:
+            max_age_seconds = float(os.getenv("PIXELA_MIRROR_MAX_AGE_MINUTES", DEFAULT_MAX_AGE_SECONDS / 60)) * 60
+        self.max_age_seconds = max_age_seconds
+
+        self.origin = None              # Day stored at index 0
+        self.quantities = array("d")
+        self.synced_through = None      # Last day covered by a refresh
+        self.refreshed_at = 0.0
+        self.skipped_writes = 0
+        self._lock = threading.RLock()
+        self._load()
+
+    def _load(self):
+        """Reads the file: one JSON header line, then the raw array."""
+        try:
+            with open(self.path, "rb") as file:
+                header = json.loads(file.readline())
+                quantities = array("d")
+                quantities.frombytes(file.read())
+        except (OSError, ValueError):
+            return
+        if header.get("graph") != self.client.graph_id:
+            return
+        if header.get("byteorder") != sys.byteorder:
+            quantities.byteswap()
+        self.origin = parse_day(header["origin"]) if header.get("origin") else None
+        self.synced_through = parse_day(header["synced_through"]) if header.get("synced_through") else None
+        self.refreshed_at = header.get("refreshed_at", 0.0)
+        self.quantities = quantities
+
+    def save(self):
+        """Writes the mirror atomically (a crash never leaves a half-written file)."""
+        with self._lock:
+            header = {
+                "graph": self.client.graph_id,
+                "origin": self.origin.strftime(DATE_FORMAT) if self.origin else None,
+                "synced_through": self.synced_through.strftime(DATE_FORMAT) if self.synced_through else None,
+                "refreshed_at": self.refreshed_at,
+                "byteorder": sys.byteorder,
+            }
+            directory = os.path.dirname(os.path.abspath(self.path))
+            file_descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix=".pixela_mirror_")
+            with os.fdopen(file_descriptor, "wb") as file:
+                file.write(json.dumps(header).encode("utf-8") + b"\n")
+                self.quantities.tofile(file)
+            os.replace(temp_path, self.path)
+
+    def _index(self, day):
+        """Position of a day in the array (may be out of range)."""
+        return (day - self.origin).days if self.origin else -1
+
+    def _ensure(self, day):
+        """Grows the array so it covers a day and returns the day's index."""
+        if self.origin is None:
+            self.origin = day
+        if day < self.origin:
+            self.quantities = array("d", [math.nan] * (self.origin - day).days) + self.quantities
+            self.origin = day
+        index = self._index(day)
+        if index >= len(self.quantities):
+            self.quantities.extend([math.nan] * (index + 1 - len(self.quantities)))
+        return index
+
+    def refresh(self, today=None, full=False):
+        """
+        Updates the mirror from Pixela: only the days since the last refresh (minus the overlap),
+        or the whole history window the first time or when `full` is set.
+        Nothing is requested if the mirror was refreshed less than max_age_seconds ago.
+
+        Args:
+            today (date): Last day to list. Defaults to today.
+            full (bool): List the whole history window even if the mirror is recent.
+
+        Returns:
+            int: Days whose quantity changed (0 if nothing was requested).
+        """
+        today = today or date.today()
+        if not full and self.synced_through is not None and time.time() - self.refreshed_at < self.max_age_seconds:
+            return 0
+        if full or self.synced_through is None:
+            start = today - timedelta(days=self.history_days - 1)
+        else:
+            start = min(today, self.synced_through - timedelta(days=self.overlap_days))
+
+        pixels = self.client.get_pixels(start, today)
+        changed = 0
+        with self._lock:
+            first = self._ensure(start)
+            last = self._ensure(today)
+            # The listed range replaces what was stored, so pixels deleted on the website disappear too
+            for index in range(first, last + 1):
+                day = self.origin + timedelta(days=index)
+                quantity = pixels.get(day.strftime(DATE_FORMAT))
+                value = float(quantity) if quantity is not None else math.nan
+                old = self.quantities[index]
+                if not (value == old or (math.isnan(value) and math.isnan(old))):
+                    changed += 1
+                self.quantities[index] = value
+            self.synced_through = max(today, self.synced_through or today)
+            self.refreshed_at = time.time()
+            self.save()
+        return changed
+
+    def get(self, day):
+        """Returns the quantity of a day, None if it has no pixel."""
+        index = self._index(_as_date(day))
+        if 0 <= index < len(self.quantities) and not math.isnan(self.quantities[index]):
+            return self.quantities[index]
+        return None
+
+    def logged(self, day=None):
+        """Returns True if the day (default today) has a pixel."""
+        return self.get(day or date.today()) is not None
+
+    def set(self, day, quantity):
+        """
+        Writes the pixel of a day unless it already has this quantity.
+
+        Args:
+            day (date/str): The day.
+            quantity (str/float): The new quantity.
+
+        Returns:
+            bool: True if a request was sent, False if the pixel was already up to date.
+        """
+        day = _as_date(day)
+        quantity = normalize_quantity(quantity)
+        if quantity is None:
+            return self.delete(day)
+        if self.get(day) == float(quantity):
+            self.skipped_writes += 1
+            return False
+        # PUT creates the pixel if it doesn't exist, so a stale mirror can't make the write fail
+        self.client.update(day.strftime(DATE_FORMAT), quantity)
+        with self._lock:
+            self.quantities[self._ensure(day)] = float(quantity)
+            self.save()
+        return True
+
+    def delete(self, day):
+        """
+        Deletes the pixel of a day unless it has none.
+
+        Returns:
+            bool: True if a request was sent.
+        """
+        day = _as_date(day)
+        if self.get(day) is None:
+            self.skipped_writes += 1
+            return False
+        self.client.delete(day.strftime(DATE_FORMAT))
+        with self._lock:
+            self.quantities[self._index(day)] = math.nan
+            self.save()
+        return True
+
+    def streak(self, day=None):
+        """
+        Counts the days in a row with a pixel, ending at `day` (default today).
+        If that day has no pixel yet, the streak ending the day before is counted (it can still continue).
+        """
+        index = self._index(_as_date(day or date.today()))
+        if not (0 <= index < len(self.quantities)) or math.isnan(self.quantities[index]):
+            index -= 1
+        count = 0
+        while 0 <= index < len(self.quantities) and not math.isnan(self.quantities[index]):
+            count += 1
+            index -= 1
+        return count
+
+    def longest_streak(self):
+        """Returns the most days in a row with a pixel."""
+        longest = current = 0
+        for quantity in self.quantities:
+            current = 0 if math.isnan(quantity) else current + 1
+            longest = max(longest, current)
+        return longest
+
+    def total(self, start, end):
+        """Sums the quantities between two days (both included)."""
+        first = max(0, self._index(_as_date(start)))
+        last = min(len(self.quantities) - 1, self._index(_as_date(end)))
+        return math.fsum(quantity for quantity in self.quantities[first:last + 1] if not math.isnan(quantity)) \
+            if first <= last else 0.0
+
+    def weekly_totals(self, weeks=4, day=None):
+        """
+        Sums the quantities of the last weeks (Monday to Sunday).
+
+        Args:
+            weeks (int): Number of weeks, including the current one.
+            day (date): A day of the last week. Defaults to today.
+
+        Returns:
+            list: (monday, total) pairs, oldest week first.
+        """
+        monday = _as_date(day or date.today())
+        monday -= timedelta(days=monday.weekday())
+        mondays = [monday - timedelta(weeks=week) for week in reversed(range(weeks))]
+        return [(start, self.total(start, start + timedelta(days=6))) for start in mondays]
@@ -0,0 +1,153 @@
+from datetime import date, timedelta
+from decimal import Decimal, InvalidOperation
+import os
+import random
+import time
+
+import repo_root
+from common.lazy_session import LazySession
+
+PIXELA_ENDPOINT = "https://pixe.la/v1/users"
+DEFAULT_GRAPH_ID = "graph13"
+DATE_FORMAT = "%Y%m%d"
+
+# Pixela rejects about 25% of the requests of non-supporters with a 503 ("isRejected": true):
+# those are retried right away with a short exponential backoff
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_RETRY_BACKOFF_SECONDS = 0.2
+# Pixel lists are requested one year at a time
+MAX_RANGE_DAYS = 365
+
+
+class PixelaError(Exception):
+    """Raised when Pixela refuses a request (after the retries for random rejections)."""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def normalize_quantity(quantity):
+    """
+    Converts a quantity to the canonical string used to compare pixels ("2.0", "2" and 2 are all "2").
+
+    Returns:
+        str: The quantity, or None if it is empty.
+
+    Raises:
+        ValueError: If it is not a number.
+    """
+    if quantity is None or str(quantity).strip() == "":
+        return None
+    try:
+        value = Decimal(str(quantity).strip())
+    except InvalidOperation:
+        raise ValueError(f"Invalid quantity: {quantity!r}") from None
+    if not value.is_finite():
+        raise ValueError(f"Invalid quantity: {quantity!r}")
+    text = format(value.normalize(), "f")
+    return "0" if text in ("-0", "") else text
+
+
+def parse_day(text):
+    """Reads a "YYYY-MM-DD" or "yyyyMMdd" date."""
+    text = str(text).strip()
+    try:
+        if len(text) == 8 and text.isdigit():
+            return date(int(text[:4]), int(text[4:6]), int(text[6:8]))
+        return date.fromisoformat(text)
+    except ValueError:
+        raise ValueError(f"Invalid date: {text!r}") from None
+
+
+class PixelaClient:
+    """
+    This class wraps the pixel endpoints of one Pixela graph: list, create, update and delete.
+    Every call goes through the shared rate limiter and Pixela's random 503 rejections are retried.
+    """
+
+    def __init__(self, username=None, token=None, graph_id=None, session=None,
+                 max_retries=DEFAULT_MAX_RETRIES, retry_backoff=DEFAULT_RETRY_BACKOFF_SECONDS):
+        """
+        Initializes the client.
+
+        Args:
+            username (str): Pixela user. Defaults to PIXELA_USERNAME.
+            token (str): Pixela token. Defaults to PIXELA_TOKEN.
+            graph_id (str): Graph to work on. Defaults to PIXELA_GRAPH_ID or "graph13".
+            session (requests.Session): Session used for the requests. A RateLimitedSession is created
+                on the first request if omitted.
+            max_retries (int): Retries of a randomly rejected request.
+            retry_backoff (float): First wait between retries (doubled each time).
+        """
+        self.username = username or os.getenv("PIXELA_USERNAME")
+        self.graph_id = graph_id or os.getenv("PIXELA_GRAPH_ID", DEFAULT_GRAPH_ID)
+        self.headers = {"X-USER-TOKEN": token or os.getenv("PIXELA_TOKEN")}
+        self.session = session or LazySession()
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.graph_url = f"{PIXELA_ENDPOINT}/{self.username}/graphs/{self.graph_id}"
+        self.retries = 0
+
+    def _request(self, method, url, **kwargs):
+        """
+        Sends a request, retrying Pixela's random rejections.
+
+        Returns:
+            requests.Response: The successful response.
+
+        Raises:
+            PixelaError: If Pixela refuses the request.
+            requests.exceptions.RequestException: On network errors.
+        """
+        for attempt in range(self.max_retries + 1):
+            response = self.session.request(method, url, headers=self.headers, **kwargs)
+            if response.ok:
+                return response
+            try:
+                body = response.json()
+            except ValueError:
+                body = {"message": response.text}
+            if response.status_code == 503 and attempt < self.max_retries:
+                self.retries += 1
+                # Jitter so the workers rejected at the same moment don't retry in lockstep
+                time.sleep(self.retry_backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+                continue
+            raise PixelaError(f"{method} {url}: {response.status_code} {body.get('message', body)}",
+                              response.status_code)
+
+    def get_pixels(self, start, end):
+        """
+        Lists the pixels of the graph between two dates (both included).
+
+        Args:
+            start (date): First day.
+            end (date): Last day.
+
+        Returns:
+            dict: {"yyyyMMdd": normalized quantity}
+        """
+        pixels = {}
+        while start <= end:
+            window_end = min(end, start + timedelta(days=MAX_RANGE_DAYS - 1))
+            response = self._request("GET", f"{self.graph_url}/pixels", params={
+                "from": start.strftime(DATE_FORMAT),
+                "to": window_end.strftime(DATE_FORMAT),
+                "withBody": "true",
+            })
+            for pixel in response.json().get("pixels", []):
+                pixels[pixel["date"]] = normalize_quantity(pixel["quantity"])
+            start = window_end + timedelta(days=1)
+        return pixels
+
+    def create(self, day, quantity):
+        """Creates the pixel of a day (yyyyMMdd)."""
+        self._request("POST", self.graph_url, json={"date": day, "quantity": quantity})
+
+    def update(self, day, quantity):
+        """Changes the quantity of the pixel of a day (yyyyMMdd)."""
+        self._request("PUT", f"{self.graph_url}/{day}", json={"quantity": quantity})
+
+    def delete(self, day):
+        """Deletes the pixel of a day (yyyyMMdd)."""
+        self._request("DELETE", f"{self.graph_url}/{day}")
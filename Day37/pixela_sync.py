@@ -0,0 +1,281 @@
+"""
+Syncs a local habit history (CSV or JSON) to a Pixela graph.
+
+The graph's pixels are listed once, compared with the dataset and only the differences are sent
+(create / update / delete), several at a time through the shared rate limiter. Pixela's random
+503 rejections are retried, and an interrupted sync picks up where it stopped when run again.
+
+Usage:
+    python pixela_sync.py reading_history.csv [--prune] [--dry-run]
+
+    --prune    Also delete the graph's pixels (within the dataset's dates) that are not in the dataset.
+    --dry-run  Only print the operations that would be sent.
+"""
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dotenv import load_dotenv
+import csv
+import json
+import os
+import sys
+import threading
+import time
+import requests
+
+from pixela_client import (PixelaClient, PixelaError, PIXELA_ENDPOINT, DATE_FORMAT,
+                           normalize_quantity, parse_day)
+
+DEFAULT_JOURNAL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pixela_sync.jsonl")
+DEFAULT_SYNC_CONCURRENCY = 4
+# Journal entries older than this are not replayed: Pixela's list has long caught up with them by then
+DEFAULT_JOURNAL_MAX_AGE_SECONDS = 60 * 60
+# Free accounts: keep the pace of the shared rate limiter's default for pixe.la
+DEFAULT_REQUESTS_PER_SECOND = 2
+
+CREATE = "create"
+UPDATE = "update"
+DELETE = "delete"
+
+Operation = namedtuple("Operation", ["action", "day", "quantity"])
+
+
+def load_dataset(path):
+    """
+    Reads the local history.
+    CSV files need "date" and "quantity" columns; JSON files hold either {"2024-01-31": 12, ...}
+    or [{"date": "2024-01-31", "quantity": 12}, ...]. Dates may be "YYYY-MM-DD" or "yyyyMMdd".
+    An empty quantity means the day must have no pixel.
+
+    Args:
+        path (str): The CSV or JSON file.
+
+    Returns:
+        dict: {"yyyyMMdd": normalized quantity, or None for the days to delete}
+
+    Raises:
+        ValueError: If a date or quantity is invalid.
+    """
+    with open(path, newline="", encoding="utf-8") as file:
+        if path.lower().endswith(".json"):
+            data = json.load(file)
+            rows = data.items() if isinstance(data, dict) else ((row["date"], row.get("quantity")) for row in data)
+        else:
+            rows = ((row["date"], row.get("quantity")) for row in csv.DictReader(file) if row.get("date"))
+        # Later rows win, so a dataset can be appended to
+        return {parse_day(day).strftime(DATE_FORMAT): normalize_quantity(quantity) for day, quantity in rows}
+
+
+def plan_sync(local, remote, prune=False):
+    """
+    Compares the dataset with the graph.
+
+    Args:
+        local (dict): {"yyyyMMdd": quantity or None} from load_dataset().
+        remote (dict): {"yyyyMMdd": quantity} currently in the graph.
+        prune (bool): Also delete the remote pixels that are not in the dataset.
+
+    Returns:
+        list: The Operations needed, oldest day first.
+    """
+    operations = []
+    for day, quantity in sorted(local.items()):
+        if quantity is None:
+            if day in remote:
+                operations.append(Operation(DELETE, day, None))
+        elif day not in remote:
+            operations.append(Operation(CREATE, day, quantity))
+        elif remote[day] != quantity:
+            operations.append(Operation(UPDATE, day, quantity))
+    if prune:
+        operations.extend(Operation(DELETE, day, None) for day in sorted(set(remote) - set(local)))
+    return operations
+
+
+class SyncJournal:
+    """
+    This class is an append-only log (one JSON line per operation) of what an unfinished sync already sent.
+    A resumed sync replays it over the listed pixels, so nothing is sent twice even if Pixela's
+    list is not up to date yet. The log is removed once a sync finishes without failures.
+    Only recent entries are replayed: the log of a sync that failed days ago would otherwise be
+    applied over a listing that is fresher than it.
+    """
+
+    def __init__(self, path=None, max_age_seconds=None):
+        """
+        Args:
+            path (str): Location of the log. Defaults to PIXELA_SYNC_JOURNAL or a file next to this module.
+            max_age_seconds (float): Age after which an entry is ignored.
+                Defaults to PIXELA_SYNC_JOURNAL_MAX_AGE_MINUTES or 60 minutes.
+        """
+        self.path = path or os.getenv("PIXELA_SYNC_JOURNAL", DEFAULT_JOURNAL_PATH)
+        if max_age_seconds is None:
+            max_age_seconds = float(os.getenv("PIXELA_SYNC_JOURNAL_MAX_AGE_MINUTES",
+                                              DEFAULT_JOURNAL_MAX_AGE_SECONDS / 60)) * 60
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+        self._needs_newline = False
+
+    def replay(self, graph_id, remote):
+        """
+        Applies the operations logged for a graph within the last max_age_seconds to its listed pixels.
+        A log holding only older entries is removed.
+
+        Returns:
+            tuple: (updated copy of remote, number of operations replayed)
+        """
+        remote = dict(remote)
+        replayed = 0
+        stale = 0
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                for line in file:
+                    # A crash may have left the last line without its newline
+                    self._needs_newline = not line.endswith("\n")
+                    try:
+                        entry = json.loads(line)
+                        if time.time() - entry["done_at"] >= self.max_age_seconds:
+                            stale += 1
+                            continue
+                        if entry["graph"] != graph_id:
+                            continue
+                        if entry["action"] == DELETE:
+                            remote.pop(entry["date"], None)
+                        else:
+                            remote[entry["date"]] = entry["quantity"]
+                    except (ValueError, KeyError, TypeError):
+                        # A line cut short by a crash is simply ignored
+                        continue
+                    replayed += 1
+        except OSError:
+            pass
+        if stale and not replayed:
+            print(f"🧹 Sync journal: {stale} operations older than {self.max_age_seconds / 60:.0f} minutes ignored")
+            self.clear()
+        return remote, replayed
+
+    def record(self, graph_id, operation):
+        """Appends a finished operation (flushed right away so a crash doesn't lose it)."""
+        line = json.dumps({
+            "graph": graph_id,
+            "action": operation.action,
+            "date": operation.day,
+            "quantity": operation.quantity,
+            "done_at": time.time(),
+        }, separators=(",", ":")) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as file:
+                if self._needs_newline:
+                    file.write("\n")
+                    self._needs_newline = False
+                file.write(line)
+                file.flush()
+
+    def clear(self):
+        """Removes the log."""
+        with self._lock:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+
+def sync(client, local, prune=False, journal=None, max_workers=None, dry_run=False):
+    """
+    Brings a Pixela graph in line with a dataset.
+
+    Args:
+        client (PixelaClient): Client of the graph.
+        local (dict): {"yyyyMMdd": quantity or None} from load_dataset().
+        prune (bool): Also delete the pixels (within the dataset's dates) that are not in the dataset.
+        journal (SyncJournal): Log used to resume an interrupted sync (none if omitted).
+        max_workers (int): Operations sent at the same time. Defaults to PIXELA_SYNC_CONCURRENCY or 4.
+        dry_run (bool): Only plan, don't send anything.
+
+    Returns:
+        tuple: (Counter of operations done per action plus "unchanged", list of (Operation, error) failures)
+    """
+    stats = Counter()
+    failures = []
+    if not local:
+        return stats, failures
+
+    days = sorted(local)
+    remote = client.get_pixels(parse_day(days[0]), parse_day(days[-1]))
+    if journal is not None:
+        remote, replayed = journal.replay(client.graph_id, remote)
+        if replayed:
+            print(f"♻️ Resuming: {replayed} operations of an interrupted sync are already done")
+
+    operations = plan_sync(local, remote, prune)
+    stats["unchanged"] = sum(1 for day, quantity in local.items() if remote.get(day) == quantity)
+    print(f"🧮 {len(local)} days in the dataset, {len(remote)} pixels in the graph: "
+          f"{len(operations)} operations needed, {stats['unchanged']} days unchanged")
+    if dry_run:
+        for operation in operations:
+            print(f"   {operation.action:<7} {operation.day} {operation.quantity or ''}")
+        return stats, failures
+
+    def apply(operation):
+        if operation.action == CREATE:
+            client.create(operation.day, operation.quantity)
+        elif operation.action == UPDATE:
+            client.update(operation.day, operation.quantity)
+        else:
+            client.delete(operation.day)
+        if journal is not None:
+            journal.record(client.graph_id, operation)
+
+    workers = max_workers or int(os.getenv("PIXELA_SYNC_CONCURRENCY", DEFAULT_SYNC_CONCURRENCY))
+    executor = ThreadPoolExecutor(max_workers=workers)
+    futures = {executor.submit(apply, operation): operation for operation in operations}
+    try:
+        for number, future in enumerate(as_completed(futures), start=1):
+            operation = futures[future]
+            try:
+                future.result()
+            except (PixelaError, requests.exceptions.RequestException) as e:
+                failures.append((operation, e))
+                print(f"❌ {operation.action} {operation.day}: {e}")
+                continue
+            stats[operation.action] += 1
+            if number % 50 == 0:
+                print(f"   ... {number}/{len(operations)} operations")
+    except KeyboardInterrupt:
+        # The operations already sent are in the journal: running the sync again resumes it
+        executor.shutdown(wait=True, cancel_futures=True)
+        print("⏸️ Sync interrupted, run it again to resume")
+        raise
+    executor.shutdown()
+
+    if journal is not None and not failures:
+        journal.clear()
+    return stats, failures
+
+
+def main():
+    load_dotenv()
+    arguments = [argument for argument in sys.argv[1:] if not argument.startswith("--")]
+    if len(arguments) != 1:
+        print(__doc__)
+        sys.exit(1)
+
+    client = PixelaClient()
+    # Pixela supporters may raise the pace
+    client.session.rate_limits.configure(
+        PIXELA_ENDPOINT, float(os.getenv("PIXELA_REQUESTS_PER_SECOND", DEFAULT_REQUESTS_PER_SECOND)),
+        burst=DEFAULT_SYNC_CONCURRENCY
+    )
+    local = load_dataset(arguments[0])
+    started = time.perf_counter()
+    stats, failures = sync(client, local, prune="--prune" in sys.argv, journal=SyncJournal(),
+                           dry_run="--dry-run" in sys.argv)
+    print(f"✅ Created {stats[CREATE]}, updated {stats[UPDATE]}, deleted {stats[DELETE]}, "
+          f"unchanged {stats['unchanged']} ({client.retries} rejected requests retried, "
+          f"{time.perf_counter() - started:.1f}s)")
+    if failures:
+        print(f"⚠️ {len(failures)} operations failed, run the sync again to retry them")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
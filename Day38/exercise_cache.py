@@ -0,0 +1,146 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+# The calories Nutritionix estimates for a description only change with the user profile
+DEFAULT_TTL_SECONDS = 90 * 24 * 60 * 60          # 90 days
+DEFAULT_MAX_ENTRIES = 5000
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "exercise_cache.sqlite3")
+
+_TRAILING_PUNCTUATION = re.compile(r"[\s.!,;]+$")
+
+
+def normalize_query(query):
+    """Normalizes a description so "Ran 5k." and "  ran   5k" share one entry."""
+    return _TRAILING_PUNCTUATION.sub("", " ".join(query.split()).lower())
+
+
+class ExerciseCache:
+    """
+    This class is a small on-disk cache (SQLite) of Nutritionix exercise results,
+    keyed on the normalized description plus the user profile (gender, weight, height, age),
+    so the same workout logged again costs no request. Entries expire after a TTL
+    and the least recently used ones are evicted once the cache is full.
+    """
+
+    def __init__(self, path=None, ttl=None, max_entries=DEFAULT_MAX_ENTRIES):
+        """
+        Opens (or creates) the cache database.
+
+        Args:
+            path (str): Location of the SQLite file. Defaults to EXERCISE_CACHE_PATH or a file next to this module.
+            ttl (float): Seconds a result stays valid. Defaults to EXERCISE_CACHE_TTL_DAYS or 90 days.
+            max_entries (int): Maximum number of results kept before LRU eviction.
+        """
+        self.path = path or os.getenv("EXERCISE_CACHE_PATH", DEFAULT_CACHE_PATH)
+        if ttl is None:
+            ttl = float(os.getenv("EXERCISE_CACHE_TTL_DAYS", DEFAULT_TTL_SECONDS / 86400)) * 86400
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        # The connection is shared by the parsing threads, access is serialized with the lock
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS exercises (
+                query TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON exercises (last_used)")
+        self._connection.commit()
+
+    @staticmethod
+    def _key(query, profile):
+        """Builds the cache key, e.g. "ran 5k|male|60.2|163|30"."""
+        values = [profile.get(name, "") for name in ("gender", "weight_kg", "height_cm", "age")]
+        return "|".join([normalize_query(query)] + [str(value).strip().lower() for value in values])
+
+    def get(self, query, profile):
+        """
+        Looks up a description in the cache.
+
+        Args:
+            query (str): The workout description.
+            profile (dict): The user profile sent with it.
+
+        Returns:
+            list: The cached exercises, or None if they must be requested.
+        """
+        key = self._key(query, profile)
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT result, expires_at FROM exercises WHERE query = ?", (key,)
+            ).fetchone()
+
+            if row is None or row[1] <= now:
+                if row is not None:
+                    self._connection.execute("DELETE FROM exercises WHERE query = ?", (key,))
+                    self._connection.commit()
+                self.misses += 1
+                return None
+
+            self._connection.execute("UPDATE exercises SET last_used = ? WHERE query = ?", (now, key))
+            self._connection.commit()
+            self.hits += 1
+            return json.loads(row[0])
+
+    def set(self, query, profile, exercises):
+        """
+        Stores the exercises Nutritionix found in a description.
+
+        Args:
+            query (str): The workout description.
+            profile (dict): The user profile sent with it.
+            exercises (list): The "exercises" of the response.
+        """
+        key = self._key(query, profile)
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO exercises (query, result, expires_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(exercises), now + self.ttl, now)
+            )
+            self._evict()
+            self._connection.commit()
+
+    def _evict(self):
+        """Removes expired entries and, if still over capacity, the least recently used ones."""
+        self._connection.execute("DELETE FROM exercises WHERE expires_at <= ?", (time.time(),))
+        count = self._connection.execute("SELECT COUNT(*) FROM exercises").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._connection.execute(
+                "DELETE FROM exercises WHERE query IN "
+                "(SELECT query FROM exercises ORDER BY last_used ASC LIMIT ?)",
+                (overflow,)
+            )
+
+    def stats(self):
+        """
+        Returns the hit/miss counters of this cache.
+
+        Returns:
+            dict: Hits, misses and hit ratio since the cache was opened.
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+    def close(self):
+        """Closes the underlying database connection."""
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,180 @@
+"""
+Logs many workouts at once.
+
+Reads one workout description per line from a file (or stdin with "-"), optionally prefixed
+with when it was done, parses the distinct descriptions concurrently through Nutritionix
+(results are cached per description + user profile) and adds all the rows to the sheet.
+
+    2025-01-14 07:30 | I ran 5 kilometers
+    2025-01-15 | 45 minutes of yoga
+    swam 30 minutes            <- no date: now
+
+Usage:
+    python ingest.py workouts.txt [--csv rows.csv] [--dry-run]
+    cat workouts.txt | python ingest.py -
+
+    --csv PATH  Write the rows to a CSV file (to import into the sheet in one go) instead of sending them.
+    --dry-run   Only print the rows.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from dotenv import load_dotenv
+import os
+import sys
+
+import repo_root
+from common.lazy_session import LazySession
+
+from exercise_cache import ExerciseCache, normalize_query
+from workouts import (close_sheet_queue, fetch_exercises, load_profile, open_sheet_queue, queue_rows,
+                      workout_rows, write_csv)
+
+DEFAULT_NUTRITIONIX_CONCURRENCY = 4
+WHEN_FORMATS = ("%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d")
+
+
+def parse_line(line, now):
+    """
+    Splits a line into (when, description).
+
+    Returns:
+        tuple: (datetime, str), or None for blank lines and # comments.
+
+    Raises:
+        ValueError: If the date before "|" is invalid.
+    """
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+    when_text, separator, description = line.partition("|")
+    if not separator:
+        return now, line
+    for when_format in WHEN_FORMATS:
+        try:
+            return datetime.strptime(when_text.strip(), when_format), description.strip()
+        except ValueError:
+            continue
+    raise ValueError(f"Invalid date {when_text.strip()!r} (use YYYY-MM-DD or YYYY-MM-DD HH:MM)")
+
+
+def read_workouts(lines, now=None):
+    """
+    Reads the workout lines (a file or stdin), skipping the invalid ones.
+
+    Returns:
+        list: (datetime, description) pairs, in input order.
+    """
+    now = now or datetime.now()
+    workouts = []
+    for number, line in enumerate(lines, start=1):
+        try:
+            workout = parse_line(line, now)
+        except ValueError as e:
+            print(f"⚠️ Line {number} skipped: {e}")
+            continue
+        if workout is not None:
+            workouts.append(workout)
+    return workouts
+
+
+def parse_all(session, workouts, profile, cache, max_workers=None):
+    """
+    Parses every distinct description once, several at a time, and builds the sheet rows.
+    The cached descriptions are answered first; only the others are sent to Nutritionix.
+
+    Returns:
+        tuple: (rows sorted by date and time, descriptions that could not be parsed)
+    """
+    queries = {}
+    for _, description in workouts:
+        queries.setdefault(normalize_query(description), description)
+
+    results = {}
+    missing = {}
+    for key, description in queries.items():
+        exercises = cache.get(description, profile) if cache is not None else None
+        if exercises is None:
+            missing[key] = description
+        else:
+            results[key] = exercises
+
+    if missing:
+        # Only loaded when something has to be requested
+        import requests
+
+        def parse(description):
+            try:
+                exercises = fetch_exercises(session, description, profile)
+            except (requests.exceptions.RequestException, ValueError) as e:
+                print(f"❌ Nutritionix could not parse {description!r}: {e}")
+                return None
+            if cache is not None:
+                cache.set(description, profile, exercises)
+            return exercises
+
+        workers = max_workers or int(os.getenv("NUTRITIONIX_CONCURRENCY", DEFAULT_NUTRITIONIX_CONCURRENCY))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results.update(zip(missing, executor.map(parse, missing.values())))
+
+    rows = []
+    failed = []
+    for when, description in sorted(workouts, key=lambda workout: workout[0]):
+        exercises = results[normalize_query(description)]
+        if exercises is None:
+            failed.append(description)
+        elif not exercises:
+            print(f"⚠️ No exercise found in {description!r}")
+        else:
+            rows.extend(workout_rows(exercises, when))
+    return rows, failed
+
+
+def main():
+    load_dotenv()
+    arguments = sys.argv[1:]
+    csv_path = None
+    if "--csv" in arguments:
+        position = arguments.index("--csv")
+        csv_path = arguments[position + 1] if position + 1 < len(arguments) else None
+        del arguments[position:position + 2]
+    dry_run = "--dry-run" in arguments
+    sources = [argument for argument in arguments if argument != "--dry-run"]
+    if len(sources) != 1 or ("--csv" in sys.argv and not csv_path):
+        print(__doc__)
+        sys.exit(1)
+
+    if sources[0] == "-":
+        workouts = read_workouts(sys.stdin)
+    else:
+        with open(sources[0], encoding="utf-8") as file:
+            workouts = read_workouts(file)
+
+    # Every Nutritionix and Sheety call goes through the shared rate limiter (built on the first request)
+    session = LazySession()
+    cache = ExerciseCache()
+    rows, failed = parse_all(session, workouts, load_profile(), cache)
+    stats = cache.stats()
+    print(f"🏋️ {len(workouts)} workouts → {len(rows)} rows "
+          f"(cache: {stats['hits']} hits, {stats['misses']} Nutritionix requests)")
+    cache.close()
+
+    if dry_run:
+        for row in rows:
+            print(f"   {row}")
+    elif csv_path:
+        write_csv(csv_path, rows)
+        print(f"📄 Rows written to {csv_path}, import it into the sheet with File → Import → Append")
+    else:
+        # The rows are on disk once queued: an outage or Ctrl+C only delays them to the next run
+        sheet_queue = open_sheet_queue(session)
+        queue_rows(sheet_queue, rows)
+        stats = close_sheet_queue(sheet_queue)
+        print(f"✅ {stats['sent']} rows added to the sheet, {stats['pending']} still queued, "
+              f"{stats['failed']} refused")
+
+    if failed:
+        print(f"⚠️ {len(failed)} descriptions could not be parsed, run them again later")
+
+
+if __name__ == "__main__":
+    main()
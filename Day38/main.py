@@ -1,52 +1,31 @@
 from dotenv import load_dotenv
 from datetime import datetime
-import requests
-import os
 
-# ------🔐 1. Load environment variables ------
-load_dotenv()
-APP_ID = os.getenv("APP_ID")
-API_KEY = os.getenv("API_KEY")
-SHEETY_TOKEN = os.getenv("SHEETY_TOKEN")
-ENDPOINT = "https://trackapi.nutritionix.com/v2/natural/exercise"
-POST_ENDPOINT = os.getenv("POST_ENDPOINT") # obtained from POST on Sheety 
-
-# ------📡 Nutritionix API ------
+import repo_root
+from common.rate_limiter import RateLimitedSession
 
-headers = {
-    "x-app-id": APP_ID,
-    "x-app-key": API_KEY,
-    "Content-Type": "application/json",
-}
+from exercise_cache import ExerciseCache
+from workouts import close_sheet_queue, fetch_exercises, load_profile, open_sheet_queue, queue_rows, workout_rows
 
+# ------🔐 1. Load environment variables ------
+# APP_ID, API_KEY (Nutritionix), SHEETY_TOKEN and POST_ENDPOINT (obtained from POST on Sheety)
+load_dotenv()
 
-parameters = {
-    "query": "I ran 3 kilometers and did 20 minutes of swimming.",
-    "gender": "male",
-    "weight_kg": 60.2,
-    "height_cm": 163,
-    "age": 30,
-}
+# Every Nutritionix and Sheety call goes through the shared rate limiter
+session = RateLimitedSession()
+# Rows are queued on disk and sent in the background (also the ones an earlier run couldn't send)
+sheet_queue = open_sheet_queue(session)
 
-response = requests.post(url=ENDPOINT, headers=headers, json=parameters)
-#print(response.json())
-exercises = response.json()["exercises"]
+# ------📡 Nutritionix API ------
+# The same description with the same profile is answered from the local cache
+# (to log many workouts at once, use ingest.py)
+query = "I ran 3 kilometers and did 20 minutes of swimming."
+cache = ExerciseCache()
+exercises = fetch_exercises(session, query, load_profile(), cache)
+cache.close()
 
 # ------📤 Enviar a Google Sheet ------
-sheety_headers = {
-    "Authorization": f"Basic {SHEETY_TOKEN}"
-}
-
-for exercise in exercises:
-    workout_data = {
-        "workout": {
-            "date": datetime.now().strftime("%d/%m/%Y"),
-            "time": datetime.now().strftime("%H:%M:%S"),
-            "exercise": exercise["name"].title(),
-            "duration": round(exercise["duration_min"]),
-            "calories": round(exercise["nf_calories"]),
-        }
-    }
-    post_response = requests.post(url=POST_ENDPOINT, json=workout_data, headers=sheety_headers)
-    print(post_response.status_code, post_response.text)
-    print(f"Sent to Google Sheet: {workout_data['workout']}")
+# One timestamp for all the exercises of this workout
+rows = workout_rows(exercises, datetime.now())
+queue_rows(sheet_queue, rows)
+close_sheet_queue(sheet_queue)
@@ -0,0 +1,155 @@
+import csv
+import os
+
+import repo_root
+
+NUTRITIONIX_ENDPOINT = "https://trackapi.nutritionix.com/v2/natural/exercise"
+
+# Profile sent to Nutritionix with every description (calories depend on it)
+DEFAULT_PROFILE = {
+    "gender": "male",
+    "weight_kg": 60.2,
+    "height_cm": 163,
+    "age": 30,
+}
+
+# Columns of the "workouts" sheet
+SHEET_COLUMNS = ["date", "time", "exercise", "duration", "calories"]
+
+# Rows waiting to be added to the sheet survive a crash or a Sheety outage in this file
+DEFAULT_QUEUE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sheety_queue.sqlite3")
+# How long a run waits at the end for the queued rows to reach the sheet
+DEFAULT_FLUSH_TIMEOUT_SECONDS = 30
+
+
+def load_profile():
+    """Returns the user profile, from USER_GENDER / USER_WEIGHT_KG / USER_HEIGHT_CM / USER_AGE if set."""
+    return {
+        "gender": os.getenv("USER_GENDER", DEFAULT_PROFILE["gender"]),
+        "weight_kg": float(os.getenv("USER_WEIGHT_KG", DEFAULT_PROFILE["weight_kg"])),
+        "height_cm": float(os.getenv("USER_HEIGHT_CM", DEFAULT_PROFILE["height_cm"])),
+        "age": int(os.getenv("USER_AGE", DEFAULT_PROFILE["age"])),
+    }
+
+
+def fetch_exercises(session, query, profile, cache=None):
+    """
+    Asks Nutritionix which exercises a description contains (served from the cache when possible).
+
+    Args:
+        session (requests.Session): Session used for the request.
+        query (str): The workout description, e.g. "I ran 3 kilometers and swam 20 minutes".
+        profile (dict): The user profile from load_profile().
+        cache (ExerciseCache): Cache of previous results (none if omitted).
+
+    Returns:
+        list: The exercises found ("name", "duration_min", "nf_calories", ...).
+
+    Raises:
+        requests.exceptions.RequestException: If Nutritionix can't be reached or refuses the request.
+    """
+    if cache is not None:
+        exercises = cache.get(query, profile)
+        if exercises is not None:
+            return exercises
+
+    headers = {
+        "x-app-id": os.getenv("APP_ID"),
+        "x-app-key": os.getenv("API_KEY"),
+        "Content-Type": "application/json",
+    }
+    response = session.post(url=NUTRITIONIX_ENDPOINT, headers=headers, json={"query": query, **profile})
+    response.raise_for_status()
+    exercises = response.json().get("exercises", [])
+    if cache is not None:
+        cache.set(query, profile, exercises)
+    return exercises
+
+
+def workout_rows(exercises, when):
+    """
+    Converts Nutritionix exercises into sheet rows.
+
+    Args:
+        exercises (list): The exercises of one description.
+        when (datetime): When the workout was done (same date and time for all its exercises).
+
+    Returns:
+        list: One dict per exercise with the SHEET_COLUMNS.
+    """
+    date_text = when.strftime("%d/%m/%Y")
+    time_text = when.strftime("%H:%M:%S")
+    return [{
+        "date": date_text,
+        "time": time_text,
+        "exercise": exercise["name"].title(),
+        "duration": round(exercise["duration_min"]),
+        "calories": round(exercise["nf_calories"]),
+    } for exercise in exercises]
+
+
+def open_sheet_queue(session, path=None, token=None):
+    """
+    Opens the durable queue of rows waiting to be added to the sheet.
+    Rows left behind by an earlier run (Sheety down, run interrupted) are sent first.
+
+    Args:
+        session (requests.Session): Session used for the requests.
+        path (str): Location of the queue. Defaults to SHEETY_QUEUE_PATH or a file next to this module.
+        token (str): Sheety token. Defaults to SHEETY_TOKEN.
+
+    Returns:
+        WriteBehindQueue: The queue, sending in the background.
+    """
+    # Imported here so --dry-run and --csv runs never load the queue (nor requests)
+    from common.write_behind import WriteBehindQueue
+
+    return WriteBehindQueue(
+        session,
+        path or os.getenv("SHEETY_QUEUE_PATH", DEFAULT_QUEUE_PATH),
+        headers={"Authorization": f"Basic {token or os.getenv('SHEETY_TOKEN')}"},
+        on_sent=lambda meta, payload: print(f"Sent to Google Sheet: {payload['workout']}")
+    )
+
+
+def queue_rows(queue, rows, endpoint=None):
+    """
+    Queues rows to be appended to the sheet through Sheety and returns right away.
+    Sheety only accepts one row per request, so the queue sends them one after the other (in order).
+
+    Args:
+        queue (WriteBehindQueue): Queue from open_sheet_queue().
+        rows (list): Rows from workout_rows().
+        endpoint (str): Sheety endpoint of the sheet. Defaults to POST_ENDPOINT.
+    """
+    endpoint = endpoint or os.getenv("POST_ENDPOINT")
+    queue.put_many([("POST", endpoint, {"workout": row}, None) for row in rows])
+
+
+def close_sheet_queue(queue, timeout=None):
+    """
+    Waits for the queued rows to reach the sheet, then closes the queue.
+
+    Args:
+        queue (WriteBehindQueue): Queue from open_sheet_queue().
+        timeout (float): Seconds to wait. Defaults to SHEETY_FLUSH_TIMEOUT or 30 seconds.
+
+    Returns:
+        dict: The queue counters (sent, failed, retries, pending...).
+    """
+    if timeout is None:
+        timeout = float(os.getenv("SHEETY_FLUSH_TIMEOUT", DEFAULT_FLUSH_TIMEOUT_SECONDS))
+    stats = queue.close(timeout)
+    if stats["pending"]:
+        print(f"⏳ {stats['pending']} rows are still queued, they will be sent on the next run")
+    if stats["failed"]:
+        print(f"⚠️ Sheety refused {stats['failed']} rows, they are kept in {queue.path}")
+    return stats
+
+
+def write_csv(path, rows):
+    """Writes rows to a CSV file that can be imported into the sheet at once (File → Import → Append)."""
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.DictWriter(file, fieldnames=SHEET_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
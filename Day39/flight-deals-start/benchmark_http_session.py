@@ -0,0 +1,80 @@
+"""
+Benchmark: fresh connection per request (module-level requests.get) vs. the pooled keep-alive session.
+
+Starts a local HTTPS stand-in with a throwaway self-signed certificate (needs the `openssl` CLI)
+and measures the average latency per request for both approaches.
+
+Usage:
+    python benchmark_http_session.py [number_of_requests]
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from http_session import create_session
+import os
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import requests
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so the server keeps connections alive like Sheety/Amadeus do
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, avoid the Nagle/delayed-ACK stall
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        body = b'{"prices": []}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_https_stand_in(directory):
+    """Creates a self-signed certificate and starts the HTTPS stand-in in a background thread."""
+    cert_file = os.path.join(directory, "cert.pem")
+    key_file = os.path.join(directory, "key.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-keyout", key_file, "-out", cert_file, "-subj", "/CN=localhost",
+         "-addext", "subjectAltName=IP:127.0.0.1"],
+        check=True, capture_output=True
+    )
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert_file, key_file)
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"https://127.0.0.1:{server.server_port}/prices", cert_file
+
+
+def measure(get, url, cert_file, number_of_requests):
+    """Returns the average latency per request in milliseconds."""
+    start = time.perf_counter()
+    for _ in range(number_of_requests):
+        get(url, verify=cert_file).raise_for_status()
+    return (time.perf_counter() - start) / number_of_requests * 1000
+
+
+if __name__ == "__main__":
+    number_of_requests = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    with tempfile.TemporaryDirectory() as directory:
+        server, url, cert_file = start_https_stand_in(directory)
+        session = create_session()
+
+        fresh_ms = measure(requests.get, url, cert_file, number_of_requests)
+        pooled_ms = measure(session.get, url, cert_file, number_of_requests)
+        server.shutdown()
+
+    print(f"📊 {number_of_requests} HTTPS requests against a local stand-in")
+    print(f"   New connection per request: {fresh_ms:.2f} ms/request")
+    print(f"   Pooled keep-alive session:  {pooled_ms:.2f} ms/request")
+    print(f"   Saved per request:          {fresh_ms - pooled_ms:.2f} ms ({fresh_ms / pooled_ms:.1f}x faster)")
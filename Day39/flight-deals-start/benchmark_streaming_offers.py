@@ -0,0 +1,186 @@
+"""
+Benchmark: `response.json()["data"][0]` vs. streaming only the first offer (first_array_item()).
+
+Writes a flight-offers fixture (same layout as Amadeus' /v2/shopping/flight-offers, several MB),
+serves it from a local HTTP stand-in and measures the latency, the peak Python memory (tracemalloc)
+and the bytes read from the socket to get the cheapest offer.
+
+Usage:
+    python benchmark_streaming_offers.py [number_of_offers] [rounds]
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import requests
+
+import repo_root
+from common.json_stream import STREAM_CHUNK_SIZE, first_array_item
+
+
+def make_segment(number, origin, destination, day):
+    return {
+        "departure": {"iataCode": origin, "terminal": "1", "at": f"2025-03-{day:02d}T0{number % 10}:15:00"},
+        "arrival": {"iataCode": destination, "terminal": "2", "at": f"2025-03-{day:02d}T1{number % 10}:40:00"},
+        "carrierCode": "AM",
+        "number": str(400 + number),
+        "aircraft": {"code": "7M8"},
+        "operating": {"carrierCode": "AM"},
+        "duration": "PT5H25M",
+        "id": str(number),
+        "numberOfStops": 0,
+        "blacklistedInEU": False,
+    }
+
+
+def make_offer(number, price):
+    """One offer with an outbound and a return itinerary of two segments each."""
+    return {
+        "type": "flight-offer",
+        "id": str(number),
+        "source": "GDS",
+        "instantTicketingRequired": False,
+        "nonHomogeneous": False,
+        "oneWay": False,
+        "lastTicketingDate": "2025-02-20",
+        "numberOfBookableSeats": 9,
+        "itineraries": [
+            {"duration": "PT12H5M", "segments": [make_segment(number, "MEX", "MAD", 1),
+                                                 make_segment(number + 1, "MAD", "CDG", 2)]},
+            {"duration": "PT13H20M", "segments": [make_segment(number + 2, "CDG", "MAD", 20),
+                                                  make_segment(number + 3, "MAD", "MEX", 20)]},
+        ],
+        "price": {
+            "currency": "MXN",
+            "total": f"{price:.2f}",
+            "base": f"{price * 0.8:.2f}",
+            "fees": [{"amount": "0.00", "type": "SUPPLIER"}, {"amount": "0.00", "type": "TICKETING"}],
+            "grandTotal": f"{price:.2f}",
+        },
+        "pricingOptions": {"fareType": ["PUBLISHED"], "includedCheckedBagsOnly": True},
+        "validatingAirlineCodes": ["AM"],
+        "travelerPricings": [{
+            "travelerId": "1",
+            "fareOption": "STANDARD",
+            "travelerType": "ADULT",
+            "price": {"currency": "MXN", "total": f"{price:.2f}", "base": f"{price * 0.8:.2f}"},
+            "fareDetailsBySegment": [
+                {"segmentId": str(number + index), "cabin": "ECONOMY", "fareBasis": "NLNN0MXA",
+                 "class": "N", "includedCheckedBags": {"quantity": 1}}
+                for index in range(4)
+            ],
+        }],
+    }
+
+
+def write_fixture(path, number_of_offers):
+    """Writes a response with the offers sorted by price, cheapest first, like Amadeus."""
+    random.seed(39)
+    prices = sorted(random.uniform(9000, 60000) for _ in range(number_of_offers))
+    document = {
+        "meta": {"count": number_of_offers, "links": {"self": "https://test.api.amadeus.com/v2/shopping/flight-offers"}},
+        "data": [make_offer(number, price) for number, price in enumerate(prices)],
+        "dictionaries": {
+            "locations": {code: {"cityCode": code, "countryCode": "XX"} for code in ("MEX", "MAD", "CDG")},
+            "aircraft": {"7M8": "BOEING 737 MAX 8"},
+            "currencies": {"MXN": "MEXICAN PESO"},
+            "carriers": {"AM": "AEROMEXICO"},
+        },
+    }
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(document, file)
+
+
+def start_stand_in(path):
+    """Serves the fixture over HTTP (in 64 KB writes, like a real chunked download) in a background thread."""
+    with open(path, "rb") as file:
+        body = file.read()
+
+    class StandInHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/vnd.amadeus+json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            try:
+                for start in range(0, len(body), STREAM_CHUNK_SIZE):
+                    self.wfile.write(body[start:start + STREAM_CHUNK_SIZE])
+            except (BrokenPipeError, ConnectionResetError):
+                pass    # The streaming client stopped reading early
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/v2/shopping/flight-offers"
+
+
+class CountingChunks:
+    """Wraps a chunk iterator and counts the bytes taken from it."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.bytes_read = 0
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            self.bytes_read += len(chunk)
+            yield chunk
+
+
+def full_parse(session, url):
+    response = session.get(url)
+    response.raise_for_status()
+    return response.json()["data"][0], len(response.content)
+
+
+def streaming_parse(session, url):
+    with session.get(url, stream=True) as response:
+        response.raise_for_status()
+        counted = CountingChunks(response.iter_content(STREAM_CHUNK_SIZE))
+        offer = first_array_item(counted, "data")
+    return offer, counted.bytes_read
+
+
+def measure(parse, session, url, rounds):
+    """Returns (average ms, peak MB, bytes read, offer) over the rounds."""
+    elapsed = 0.0
+    peak = 0
+    for _ in range(rounds):
+        tracemalloc.start()
+        start = time.perf_counter()
+        offer, bytes_read = parse(session, url)
+        elapsed += time.perf_counter() - start
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return elapsed / rounds * 1000, peak / 1024 / 1024, bytes_read, offer
+
+
+if __name__ == "__main__":
+    number_of_offers = int(sys.argv[1]) if len(sys.argv) > 1 else 1500
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    with tempfile.TemporaryDirectory() as directory:
+        fixture = os.path.join(directory, "flight_offers.json")
+        write_fixture(fixture, number_of_offers)
+        size = os.path.getsize(fixture)
+        server, url = start_stand_in(fixture)
+        session = requests.Session()
+
+        full_ms, full_mb, full_bytes, full_offer = measure(full_parse, session, url, rounds)
+        stream_ms, stream_mb, stream_bytes, stream_offer = measure(streaming_parse, session, url, rounds)
+        server.shutdown()
+
+    assert full_offer == stream_offer
+    print(f"📊 Cheapest of {number_of_offers} offers from a {size / 1024 / 1024:.1f} MB response ({rounds} rounds)")
+    print(f"   response.json():  {full_ms:8.2f} ms  peak {full_mb:7.2f} MB  read {full_bytes / 1024:9.0f} KB")
+    print(f"   Streaming parser: {stream_ms:8.2f} ms  peak {stream_mb:7.2f} MB  read {stream_bytes / 1024:9.0f} KB")
+    print(f"   {full_ms / stream_ms:.1f}x faster, {full_mb / stream_mb:.1f}x less memory")
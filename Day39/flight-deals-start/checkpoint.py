@@ -0,0 +1,210 @@
+from flight_data import FlightData
+import json
+import os
+import tempfile
+import threading
+import time
+
+DEFAULT_CHECKPOINT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "checkpoint.jsonl")
+# Prices found in the last 6 hours are reused by a resumed run
+DEFAULT_FRESHNESS_SECONDS = 6 * 60 * 60
+# Compact when the log holds this many more lines than live entries
+DEFAULT_COMPACT_SLACK = 500
+
+
+class CheckpointJournal:
+    """
+    This class is an append-only log of the searches already done, one JSON line per
+    (origin, destination, dates) job with its result. A run that crashed or hit a quota
+    can be started again and skips every job finished within the freshness window.
+    Deal alerts are journaled as well until they have been handed to the notifications, so a
+    run that crashed after writing a deal to the sheet (the next run no longer sees it as a deal)
+    still sends its alert when resumed.
+    The log is compacted (stale and superseded lines dropped) so it doesn't grow without bound.
+    """
+
+    def __init__(self, path=None, freshness_seconds=None, compact_slack=DEFAULT_COMPACT_SLACK):
+        """
+        Opens the journal and loads the fresh entries.
+
+        Args:
+            path (str): Location of the log. Defaults to CHECKPOINT_PATH or a file next to this module.
+            freshness_seconds (float): How long a finished job counts as done. Defaults to CHECKPOINT_MAX_AGE or 6h.
+            compact_slack (int): Extra lines tolerated before the log is compacted.
+        """
+        self.path = path or os.getenv("CHECKPOINT_PATH", DEFAULT_CHECKPOINT_PATH)
+        if freshness_seconds is None:
+            freshness_seconds = float(os.getenv("CHECKPOINT_MAX_AGE", DEFAULT_FRESHNESS_SECONDS))
+        self.freshness_seconds = freshness_seconds
+        self.compact_slack = compact_slack
+        self.skipped = 0
+        self._entries = {}
+        self._alerts = {}
+        self._line_count = 0
+        self._needs_newline = False
+        self._lock = threading.Lock()
+        self._load()
+        if self._line_count > len(self._entries) + len(self._alerts) + self.compact_slack:
+            self.compact()
+
+    @staticmethod
+    def _key(origin, destination, dates):
+        return f"{origin}|{destination}|{dates}"
+
+    @staticmethod
+    def _alert_key(entry):
+        return f"{entry['origin_airport']}|{entry['destination_airport']}|{entry['price']}"
+
+    @staticmethod
+    def _flight(entry):
+        return FlightData(entry["price"], entry["origin_airport"], entry["destination_airport"],
+                          entry["out_day"], entry["return_day"])
+
+    def _is_fresh(self, entry):
+        return time.time() - entry["finished_at"] < self.freshness_seconds
+
+    def _load(self):
+        """Reads the log, keeping the latest fresh entry of every job."""
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                for line in file:
+                    self._line_count += 1
+                    # A crash may have left the last line without its newline
+                    self._needs_newline = not line.endswith("\n")
+                    try:
+                        entry = json.loads(line)
+                        if entry.get("alert"):
+                            entries, key = self._alerts, self._alert_key(entry)
+                        else:
+                            entries, key = self._entries, self._key(entry["origin"], entry["destination"],
+                                                                    entry["dates"])
+                    except (ValueError, KeyError, TypeError, AttributeError):
+                        # A line cut short by a crash is simply ignored
+                        continue
+                    if self._is_fresh(entry):
+                        entries[key] = entry
+        except OSError:
+            pass
+
+        if self._entries:
+            print(f"♻️ Checkpoint: {len(self._entries)} finished searches can be reused")
+        if self._alerts:
+            print(f"♻️ Checkpoint: {len(self._alerts)} deal alerts of an interrupted run are still pending")
+
+    def get(self, origin, destination, dates):
+        """
+        Returns the result of a job finished within the freshness window.
+
+        Args:
+            origin (str): IATA code of the origin.
+            destination (str): IATA code of the destination.
+            dates (str): Description of the searched dates (e.g. "2026-10-19/2027-04-16").
+
+        Returns:
+            FlightData: The recorded result, or None if the job has to be (re)done.
+        """
+        with self._lock:
+            entry = self._entries.get(self._key(origin, destination, dates))
+            if entry is None or not self._is_fresh(entry):
+                return None
+            self.skipped += 1
+        return self._flight(entry)
+
+    def record(self, origin, destination, dates, flight):
+        """
+        Appends a finished job to the log (flushed right away so a crash doesn't lose it).
+
+        Args:
+            origin (str): IATA code of the origin.
+            destination (str): IATA code of the destination.
+            dates (str): Description of the searched dates.
+            flight (FlightData): The result.
+        """
+        entry = {
+            "origin": origin,
+            "destination": destination,
+            "dates": dates,
+            "finished_at": time.time(),
+            "price": flight.price,
+            "origin_airport": flight.origin_airport,
+            "destination_airport": flight.destination_airport,
+            "out_day": flight.out_day,
+            "return_day": flight.return_day,
+        }
+        self._append(entry, self._entries, self._key(origin, destination, dates))
+
+    def record_alert(self, city, current_price, flight):
+        """
+        Journals a deal whose alert hasn't been handed to the notifications yet.
+        Call it before the deal's new price is written to the sheet.
+
+        Args:
+            city (str): Destination city.
+            current_price (float): Price the deal is compared against.
+            flight (FlightData): The deal.
+        """
+        entry = {
+            "alert": True,
+            "finished_at": time.time(),
+            "city": city,
+            "current_price": current_price,
+            "price": flight.price,
+            "origin_airport": flight.origin_airport,
+            "destination_airport": flight.destination_airport,
+            "out_day": flight.out_day,
+            "return_day": flight.return_day,
+        }
+        self._append(entry, self._alerts, self._alert_key(entry))
+
+    def pending_alerts(self):
+        """
+        Returns the deal alerts journaled within the freshness window and not cleared since
+        (the alerts of a run that stopped before delivering them).
+
+        Returns:
+            list: (city, current_price, FlightData) tuples.
+        """
+        with self._lock:
+            entries = [entry for entry in self._alerts.values() if self._is_fresh(entry)]
+        return [(entry["city"], entry["current_price"], self._flight(entry)) for entry in entries]
+
+    def clear_alerts(self):
+        """Forgets the pending deal alerts once they were delivered (dropped from the log by compact())."""
+        with self._lock:
+            self._alerts = {}
+
+    def _append(self, entry, entries, key):
+        """Appends an entry to the log (flushed right away) and keeps it in `entries`."""
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as file:
+                if self._needs_newline:
+                    file.write("\n")
+                    self._needs_newline = False
+                file.write(line)
+                file.flush()
+            entries[key] = entry
+            self._line_count += 1
+
+    def compact(self):
+        """Rewrites the log with only the latest fresh entry of every job and pending alert (atomically)."""
+        with self._lock:
+            live = [entry for entry in self._entries.values() if self._is_fresh(entry)]
+            alerts = [entry for entry in self._alerts.values() if self._is_fresh(entry)]
+            directory = os.path.dirname(os.path.abspath(self.path))
+            try:
+                file_descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix=".checkpoint_")
+                with os.fdopen(file_descriptor, "w", encoding="utf-8") as file:
+                    for entry in live + alerts:
+                        file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+                os.replace(temp_path, self.path)
+            except OSError as e:
+                print(f"⚠️ Could not compact checkpoint journal: {e}")
+                return
+            removed = self._line_count - len(live) - len(alerts)
+            self._entries = {self._key(e["origin"], e["destination"], e["dates"]): e for e in live}
+            self._alerts = {self._alert_key(e): e for e in alerts}
+            self._line_count = len(live) + len(alerts)
+            self._needs_newline = False
+        if removed:
+            print(f"🧹 Checkpoint compacted: {removed} stale lines removed")
@@ -1,67 +1,127 @@
 from dotenv import load_dotenv
+from http_session import create_session
+from snapshot_store import SheetSnapshotStore
 import requests
 import os
 import base64
+import copy
+import threading
+import time
+
+import repo_root
+from common.write_behind import WriteBehindQueue
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Columns this script writes back to the sheet
+WRITABLE_COLUMNS = ("iataCode", "lowestPrice")
+# Sheety has no bulk endpoint, so changed rows are sent one by one, politely
+DEFAULT_SHEETY_REQUESTS_PER_SECOND = 2
+# Within this many seconds the local snapshot is used without asking Sheety at all
+DEFAULT_SNAPSHOT_MAX_AGE_SECONDS = 0
+# Row updates waiting for Sheety survive a crash or an outage in this file
+DEFAULT_QUEUE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sheety_queue.sqlite3")
+# How long close() waits for the queued updates to reach the sheet
+DEFAULT_FLUSH_TIMEOUT_SECONDS = 60
+# Sheety nests the row under the sheet object name, which is one of these depending on the sheet
+PAYLOAD_KEYS = ("price", "prices")
+
 class DataManager:
     """
     This class is responsible for interacting with the Google Sheet via the Sheety API.
     It can retrieve destination data and update IATA codes and prices in the sheet.
     """
 
-    def __init__(self):
+    def __init__(self, session=None, snapshot_store=None, write_queue=None):
         """
         Initializes the DataManager with Sheety API credentials and endpoint from environment variables.
+
+        Args:
+            session (HttpSession): Shared pooled HTTP session. A new one is created if omitted.
+            snapshot_store (SheetSnapshotStore): Local copy of the sheet. A default one is created if omitted.
+            write_queue (WriteBehindQueue): Durable queue the row updates are sent through.
+                Opened at SHEETY_QUEUE_PATH on the first update if omitted.
         """
+        self.session = session or create_session()
+        self.snapshot_store = snapshot_store or SheetSnapshotStore()
+        self.sync_mode = os.getenv("SHEET_SYNC_MODE", "auto")
+        self.snapshot_max_age = float(os.getenv("SHEET_SNAPSHOT_MAX_AGE", DEFAULT_SNAPSHOT_MAX_AGE_SECONDS))
         self.sheety_endpoint = os.getenv("SHEETY_ENDPOINT")
         self.sheety_token = os.getenv("SHEETY_TOKEN")
         self.sheety_username = os.getenv("SHEETY_USERNAME")
         self.sheety_password = os.getenv("SHEETY_PASSWORD")
+        if self.sheety_endpoint and hasattr(self.session, "rate_limits"):
+            # Every Sheety request goes through this host's token bucket
+            self.session.rate_limits.configure(
+                self.sheety_endpoint,
+                float(os.getenv("SHEETY_REQUESTS_PER_SECOND", DEFAULT_SHEETY_REQUESTS_PER_SECOND))
+            )
+
+        # Rows as last read from (or written to) the sheet, keyed by row id (baseline for the diff)
+        self.snapshot = {}
+        # Root key Sheety accepts in PUT bodies ("price" or "prices"), found on the first successful write
+        self.payload_key = None
+        self.write_queue = write_queue
+        # The queue's flusher and the pipeline both update the snapshot file
+        self._snapshot_lock = threading.Lock()
         
         # Debug: Print loaded credentials (be careful with this in production)
         print(f"🔧 Sheety Endpoint: {self.sheety_endpoint}")
         print(f"🔧 Has Token: {'Yes' if self.sheety_token else 'No'}")
         print(f"🔧 Has Username: {'Yes' if self.sheety_username else 'No'}")
 
-    def get_destination_data(self):
+    def get_destination_data(self, mode=None):
         """
         Retrieves the destination data from the Google Sheet via a GET request to Sheety.
-        
+
+        Modes:
+            "remote":   always download the sheet (the local snapshot is refreshed).
+            "auto":     serve the local snapshot if it is younger than SHEET_SNAPSHOT_MAX_AGE,
+                        otherwise send a conditional GET (304 = serve snapshot). If Sheety is
+                        unreachable, the snapshot is served instead.
+            "snapshot": serve the local snapshot only, without any request.
+
+        Args:
+            mode (str): One of the modes above. Defaults to SHEET_SYNC_MODE or "auto".
+
         Returns:
             list: A list of dictionaries representing each row in the Google Sheet.
         """
-        # Try different authentication methods
-        headers = {}
-        
-        if self.sheety_token:
-            # If using Bearer token
-            if self.sheety_token.startswith('Basic '):
-                headers["Authorization"] = self.sheety_token
-            else:
-                headers["Authorization"] = f"Bearer {self.sheety_token}"
-        
+        mode = mode or self.sync_mode
+        snapshot = self.snapshot_store.load() if mode in ("auto", "snapshot") else None
+
+        if mode == "snapshot":
+            if snapshot is None:
+                print("❌ No local sheet snapshot available")
+                return []
+            return self._use_rows(snapshot["rows"], "local snapshot")
+
+        if snapshot and time.time() - snapshot["fetched_at"] < self.snapshot_max_age:
+            return self._use_rows(snapshot["rows"], "local snapshot (still fresh)")
+
+        headers = self._build_headers()
+        if snapshot:
+            # Conditional request: Sheety answers 304 without a body if the sheet didn't change
+            if snapshot["etag"]:
+                headers["If-None-Match"] = snapshot["etag"]
+            if snapshot["last_modified"]:
+                headers["If-Modified-Since"] = snapshot["last_modified"]
+
         try:
-            if self.sheety_username and self.sheety_password:
-                # Use Basic Auth with username/password
-                response = requests.get(
-                    url=self.sheety_endpoint, 
-                    headers=headers,
-                    auth=(self.sheety_username, self.sheety_password)
-                )
-            else:
-                # Use only headers
-                response = requests.get(url=self.sheety_endpoint, headers=headers)
-            
+            response = self.session.get(url=self.sheety_endpoint, headers=headers, auth=self._auth())
+
+            if response.status_code == 304 and snapshot:
+                print("✅ GET 304: Sheet unchanged, using local snapshot.")
+                self.snapshot_store.save(snapshot["rows"], snapshot["etag"], snapshot["last_modified"])
+                return self._use_rows(snapshot["rows"], "local snapshot")
+
             response.raise_for_status()
             print(f"✅ GET {response.status_code}: Data retrieved successfully.")
             data = response.json()
             
             # Debug: Print the structure of the response
             print(f"🔍 Response keys: {list(data.keys())}")
-            print(f"🔍 Full response structure: {data}")
             
             # The object in Sheety is "prices"
             if "prices" in data:
@@ -69,110 +129,244 @@ class DataManager:
                 print(f"🔍 Found {len(sheet_data)} rows in prices")
                 if sheet_data:
                     print(f"🔍 Sample row keys: {list(sheet_data[0].keys())}")
-                return sheet_data
+                self.snapshot_store.save(
+                    sheet_data,
+                    etag=response.headers.get("ETag"),
+                    last_modified=response.headers.get("Last-Modified")
+                )
+                return self._use_rows(sheet_data)
             else:
                 print(f"❌ 'prices' key not found in response. Available keys: {list(data.keys())}")
                 return []
                 
         except requests.exceptions.RequestException as e:
             print(f"❌ Error retrieving data: {e}")
+            if snapshot:
+                return self._use_rows(snapshot["rows"], "local snapshot (Sheety unreachable)")
             return []
 
-    def update_destination_codes(self, data):
+    def _use_rows(self, sheet_data, source=None):
+        """
+        Remembers the rows as the baseline for the diff in update_destination_codes.
+
+        Args:
+            sheet_data (list): The sheet rows.
+            source (str): Where the rows came from, printed when it is not Sheety itself.
+
+        Returns:
+            list: The same rows.
+        """
+        if source:
+            print(f"💾 Using {source}: {len(sheet_data)} rows")
+        # Remember the original rows so only changed cells are written back later
+        self.snapshot = {row["id"]: copy.deepcopy(row) for row in sheet_data if "id" in row}
+        return sheet_data
+
+    def _build_headers(self):
+        """
+        Builds the request headers with the configured Sheety authentication.
+
+        Returns:
+            dict: The headers for a JSON request.
         """
-        Updates the IATA codes and lowest prices in the Google Sheet using a PUT request per row.
+        headers = {"Content-Type": "application/json"}
+
+        if self.sheety_token:
+            if self.sheety_token.startswith('Basic '):
+                headers["Authorization"] = self.sheety_token
+            else:
+                headers["Authorization"] = f"Bearer {self.sheety_token}"
+
+        return headers
+
+    def _auth(self):
+        """Returns the Basic Auth tuple if username/password are configured, otherwise None."""
+        if self.sheety_username and self.sheety_password:
+            return (self.sheety_username, self.sheety_password)
+        return None
+
+    @staticmethod
+    def _same_value(old, new):
+        """Compares two cell values, treating 500 and "500.0" as the same price."""
+        try:
+            return float(old) == float(new)
+        except (TypeError, ValueError):
+            return str(old if old is not None else "") == str(new if new is not None else "")
+
+    def get_changed_cells(self, data):
+        """
+        Diffs the rows against the snapshot taken in get_destination_data.
 
         Args:
             data (list): A list of destination dictionaries.
+
+        Returns:
+            dict: {row_id: {column: new_value}} with only the cells that changed.
         """
+        changes = {}
         for destination in data:
-            # Skip if no valid data to update
-            if not destination.get("iataCode") or destination.get("lowestPrice") in ["N/A", None]:
-                print(f"⏭️ Skipping row {destination.get('id', 'unknown')} - No valid flight data")
+            row_id = destination.get("id")
+            if row_id is None:
                 continue
-                
-            row_id = destination["id"]
-            endpoint = f"{self.sheety_endpoint}/{row_id}"
-
-            # Sheety expects the data nested under the sheet name "prices"
-            # Using the exact column names from your Google Sheet
-            new_data = {
-                "price": {  # This should match your sheet object name in Sheety
-                    "iataCode": destination["iataCode"],
-                    "lowestPrice": destination["lowestPrice"]
-                }
-            }
-            
-            print(f"🔄 Updating row {row_id}")
-            print(f"🔄 Endpoint: {endpoint}")
-            print(f"🔄 Data: {new_data}")
-            
+
+            original = self.snapshot.get(row_id, {})
+            changed_cells = {}
+            for column in WRITABLE_COLUMNS:
+                value = destination.get(column)
+                # Never write empty or "N/A" values over the sheet
+                if value in ["N/A", None, ""]:
+                    continue
+                if column not in original or not self._same_value(original[column], value):
+                    changed_cells[column] = value
+
+            if changed_cells:
+                changes[row_id] = changed_cells
+        return changes
+
+    def _put_row(self, row_id, cells):
+        """
+        Sends one PUT with all the changed cells of a row.
+        The payload key that works ("price" or "prices") is remembered after the first success.
+
+        Args:
+            row_id (int): The sheet row id.
+            cells (dict): The changed columns and their new values.
+
+        Returns:
+            bool: True if the row was updated, False otherwise.
+        """
+        endpoint = f"{self.sheety_endpoint}/{row_id}"
+        # Sheety expects the data nested under the sheet object name; probe both until one works
+        candidate_keys = [self.payload_key] if self.payload_key else PAYLOAD_KEYS
+
+        for key in candidate_keys:
             try:
-                # Prepare headers
-                headers = {"Content-Type": "application/json"}
-                
-                if self.sheety_token:
-                    if self.sheety_token.startswith('Basic '):
-                        headers["Authorization"] = self.sheety_token
-                    else:
-                        headers["Authorization"] = f"Bearer {self.sheety_token}"
-                
-                # Make the PUT request
-                if self.sheety_username and self.sheety_password:
-                    response = requests.put(
-                        url=endpoint,
-                        json=new_data,
-                        headers=headers,
-                        auth=(self.sheety_username, self.sheety_password)
-                    )
-                else:
-                    response = requests.put(
-                        url=endpoint,
-                        json=new_data,
-                        headers=headers
-                    )
-                
-                print(f"📡 Response Status: {response.status_code}")
-                print(f"📡 Response Text: {response.text}")
-                
-                response.raise_for_status()
-                print(f"✅ Updated row {row_id}: IATA={destination['iataCode']} | Price={destination['lowestPrice']}")
-                
-            except requests.exceptions.HTTPError as err:
-                print(f"❌ HTTP Error updating row {row_id}: {err}")
-                print(f"🔎 Status Code: {response.status_code}")
-                print(f"🔎 Response: {response.text}")
-                
-                # Try with "prices" instead of "price"
-                if response.status_code == 422 or response.status_code == 400:
-                    print("🔄 Trying with 'prices' key...")
-                    alternative_data = {
-                        "prices": {
-                            "iataCode": destination["iataCode"],
-                            "lowestPrice": destination["lowestPrice"]
-                        }
-                    }
-                    
-                    try:
-                        if self.sheety_username and self.sheety_password:
-                            response = requests.put(
-                                url=endpoint,
-                                json=alternative_data,
-                                headers=headers,
-                                auth=(self.sheety_username, self.sheety_password)
-                            )
-                        else:
-                            response = requests.put(
-                                url=endpoint,
-                                json=alternative_data,
-                                headers=headers
-                            )
-                        
-                        response.raise_for_status()
-                        print(f"✅ Updated row {row_id} with 'prices' key")
-                    except requests.exceptions.HTTPError:
-                        print(f"❌ Both 'price' and 'prices' keys failed for row {row_id}")
-                        print(f"🔎 Final Response: {response.text}")
-                        
+                response = self.session.put(
+                    url=endpoint,
+                    json={key: cells},
+                    headers=self._build_headers(),
+                    auth=self._auth()
+                )
             except requests.exceptions.RequestException as e:
-                print(f"❌ Request Error updating row {row_id}: {e}")
\ No newline at end of file
+                print(f"❌ Request Error updating row {row_id}: {e}")
+                return False
+
+            if response.ok:
+                if self.payload_key is None:
+                    print(f"🔑 Sheety accepts the '{key}' payload key")
+                self.payload_key = key
+                self.snapshot.setdefault(row_id, {"id": row_id}).update(cells)
+                print(f"✅ Updated row {row_id}: {cells}")
+                return True
+
+            print(f"❌ HTTP Error {response.status_code} updating row {row_id} with '{key}' key")
+            print(f"🔎 Response: {response.text}")
+            # Only a rejected payload is worth retrying with the other key
+            if response.status_code not in (400, 422):
+                return False
+
+        print(f"❌ Both 'price' and 'prices' keys failed for row {row_id}")
+        return False
+
+    def _open_write_queue(self):
+        """Opens the durable update queue (its flusher first sends what an earlier run left behind)."""
+        if self.write_queue is None:
+            self.write_queue = WriteBehindQueue(
+                self.session,
+                os.getenv("SHEETY_QUEUE_PATH", DEFAULT_QUEUE_PATH),
+                headers=self._build_headers(),
+                auth=self._auth(),
+                on_sent=self._on_row_sent,
+                payload_variants=self._row_payloads
+            )
+        return self.write_queue
+
+    def _row_payloads(self, meta, payload):
+        """
+        Called by the queue's flusher before sending a row update: the bodies to try, in order.
+        While no write has succeeded yet (in this run) both payload keys are probed, like _put_row does.
+        """
+        keys = [self.payload_key] if self.payload_key else PAYLOAD_KEYS
+        return [{key: meta["cells"]} for key in keys]
+
+    def _on_row_sent(self, meta, payload):
+        """Called by the queue's flusher once Sheety accepted a queued row update."""
+        row_id, cells = meta["row"], meta["cells"]
+        if self.payload_key is None:
+            self.payload_key = next(iter(payload))
+            print(f"🔑 Sheety accepts the '{self.payload_key}' payload key")
+        print(f"✅ Updated row {row_id}: {cells}")
+        with self._snapshot_lock:
+            self.snapshot_store.apply_changes({row_id: cells})
+
+    def update_destination_codes(self, data):
+        """
+        Writes the changed IATA codes and lowest prices back to the Google Sheet.
+
+        Only cells that differ from the snapshot taken in get_destination_data are sent,
+        with all the changes of a row coalesced into a single PUT (Sheety has no bulk update).
+        The first PUT is sent right away to find the payload key Sheety accepts; the others are
+        queued on disk and sent in the background (write-behind), so the pipeline never waits on
+        Sheety and an outage only delays the updates. Call close() to wait for them.
+
+        Args:
+            data (list): A list of destination dictionaries.
+
+        Returns:
+            dict: Number of rows updated, queued, failed and left unchanged.
+        """
+        # Opening the queue also resumes the updates an earlier run could not send
+        write_queue = self._open_write_queue()
+        changes = self.get_changed_cells(data)
+        unchanged = len(data) - len(changes)
+        print(f"🔄 {len(changes)} rows changed, {unchanged} unchanged rows skipped")
+        summary = {"updated": 0, "queued": 0, "failed": 0, "unchanged": unchanged}
+
+        if not changes:
+            return summary
+
+        pending = list(changes.items())
+
+        # The first write runs alone so the payload key probe happens only once
+        if self.payload_key is None:
+            row_id, cells = pending.pop(0)
+            if self._put_row(row_id, cells):
+                summary["updated"] += 1
+                with self._snapshot_lock:
+                    self.snapshot_store.apply_changes({row_id: cells})
+            else:
+                # Not lost: it is queued with the others and retried in the background
+                pending.insert(0, (row_id, cells))
+
+        if pending:
+            # The flusher probes the other key if this one is refused (see _row_payloads)
+            key = self.payload_key or PAYLOAD_KEYS[0]
+            write_queue.put_many([
+                ("PUT", f"{self.sheety_endpoint}/{row_id}", {key: cells}, {"row": row_id, "cells": cells})
+                for row_id, cells in pending
+            ])
+            for row_id, cells in pending:
+                # The diff baseline assumes the write goes through, so a row isn't queued twice
+                self.snapshot.setdefault(row_id, {"id": row_id}).update(cells)
+            summary["queued"] += len(pending)
+
+        return summary
+
+    def close(self, timeout=None):
+        """
+        Waits for the queued row updates to reach the sheet and closes the queue.
+        Updates still queued after the timeout are kept on disk and sent by the next run.
+
+        Args:
+            timeout (float): Seconds to wait. Defaults to SHEETY_FLUSH_TIMEOUT or 60 seconds.
+
+        Returns:
+            dict: The queue counters (sent, failed, retries, pending...), or None if nothing was queued.
+        """
+        if self.write_queue is None:
+            return None
+        if timeout is None:
+            timeout = float(os.getenv("SHEETY_FLUSH_TIMEOUT", DEFAULT_FLUSH_TIMEOUT_SECONDS))
+        stats = self.write_queue.close(timeout)
+        self.write_queue = None
+        return stats
@@ -1,9 +1,215 @@
+from datetime import date
+import sys
+import numpy as np
+
+# Date ordinal used when a date is unknown
+NO_DATE = 0
+
+
+def _to_ordinal(value):
+    """Converts a date, a "YYYY-MM-DD" string or an ordinal to an ordinal day (NO_DATE if unknown)."""
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, date):
+        return value.toordinal()
+    if value and value != "N/A":
+        try:
+            return date.fromisoformat(str(value)[:10]).toordinal()
+        except ValueError:
+            pass
+    return NO_DATE
+
+
+def _from_ordinal(ordinal):
+    """Converts an ordinal day back to "YYYY-MM-DD" ("N/A" if unknown)."""
+    return date.fromordinal(ordinal).isoformat() if ordinal > NO_DATE else "N/A"
+
+
+def _intern_code(code):
+    """Interns an IATA code so thousands of results share one string object per airport."""
+    return sys.intern(code) if code else "N/A"
+
+
 class FlightData:
     #This class is responsible for structuring the flight data.
-    
-    def __init__(self, price, origin_airport, destination_airport, out_date, return_date):
-        self.price = price
+    # __slots__ keeps every result small: price as a float, dates as ordinal days, interned IATA codes.
+    __slots__ = ("price", "origin_airport", "destination_airport", "out_day", "return_day", "from_cache")
+
+    def __init__(self, price, origin_airport, destination_airport, out_date, return_date, from_cache=False):
+        # "N/A" (or None) means no flight was found
+        self.price = float(price) if price not in (None, "", "N/A") else None
+        self.origin_airport = _intern_code(origin_airport)
+        self.destination_airport = _intern_code(destination_airport)
+        self.out_day = _to_ordinal(out_date)
+        self.return_day = _to_ordinal(return_date)
+        # True if the offer was answered by the offer cache (already observed by an earlier search)
+        self.from_cache = from_cache
+
+    @classmethod
+    def not_found(cls):
+        """Returns the placeholder used when no flight was found."""
+        return cls(None, "N/A", "N/A", NO_DATE, NO_DATE)
+
+    @property
+    def found(self):
+        """bool: True if this result has a price."""
+        return self.price is not None
+
+    @property
+    def out_date(self):
+        """str: Departure date as "YYYY-MM-DD" ("N/A" if unknown)."""
+        return _from_ordinal(self.out_day)
+
+    @property
+    def return_date(self):
+        """str: Return date as "YYYY-MM-DD" ("N/A" if unknown)."""
+        return _from_ordinal(self.return_day)
+
+    def __repr__(self):
+        return (f"FlightData(price={self.price}, {self.origin_airport}→{self.destination_airport}, "
+                f"{self.out_date} - {self.return_date})")
+
+
+class FlightBatch:
+    """
+    This class holds many flight results in parallel arrays (columnar layout) instead of
+    one object per result: prices (NaN = not found), departure/return ordinal days and
+    airport indexes into a shared table of IATA codes.
+    """
+
+    def __init__(self, capacity=64):
+        self._size = 0
+        self._prices = np.empty(capacity, dtype=np.float64)
+        self._out_days = np.empty(capacity, dtype=np.int32)
+        self._return_days = np.empty(capacity, dtype=np.int32)
+        self._origins = np.empty(capacity, dtype=np.uint16)
+        self._destinations = np.empty(capacity, dtype=np.uint16)
+        self.codes = []           # Index -> IATA code
+        self._code_index = {}     # IATA code -> index
+
+    def __len__(self):
+        return self._size
+
+    def _code(self, code):
+        """Returns the index of an IATA code in the shared code table, adding it if needed."""
+        index = self._code_index.get(code)
+        if index is None:
+            index = len(self.codes)
+            self.codes.append(_intern_code(code))
+            self._code_index[code] = index
+        return index
+
+    def _grow(self):
+        """Doubles the capacity of every column."""
+        capacity = max(1, len(self._prices) * 2)
+        for name in ("_prices", "_out_days", "_return_days", "_origins", "_destinations"):
+            column = getattr(self, name)
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            setattr(self, name, grown)
+
+    def append(self, flight):
+        """
+        Adds one result to the batch.
+
+        Args:
+            flight (FlightData): The result (not-found results are stored with a NaN price).
+
+        Returns:
+            int: The position of the result in the batch.
+        """
+        if self._size == len(self._prices):
+            self._grow()
+        position = self._size
+        self._prices[position] = flight.price if flight.found else np.nan
+        self._out_days[position] = flight.out_day
+        self._return_days[position] = flight.return_day
+        self._origins[position] = self._code(flight.origin_airport)
+        self._destinations[position] = self._code(flight.destination_airport)
+        self._size += 1
+        return position
+
+    def extend(self, flights):
+        """Adds several results to the batch."""
+        for flight in flights:
+            self.append(flight)
+
+    @property
+    def prices(self):
+        """numpy.ndarray: Price of every result (NaN = no flight found)."""
+        return self._prices[:self._size]
+
+    @property
+    def out_days(self):
+        """numpy.ndarray: Departure ordinal day of every result."""
+        return self._out_days[:self._size]
+
+    @property
+    def return_days(self):
+        """numpy.ndarray: Return ordinal day of every result."""
+        return self._return_days[:self._size]
+
+    def __getitem__(self, position):
+        """Rebuilds the FlightData of one result (only when it is actually needed)."""
+        if not -self._size <= position < self._size:
+            raise IndexError("FlightBatch index out of range")
+        position %= self._size
+        price = self._prices[position]
+        return FlightData(
+            None if np.isnan(price) else float(price),
+            self.codes[self._origins[position]],
+            self.codes[self._destinations[position]],
+            int(self._out_days[position]),
+            int(self._return_days[position])
+        )
+
+    def cheapest(self):
+        """
+        Returns the position of the cheapest result.
+
+        Returns:
+            int: The position, or None if no result has a price.
+        """
+        prices = self.prices
+        if len(prices) == 0 or np.all(np.isnan(prices)):
+            return None
+        return int(np.nanargmin(prices))
+
+
+class PriceGrid:
+    """
+    This class is a compact price matrix for one route: departure dates x trip lengths.
+    Only the prices and the cheapest FlightData are kept, not every API response.
+    """
+
+    def __init__(self, origin_airport, destination_airport, departure_dates, trip_lengths):
         self.origin_airport = origin_airport
         self.destination_airport = destination_airport
-        self.out_date = out_date
-        self.return_date = return_date
\ No newline at end of file
+        self.departure_dates = list(departure_dates)
+        self.trip_lengths = np.asarray(trip_lengths, dtype=np.int16)
+        # NaN = not searched or no flight found
+        self.prices = np.full((len(self.departure_dates), len(self.trip_lengths)), np.nan, dtype=np.float32)
+        self.best_price = float("inf")
+        self.best_flight = FlightData.not_found()
+
+    def record(self, cell, flight):
+        """Stores the price found for a (departure index, trip length index) cell."""
+        if flight is None or not flight.found:
+            return
+        price = flight.price
+        self.prices[cell] = price
+        if price < self.best_price:
+            self.best_price = price
+            self.best_flight = flight
+
+    def cheapest(self):
+        """
+        Returns the cheapest combination in the grid.
+
+        Returns:
+            tuple: (departure date, trip length in days, price) or None if nothing was found.
+        """
+        if np.all(np.isnan(self.prices)):
+            return None
+        row, column = np.unravel_index(np.nanargmin(self.prices), self.prices.shape)
+        return self.departure_dates[row], int(self.trip_lengths[column]), float(self.prices[row, column])
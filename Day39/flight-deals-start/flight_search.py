@@ -1,7 +1,30 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
-from flight_data import FlightData
+from flight_data import FlightData, PriceGrid
+from http_session import create_session
+from iata_cache import IataCache
+from offer_cache import OfferCache, STALE, normalize_query
+from token_manager import TokenManager
 import requests
+import json
 import os
+import threading
+
+import repo_root
+from common.json_stream import STREAM_CHUNK_SIZE, first_array_item
+
+# Amadeus test environment (override with AMADEUS_BASE_URL, e.g. for a local stand-in)
+DEFAULT_AMADEUS_BASE_URL = "https://test.api.amadeus.com"
+
+# Default number of flight searches that may run at the same time
+DEFAULT_SEARCH_CONCURRENCY = 5
+# The Amadeus test environment allows 10 transactions per second
+DEFAULT_AMADEUS_REQUESTS_PER_SECOND = 10
+
+# Date grid defaults: a cell is only explored further if it is within 15% of the best price,
+# and the first (coarse) pass samples every 2nd departure day and trip length
+DEFAULT_GRID_PRUNE_MARGIN = 0.15
+DEFAULT_GRID_COARSE_STEP = 2
 
 class FlightSearch:
     """
@@ -9,13 +32,48 @@ class FlightSearch:
     It handles authentication, retrieving IATA codes for cities, and searching for flights.
     """
 
-    def __init__(self):
+    def __init__(self, iata_cache=None, session=None, offer_cache=None):
         """
-        Initializes the FlightSearch object by loading the API credentials and obtaining an access token.
+        Initializes the FlightSearch object by loading the API credentials.
+        The access token is requested lazily by the TokenManager on the first API call.
+
+        Args:
+            iata_cache (IataCache): Cache used for city -> IATA lookups. A default on-disk cache is created if omitted.
+            session (HttpSession): Shared pooled HTTP session. A new one is created if omitted.
+            offer_cache (OfferCache): Cache of flight-offer responses. A default on-disk cache is created if omitted.
         """
         self.api_key = os.getenv("AMADEUS_API_KEY")
         self.api_secret = os.getenv("AMADEUS_API_SECRET")        
-        self.token = self.get_access_token()
+        self.base_url = os.getenv("AMADEUS_BASE_URL", DEFAULT_AMADEUS_BASE_URL)
+        self.max_workers = int(os.getenv("FLIGHT_SEARCH_CONCURRENCY", DEFAULT_SEARCH_CONCURRENCY))
+        self.iata_cache = iata_cache or IataCache()
+        self.offer_cache = offer_cache or OfferCache()
+        # Background refreshes of stale offers (created on first use)
+        self._refresh_executor = None
+        self._refreshing = set()
+        self._refresh_lock = threading.Lock()
+        # Shared bounded pool every flight search is scheduled on (created on first use), see submit_search
+        self._search_executor = None
+        self._search_jobs = {}           # Searches waiting or running, for dedup
+        self._search_lock = threading.Lock()
+        self.session = session or create_session()
+        if hasattr(self.session, "rate_limits"):
+            # Every Amadeus request (token, locations, offers) shares this host's token bucket
+            self.session.rate_limits.configure(
+                self.base_url,
+                float(os.getenv("AMADEUS_REQUESTS_PER_SECOND", DEFAULT_AMADEUS_REQUESTS_PER_SECOND))
+            )
+        self.token_manager = TokenManager(
+            token_url=f"{self.base_url}/v1/security/oauth2/token",
+            api_key=self.api_key,
+            api_secret=self.api_secret,
+            session=self.session
+        )
+
+    @property
+    def token(self):
+        """str: A valid access token (refreshed automatically when it is about to expire)."""
+        return self.token_manager.get_token()
 
     def get_access_token(self):
         """
@@ -24,23 +82,100 @@ class FlightSearch:
         Returns:
             str: The access token.
         """
-        url = "https://test.api.amadeus.com/v1/security/oauth2/token"
-        headers = {
-            'Content-Type': 'application/x-www-form-urlencoded'
-        }    
-        body = {
-            "grant_type": "client_credentials",
-            "client_id": self.api_key,
-            "client_secret": self.api_secret
-        }
-        response = requests.post(url, headers=headers, data=body)
-        response.raise_for_status()
-        token = response.json()["access_token"]
-        return token
+        return self.token_manager.get_token()
+
+    def _get(self, url, params, stream=False):
+        """
+        Sends an authenticated GET request to Amadeus.
+        If the token is rejected with a 401, it is refreshed once and the request retried.
+
+        Args:
+            url (str): The endpoint to call.
+            params (dict): The query parameters.
+            stream (bool): Leave the body unread so the caller can stream it.
+
+        Returns:
+            requests.Response: The API response.
+        """
+        token = self.token_manager.get_token()
+        response = self.session.get(url, headers={"Authorization": f"Bearer {token}"}, params=params, stream=stream)
+        if response.status_code == 401:
+            print("🔑 Access token rejected, refreshing...")
+            response.close()
+            self.token_manager.invalidate(token)
+            token = self.token_manager.get_token()
+            response = self.session.get(url, headers={"Authorization": f"Bearer {token}"}, params=params,
+                                        stream=stream)
+        return response
+
+    def _fetch_first_offer(self, url, params):
+        """
+        Sends an offer query to Amadeus and reads the body only up to the end of the first offer
+        (the rest of the offers and the dictionaries are never downloaded or parsed).
+        Only that offer is cached.
+        """
+        with self._get(url, params, stream=True) as response:
+            response.raise_for_status()
+            offer = first_array_item(response.iter_content(STREAM_CHUNK_SIZE), "data")
+        body = {"data": [offer] if offer is not None else []}
+        self.offer_cache.set(url, params, json.dumps(body, separators=(",", ":")).encode("utf-8"))
+        return offer
+
+    def _get_first_offer(self, url, params):
+        """
+        Returns the first (cheapest) offer of a query, from the offer cache when possible.
+        A stale cached response is returned right away and refreshed in the background.
+
+        Args:
+            url (str): The endpoint to call.
+            params (dict): The query parameters.
+
+        Returns:
+            tuple: (the decoded offer or None if there is none, True if it came from the cache)
+
+        Raises:
+            KeyError: If the response has no "data" (e.g. an error document).
+        """
+        body, state = self.offer_cache.get(url, params)
+        if body is None:
+            return self._fetch_first_offer(url, params), False
+        if state == STALE:
+            self._revalidate(url, params)
+        return first_array_item(body, "data"), True
+
+    def _revalidate(self, url, params):
+        """Refreshes a stale cached query in the background (once, even if it is requested again meanwhile)."""
+        query = normalize_query(url, params)
+        with self._refresh_lock:
+            if query in self._refreshing:
+                return
+            self._refreshing.add(query)
+            if self._refresh_executor is None:
+                self._refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="offer-refresh")
+
+        def refresh():
+            try:
+                self._fetch_first_offer(url, params)
+            except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+                print(f"⚠️ Could not refresh cached offers ({params.get('originLocationCode')} → "
+                      f"{params.get('destinationLocationCode')}): {e}")
+            finally:
+                with self._refresh_lock:
+                    self._refreshing.discard(query)
+
+        self._refresh_executor.submit(refresh)
+
+    def wait_for_refreshes(self):
+        """Waits until the background refreshes of stale offers are done (call before exiting)."""
+        with self._refresh_lock:
+            executor, self._refresh_executor = self._refresh_executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
 
     def get_iata_code(self, city_name):
         """
         Gets the IATA airport code for a given city using the Amadeus API.
+        Results (including "not found") are served from the IATA cache when possible.
 
         Args:
             city_name (str): The name of the city to look up.
@@ -48,11 +183,13 @@ class FlightSearch:
         Returns:
             str: The IATA code if found, otherwise an empty string.
         """
+        cached_code = self.iata_cache.get(city_name)
+        if cached_code is not None:
+            print(f"💾 IATA code for {city_name} (cached): {cached_code or 'not found'}")
+            return cached_code
+
         print(f"🔍 Looking up IATA code for: {city_name}")  # Debug print
-        url = "https://test.api.amadeus.com/v1/reference-data/locations"
-        headers = {
-            "Authorization": f"Bearer {self.token}"
-        }
+        url = f"{self.base_url}/v1/reference-data/locations"
         params = {
             "keyword": city_name,
             "subType": "CITY",
@@ -60,42 +197,46 @@ class FlightSearch:
         }
 
         try:
-            response = requests.get(url, headers=headers, params=params)
+            response = self._get(url, params)
             response.raise_for_status()
             data = response.json()
-            print(f"✅ IATA code for {city_name}: {data['data'][0]['iataCode']}")  # Debug print
-            return data["data"][0]["iataCode"]
+            iata_code = data["data"][0]["iataCode"]
+            print(f"✅ IATA code for {city_name}: {iata_code}")  # Debug print
+            self.iata_cache.set(city_name, iata_code)
+            return iata_code
         except (IndexError, KeyError):
             print(f"❌ IATA code not found for: {city_name}")
+            # Remember the miss for a shorter time so a misspelled city doesn't cost a call every run
+            self.iata_cache.set(city_name, "")
             return ""
         except requests.exceptions.RequestException as e:
             print(f"❌ Error fetching IATA code for '{city_name}': {e}")
             return ""
 
-    def search_flights(self, origin_city_code, destination_city_code):
+    def search_flights(self, origin_city_code, destination_city_code, departure_date=None, return_date=None):
         """
         Searches for the cheapest round-trip flight between two city codes using the Amadeus API.
+        Identical queries made recently are answered from the offer cache.
 
         Args:
             origin_city_code (str): The IATA code of the origin city.
             destination_city_code (str): The IATA code of the destination city.
+            departure_date (date): Departure date. Defaults to tomorrow.
+            return_date (date): Return date. Defaults to 180 days from now.
 
         Returns:
-            FlightData: An object containing flight information (or "N/A" values if not found).
+            FlightData: An object containing flight information (FlightData.not_found() if not found).
         """
-        url = "https://test.api.amadeus.com/v2/shopping/flight-offers"
-        headers = {
-            "Authorization": f"Bearer {self.token}"
-        }
+        url = f"{self.base_url}/v2/shopping/flight-offers"
 
-        tomorrow = datetime.now() + timedelta(days=1)
-        six_months_later = datetime.now() + timedelta(days=180)
+        departure_date = departure_date or datetime.now() + timedelta(days=1)
+        return_date = return_date or datetime.now() + timedelta(days=180)
 
         params = {
             "originLocationCode": origin_city_code,
             "destinationLocationCode": destination_city_code,
-            "departureDate": tomorrow.strftime("%Y-%m-%d"),
-            "returnDate": six_months_later.strftime("%Y-%m-%d"),
+            "departureDate": departure_date.strftime("%Y-%m-%d"),
+            "returnDate": return_date.strftime("%Y-%m-%d"),
             "adults": 1,
             # You may enable the next line to search only for non-stop flights
             # "nonStop": True,
@@ -104,9 +245,10 @@ class FlightSearch:
         }
 
         try:
-            response = requests.get(url, headers=headers, params=params)
-            response.raise_for_status()
-            data = response.json()["data"][0]
+            data, from_cache = self._get_first_offer(url, params)
+            if data is None:
+                print(f"⚠️ No flights found: {origin_city_code} → {destination_city_code}")
+                return FlightData.not_found()
             itinerary = data["itineraries"][0]
             segments = itinerary["segments"][0]
             return FlightData(
@@ -114,11 +256,166 @@ class FlightSearch:
                 origin_airport=segments["departure"]["iataCode"],
                 destination_airport=segments["arrival"]["iataCode"],
                 out_date=segments["departure"]["at"].split("T")[0],
-                return_date=itinerary["segments"][-1]["arrival"]["at"].split("T")[0]
+                return_date=itinerary["segments"][-1]["arrival"]["at"].split("T")[0],
+                from_cache=from_cache
             )
         except (IndexError, KeyError):
             print(f"⚠️ No flights found: {origin_city_code} → {destination_city_code}")
-            return FlightData("N/A", "N/A", "N/A", "N/A", "N/A")
+            return FlightData.not_found()
         except requests.exceptions.RequestException as e:
             print(f"❌ Error searching flights {origin_city_code} → {destination_city_code}: {e}")
-            return FlightData("N/A", "N/A", "N/A", "N/A", "N/A")
+            return FlightData.not_found()
+
+    def submit_search(self, origin_city_code, destination_city_code, departure_date=None, return_date=None):
+        """
+        Schedules a search_flights call on the shared bounded thread pool.
+
+        Every search of the run (rows, origins, date grid cells) goes through this one pool,
+        so at most max_workers searches are in flight at once whoever asks for them. An identical
+        search still waiting or running (e.g. two rows with the same destination) is not run again:
+        its future is returned instead. Finished searches are forgotten (repeats are answered by the
+        offer cache), so memory doesn't grow with the run and a failed search can be tried again.
+
+        Args:
+            origin_city_code (str): The IATA code of the origin city.
+            destination_city_code (str): The IATA code of the destination city.
+            departure_date (date): Departure date. Defaults to tomorrow.
+            return_date (date): Return date. Defaults to 180 days from now.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the FlightData of the search.
+        """
+        job = (origin_city_code, destination_city_code, departure_date, return_date)
+        with self._search_lock:
+            future = self._search_jobs.get(job)
+            if future is not None:
+                return future
+            if self._search_executor is None:
+                self._search_executor = ThreadPoolExecutor(max_workers=max(1, self.max_workers),
+                                                           thread_name_prefix="flight-search")
+            future = self._search_executor.submit(self.search_flights, *job)
+            self._search_jobs[job] = future
+        # Outside the lock: the callback runs right here if the search is already done
+        future.add_done_callback(lambda _: self._forget_search(job, future))
+        return future
+
+    def _forget_search(self, job, future):
+        """Removes a finished search from the in-flight jobs."""
+        with self._search_lock:
+            if self._search_jobs.get(job) is future:
+                del self._search_jobs[job]
+
+    def search_flights_many(self, origin_city_code, destination_city_codes):
+        """
+        Searches for the cheapest round-trip flight to several destinations in parallel.
+
+        The searches run on the shared bounded pool (see submit_search), so a long sheet costs
+        roughly (rows / max_workers) round-trips instead of one round-trip per row.
+
+        Args:
+            origin_city_code (str): The IATA code of the origin city.
+            destination_city_codes (list): The IATA codes of the destination cities.
+
+        Returns:
+            list: FlightData objects in the same order as destination_city_codes.
+        """
+        destination_city_codes = list(destination_city_codes)
+        if not destination_city_codes:
+            return []
+
+        print(f"🚀 Searching {len(destination_city_codes)} destinations from {origin_city_code} "
+              f"with {self.max_workers} parallel workers")
+        futures = [self.submit_search(origin_city_code, destination) for destination in destination_city_codes]
+        return [future.result() for future in futures]
+
+    def search_routes(self, origin_city_codes, destination_city_codes):
+        """
+        Searches every origin x destination pair and yields the results as they complete.
+
+        Duplicate pairs (and origin == destination) are searched only once. All the jobs share
+        the bounded search pool and the session's Amadeus rate limiter, so adding origins scales with
+        the concurrency instead of multiplying the runtime.
+
+        Args:
+            origin_city_codes (list): IATA codes of the home airports, e.g. ["MEX", "GDL"].
+            destination_city_codes (list): IATA codes of the destinations.
+
+        Yields:
+            tuple: (origin, destination, FlightData) in completion order.
+        """
+        jobs = list(dict.fromkeys(
+            (origin, destination)
+            for origin in origin_city_codes
+            for destination in destination_city_codes
+            if origin != destination
+        ))
+        if not jobs:
+            return
+
+        print(f"🚀 Searching {len(jobs)} routes from {len(set(origin_city_codes))} origins "
+              f"with {self.max_workers} parallel workers")
+        futures = {self.submit_search(origin, destination): (origin, destination) for origin, destination in jobs}
+        for future in as_completed(futures):
+            origin, destination = futures[future]
+            yield origin, destination, future.result()
+
+    def search_date_grid(self, origin_city_code, destination_city_code, departure_dates, trip_lengths,
+                         prune_margin=DEFAULT_GRID_PRUNE_MARGIN, coarse_step=DEFAULT_GRID_COARSE_STEP):
+        """
+        Searches a grid of departure dates x trip lengths for one route.
+
+        A coarse pass samples every `coarse_step`-th cell first. Then only the neighbours of
+        cells priced within `prune_margin` of the best price so far are searched, wave after
+        wave, so expensive regions of the grid are never fully expanded.
+        Every wave is fanned out through the shared search pool (see submit_search), so this
+        method must not be called from a search running in that pool.
+
+        Args:
+            origin_city_code (str): The IATA code of the origin city.
+            destination_city_code (str): The IATA code of the destination city.
+            departure_dates (list): Candidate departure dates (datetime.date objects).
+            trip_lengths (list): Candidate trip lengths in days.
+            prune_margin (float): Cells more than this fraction above the best price are not expanded.
+            coarse_step (int): Sampling step of the first pass (1 = search the full grid).
+
+        Returns:
+            PriceGrid: The price matrix of the route plus the cheapest FlightData found.
+        """
+        grid = PriceGrid(origin_city_code, destination_city_code, departure_dates, trip_lengths)
+        rows, columns = grid.prices.shape
+        if rows == 0 or columns == 0:
+            return grid
+
+        step = max(1, coarse_step)
+        searched = set()
+        wave = {(row, column) for row in range(0, rows, step) for column in range(0, columns, step)}
+
+        def submit_cell(cell):
+            row, column = cell
+            departure = grid.departure_dates[row]
+            return self.submit_search(
+                origin_city_code, destination_city_code,
+                departure_date=departure,
+                return_date=departure + timedelta(days=int(grid.trip_lengths[column]))
+            )
+
+        while wave:
+            searched |= wave
+            futures = [(cell, submit_cell(cell)) for cell in sorted(wave)]
+            for cell, future in futures:
+                grid.record(cell, future.result())
+
+            # Expand only around cells that are still competitive with the best price
+            limit = grid.best_price * (1 + prune_margin)
+            wave = set()
+            for row, column in searched:
+                if not grid.prices[row, column] <= limit:
+                    continue
+                for neighbour_row in range(max(0, row - step + 1), min(rows, row + step)):
+                    for neighbour_column in range(max(0, column - step + 1), min(columns, column + step)):
+                        if (neighbour_row, neighbour_column) not in searched:
+                            wave.add((neighbour_row, neighbour_column))
+
+        print(f"🗓️ {origin_city_code} → {destination_city_code}: searched {len(searched)} of "
+              f"{rows * columns} date combinations, best ${grid.best_price}")
+        return grid
@@ -0,0 +1,88 @@
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import repo_root
+from common.rate_limiter import RateLimitedSession, RateLimiterRegistry
+
+# Connection pool and retry defaults shared by Sheety, Amadeus and Twilio calls
+DEFAULT_POOL_CONNECTIONS = 10    # Number of hosts kept in the pool cache
+DEFAULT_POOL_MAXSIZE = 10        # Keep-alive connections per host
+DEFAULT_TIMEOUT = (5, 30)        # (connect, read) seconds
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF_FACTOR = 0.5     # Waits 0.5s, 1s, 2s... between retries
+# 429 is handled by the rate limiter (Retry-After + adaptive concurrency), not by urllib3
+RETRY_STATUS_CODES = (500, 502, 503, 504)
+# POST is left out on purpose: retrying it could send the same SMS twice
+RETRY_METHODS = frozenset(["GET", "PUT", "DELETE", "HEAD", "OPTIONS"])
+
+
+class HttpSession(RateLimitedSession):
+    """
+    This class is a rate-limited requests.Session that applies a default timeout to every request.
+    Keep-alive connections are reused through the pooled adapters mounted by create_session().
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, rate_limits=None):
+        """
+        Initializes the session.
+
+        Args:
+            timeout (float/tuple): Default timeout used when a request doesn't set one.
+            rate_limits (RateLimiterRegistry): Per-host rate limiters. Defaults to the known API quotas.
+        """
+        super().__init__(rate_limits=rate_limits)
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        """Sends a request, adding the default timeout if none was given."""
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+def _make_adapter(pool_connections, pool_maxsize, retries, backoff_factor):
+    """Builds an HTTPAdapter with connection pooling and retry-with-backoff."""
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=RETRY_METHODS,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    return HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry)
+
+
+def create_session(pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                   host_pool_sizes=None, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES,
+                   backoff_factor=DEFAULT_BACKOFF_FACTOR, rate_limits=None):
+    """
+    Creates a pooled, keep-alive HTTP session to be shared by all the managers.
+
+    Args:
+        pool_connections (int): Number of different hosts whose pools are cached.
+        pool_maxsize (int): Default number of keep-alive connections per host.
+        host_pool_sizes (dict): Optional per-host pool sizes, e.g. {"https://api.sheety.co": 2}.
+        timeout (float/tuple): Default (connect, read) timeout for every request.
+        retries (int): Retries for connection errors and 5xx responses.
+        backoff_factor (float): Exponential backoff factor between retries.
+        rate_limits (RateLimiterRegistry): Per-host rate limiters. Defaults to the known API quotas.
+
+    Returns:
+        HttpSession: The configured session.
+    """
+    session = HttpSession(timeout=timeout, rate_limits=rate_limits or RateLimiterRegistry())
+    default_adapter = _make_adapter(pool_connections, pool_maxsize, retries, backoff_factor)
+    session.mount("https://", default_adapter)
+    session.mount("http://", default_adapter)
+
+    # requests picks the adapter with the longest matching prefix, so these win over the defaults
+    for host, maxsize in (host_pool_sizes or {}).items():
+        parsed = urlparse(host if "://" in host else f"https://{host}")
+        prefix = f"{parsed.scheme}://{parsed.netloc}"
+        session.mount(prefix, _make_adapter(1, maxsize, retries, backoff_factor))
+
+    return session
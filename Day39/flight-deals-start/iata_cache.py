@@ -0,0 +1,137 @@
+import os
+import sqlite3
+import threading
+import time
+
+# City -> IATA mappings almost never change, misspelled cities might get fixed in the sheet
+DEFAULT_TTL_SECONDS = 30 * 24 * 60 * 60          # 30 days for found codes
+DEFAULT_NEGATIVE_TTL_SECONDS = 24 * 60 * 60      # 1 day for "not found" lookups
+DEFAULT_MAX_ENTRIES = 5000
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "iata_cache.sqlite3")
+
+
+class IataCache:
+    """
+    This class is a small on-disk cache (SQLite) for city -> IATA code lookups.
+    Entries expire after a TTL, "not found" results are cached for a shorter time,
+    and the least recently used entries are evicted once the cache is full.
+    """
+
+    def __init__(self, path=None, ttl=DEFAULT_TTL_SECONDS,
+                 negative_ttl=DEFAULT_NEGATIVE_TTL_SECONDS, max_entries=DEFAULT_MAX_ENTRIES):
+        """
+        Opens (or creates) the cache database.
+
+        Args:
+            path (str): Location of the SQLite file. Defaults to IATA_CACHE_PATH or a file next to this module.
+            ttl (int): Seconds a found IATA code stays valid.
+            negative_ttl (int): Seconds a "not found" result stays valid.
+            max_entries (int): Maximum number of cities kept before LRU eviction.
+        """
+        self.path = path or os.getenv("IATA_CACHE_PATH", DEFAULT_CACHE_PATH)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        # The connection is shared by the search threads, access is serialized with the lock
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS iata_codes (
+                city TEXT PRIMARY KEY,
+                iata_code TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON iata_codes (last_used)")
+        self._connection.commit()
+
+    @staticmethod
+    def _normalize(city_name):
+        """Normalizes a city name so "  Paris" and "paris" share one entry."""
+        return " ".join(city_name.split()).lower()
+
+    def get(self, city_name):
+        """
+        Looks up a city in the cache.
+
+        Args:
+            city_name (str): The name of the city.
+
+        Returns:
+            str: The cached IATA code, "" for a cached "not found" result,
+                 or None if the city is not cached (or the entry expired).
+        """
+        city = self._normalize(city_name)
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT iata_code, expires_at FROM iata_codes WHERE city = ?", (city,)
+            ).fetchone()
+
+            if row is None or row[1] <= now:
+                if row is not None:
+                    self._connection.execute("DELETE FROM iata_codes WHERE city = ?", (city,))
+                    self._connection.commit()
+                self.misses += 1
+                return None
+
+            self._connection.execute("UPDATE iata_codes SET last_used = ? WHERE city = ?", (now, city))
+            self._connection.commit()
+            self.hits += 1
+            return row[0]
+
+    def set(self, city_name, iata_code):
+        """
+        Stores the lookup result for a city.
+
+        Args:
+            city_name (str): The name of the city.
+            iata_code (str): The IATA code, or "" if the city could not be found.
+        """
+        city = self._normalize(city_name)
+        now = time.time()
+        expires_at = now + (self.ttl if iata_code else self.negative_ttl)
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO iata_codes (city, iata_code, expires_at, last_used) VALUES (?, ?, ?, ?)",
+                (city, iata_code, expires_at, now)
+            )
+            self._evict()
+            self._connection.commit()
+
+    def _evict(self):
+        """Removes expired entries and, if still over capacity, the least recently used ones."""
+        self._connection.execute("DELETE FROM iata_codes WHERE expires_at <= ?", (time.time(),))
+        count = self._connection.execute("SELECT COUNT(*) FROM iata_codes").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._connection.execute(
+                "DELETE FROM iata_codes WHERE city IN "
+                "(SELECT city FROM iata_codes ORDER BY last_used ASC LIMIT ?)",
+                (overflow,)
+            )
+
+    def stats(self):
+        """
+        Returns the hit/miss counters of this cache.
+
+        Returns:
+            dict: Hits, misses and hit ratio since the cache was opened.
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+    def close(self):
+        """Closes the underlying database connection."""
+        with self._lock:
+            self._connection.close()
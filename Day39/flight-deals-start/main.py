@@ -1,180 +1,162 @@
 from data_manager import DataManager
-from flight_search import FlightSearch
-from notification_manager import NotificationManager
+from http_session import create_session
+from datetime import date, timedelta
 from pprint import pprint
 import os
 
-# Verify environment variables are loaded
-print("🔧 Checking environment variables...")
-required_vars = ["SHEETY_ENDPOINT", "AMADEUS_API_KEY", "AMADEUS_API_SECRET"]
-twilio_vars = ["TWILIO_ACCOUNT_SID", "TWILIO_AUTH_TOKEN", "TWILIO_PHONE_NUMBER", "RECIPIENT_PHONE_NUMBER"]
 
-for var in required_vars:
-    if os.getenv(var):
-        print(f"✅ {var}: Found")
-    else:
-        print(f"❌ {var}: Missing")
-
-print("\n🔧 Checking Twilio configuration...")
-for var in twilio_vars:
-    if os.getenv(var):
-        print(f"✅ {var}: Found")
-    else:
-        print(f"❌ {var}: Missing")
-
-# Initialize all managers
-data_manager = DataManager()
-flight_search = FlightSearch()
-notification_manager = NotificationManager()
-
-# Validate notification manager configuration
-notification_config = notification_manager.validate_configuration()
-if not notification_config["is_valid"]:
-    print(f"⚠️ Notification Manager not fully configured. Missing: {notification_config['missing_fields']}")
-    print("SMS notifications will be disabled.")
-else:
-    print("✅ Notification Manager configured correctly")
-
-# Fetch data from Google Sheet (destinations and their info)
-print("\n🌍 Fetching destination data from Google Sheets...")
-sheet_data = data_manager.get_destination_data()
-
-if not sheet_data:
-    print("❌ No data retrieved from Google Sheets. Check your credentials and endpoint.")
-    exit(1)
-
-print(f"📊 Retrieved {len(sheet_data)} destinations")
-print("🔍 Sample data structure:")
-if sheet_data:
-    pprint(sheet_data[0])
+def check_environment():
+    """Prints which of the required environment variables are set."""
+    # Verify environment variables are loaded
+    print("🔧 Checking environment variables...")
+    required_vars = ["SHEETY_ENDPOINT", "AMADEUS_API_KEY", "AMADEUS_API_SECRET"]
+    twilio_vars = ["TWILIO_ACCOUNT_SID", "TWILIO_AUTH_TOKEN", "TWILIO_PHONE_NUMBER", "RECIPIENT_PHONE_NUMBER"]
 
-# Loop through each destination in the sheet and search for flights from Mexico City (MEX)
-print("\n✈️ Searching for flights...")
-flight_deals = []  # Store deals to send notifications
-updates_made = []  # Store successful updates
-
-for row in sheet_data:
-    # Use the exact column names from your Google Sheet
-    city = row.get('city', 'Unknown City')  # Column: City
-    current_iata = row.get('iataCode', '')  # Column: IATA Code
-    current_lowest_price = row.get('lowestPrice', None)  # Column: Lowest Price
-    
-    print(f"\n🏙️ Processing: {city}")
-    print(f"   Current IATA: {current_iata}")
-    print(f"   Current lowest price: ${current_lowest_price}")
-    
-    # If no IATA code exists, try to get it first
-    if not current_iata or current_iata == '':
-        print(f"   🔍 No IATA code found, looking up for {city}")
-        new_iata = flight_search.get_iata_code(city)
-        if new_iata:
-            row["iataCode"] = new_iata  # This will update the IATA Code column
-            current_iata = new_iata
-            print(f"   ✅ Found IATA code: {new_iata}")
-        else:
-            print(f"   ❌ Could not find IATA code for {city}")
-            continue
-    
-    # Search for the cheapest flight from MEX to the destination's IATA code
-    print(f"   🔍 Searching flights: MEX → {current_iata}")
-    flight = flight_search.search_flights("MEX", current_iata)
-    
-    if flight and flight.price != "N/A":
-        found_price = float(flight.price)
-        print(f"   ✅ {city}: ${found_price}, from {flight.origin_airport} to {flight.destination_airport}")
-        print(f"      Departure: {flight.out_date} - Return: {flight.return_date}")
-        
-        # Check if this is a better deal than current lowest price
-        should_update = False
-        is_deal = False
-        
-        if current_lowest_price is None or current_lowest_price == "" or current_lowest_price == 0:
-            # No previous price, so update with found price
-            should_update = True
-            print(f"   📊 No previous price recorded, updating with ${found_price}")
+    for var in required_vars:
+        if os.getenv(var):
+            print(f"✅ {var}: Found")
         else:
-            current_price = float(current_lowest_price)
-            if found_price < current_price:
-                    # Found a better deal!
-                is_deal = True
-                should_update = True
-                savings = current_price - found_price
-                print(f"   🎉 DEAL FOUND! New price ${found_price} is ${savings:.2f} cheaper than ${current_price}")
-
-                # Add to deals list for notification
-                flight_deals.append({
-                    'city': city,
-                    'current_price': current_price,
-                    'found_price': found_price,
-                    'out_date': flight.out_date,
-                    'return_date': flight.return_date,
-                    'flight_data': flight
-                })
-
-            elif found_price == current_price:
-                print(f"   ℹ️ Same price as recorded: ${found_price}")
-            else:
-                print(f"   📈 Price increased: ${found_price} (was ${current_price})")
-        
-        # Update the row data if we should
-        if should_update:
-            row["iataCode"] = flight.destination_airport    # IATA Code column
-            row["lowestPrice"] = found_price                # Lowest Price column
-            updates_made.append({
-                'city': city,
-                'price': found_price,
-                'is_deal': is_deal
-            })
-    else:
-        # If no flight is found or an error occurred, print N/A for that city
-        print(f"   ❌ {city}: No flights found")
-        continue
-
-# Send notifications for deals found
-if flight_deals and notification_config["is_valid"]:
-    print(f"\n📱 Sending notifications for {len(flight_deals)} deals found...")
-    
-    if len(flight_deals) == 1:
-        # Send individual alert for single deal
-        deal = flight_deals[0]
-        success = notification_manager.send_flight_alert(
-            deal['flight_data'],
-            deal['city'],
-            deal['current_price'],
-            deal['found_price']
-        )
-        if success:
-            print("✅ Deal notification sent successfully!")
+            print(f"❌ {var}: Missing")
+
+    print("\n🔧 Checking Twilio configuration...")
+    for var in twilio_vars:
+        if os.getenv(var):
+            print(f"✅ {var}: Found")
         else:
-            print("❌ Failed to send deal notification")
+            print(f"❌ {var}: Missing")
+
+
+def build_pipeline(flight_search, data_manager, notification_manager, price_history, notifications_enabled,
+                   checkpoint=None):
+    """
+    Builds the streaming pipeline: lookup IATA → search → compare → write-back → notify.
+
+    Returns:
+        tuple: (Pipeline, WriteBackStage) so the caller can read the write-back summary.
+    """
+    from pipeline import (Pipeline, IataLookupStage, SearchStage, CompareStage,
+                          WriteBackStage, NotifyStage)
+
+    # Home airports to search from, e.g. ORIGINS=MEX,GDL,MTY (default: Mexico City)
+    origins = [code.strip().upper() for code in os.getenv("ORIGINS", "MEX").split(",") if code.strip()]
+    print(f"\n✈️ Searching for flights from {', '.join(origins)}...")
+
+    departure_dates = trip_lengths = None
+    date_grid_days = int(os.getenv("DATE_GRID_DAYS", 0))
+    if date_grid_days > 0:
+        # Flexible dates: departures over the next DATE_GRID_DAYS days x several trip lengths
+        tomorrow = date.today() + timedelta(days=1)
+        departure_dates = [tomorrow + timedelta(days=offset) for offset in range(date_grid_days)]
+        trip_lengths = [int(days) for days in os.getenv("DATE_GRID_TRIP_LENGTHS", "7,14,21").split(",")]
+
+    write_back = WriteBackStage(data_manager, checkpoint=checkpoint)
+    pipeline = Pipeline([
+        IataLookupStage(flight_search),
+        SearchStage(flight_search, origins, workers=flight_search.max_workers,
+                    departure_dates=departure_dates, trip_lengths=trip_lengths, checkpoint=checkpoint),
+        CompareStage(price_history),
+        write_back,
+        NotifyStage(notification_manager, enabled=notifications_enabled),
+    ])
+    return pipeline, write_back
+
+
+def main():
+    check_environment()
+
+    # All managers share one pooled HTTP session; only the sheet is needed to start
+    http_session = create_session(pool_maxsize=max(10, int(os.getenv("FLIGHT_SEARCH_CONCURRENCY", 5))))
+    data_manager = DataManager(session=http_session)
+
+    # Fetch data from Google Sheet (destinations and their info)
+    print("\n🌍 Fetching destination data from Google Sheets...")
+    sheet_data = data_manager.get_destination_data()
+
+    if not sheet_data:
+        print("❌ No data retrieved from Google Sheets. Check your credentials and endpoint.")
+        exit(1)
+
+    print(f"📊 Retrieved {len(sheet_data)} destinations")
+    print("🔍 Sample data structure:")
+    pprint(sheet_data[0])
+
+    # The flight search (NumPy, caches) and the notifications are only loaded once there is something to scan
+    from checkpoint import CheckpointJournal
+    from flight_search import FlightSearch
+    from notification_manager import NotificationManager
+    from price_history import PriceHistoryStore
+
+    flight_search = FlightSearch(session=http_session)
+    notification_manager = NotificationManager(session=http_session)
+
+    # Validate notification manager configuration
+    notification_config = notification_manager.validate_configuration()
+    if not notification_config["is_valid"]:
+        print(f"⚠️ Notification Manager not fully configured. Missing: {notification_config['missing_fields']}")
+        print("SMS notifications will be disabled.")
     else:
-        # Send summary alert for multiple deals
-        success = notification_manager.send_multiple_alerts(flight_deals)
-        if success:
-            print("✅ Multiple deals notification sent successfully!")
-        else:
-            print("❌ Failed to send multiple deals notification")
-elif flight_deals and not notification_config["is_valid"]:
-    print(f"\n⚠️ {len(flight_deals)} deals found but SMS notifications are disabled due to missing Twilio configuration")
-    for deal in flight_deals:
-        savings = deal['current_price'] - deal['found_price']
-        print(f"   🎉 {deal['city']}: ${deal['found_price']} (save ${savings:.2f})")
-else:
-    print("\n📊 No deals found this time. All current prices are still the best available.")
-
-# Print the data that will be sent to Sheety
-print(f"\n📋 {len(updates_made)} updates to be sent to Google Sheets:")
-for update in updates_made:
-    deal_indicator = "🎉 DEAL!" if update['is_deal'] else "📊 UPDATE"
-    print(f"   {deal_indicator} {update['city']}: ${update['price']}")
-
-# Send changes to Sheety
-if updates_made:
-    print("\n🔄 Updating Google Sheets...")
-    data_manager.update_destination_codes(sheet_data)
-else:
-    print("\n📊 No updates needed for Google Sheets.")
-
-# Print the updated sheet data for verification/debugging
-print("\n📊 Final data:")
-pprint(sheet_data)
\ No newline at end of file
+        print("✅ Notification Manager configured correctly")
+    # Email, webhook and file sinks still receive the alerts when SMS is not configured
+    notifications_enabled = bool(notification_config["sinks"])
+    if notifications_enabled:
+        print(f"📣 Notification sinks: {', '.join(notification_config['sinks'])}")
+
+    # Searches finished by an earlier (interrupted) run are reused from the checkpoint journal
+    checkpoint = CheckpointJournal()
+    # Its deals already written to the sheet aren't deals anymore, their alerts are sent from the journal
+    # (the dedup store skips the ones that did go out before the interruption)
+    if notifications_enabled:
+        for city, current_price, flight in checkpoint.pending_alerts():
+            notification_manager.queue_flight_alert(flight, city, current_price, flight.price)
+
+    # Every row flows through the stages on its own: updates are written as soon as they are found
+    pipeline, write_back = build_pipeline(
+        flight_search, data_manager, notification_manager, PriceHistoryStore(), notifications_enabled,
+        checkpoint=checkpoint
+    )
+    results = pipeline.run(sheet_data)
+
+    if checkpoint.skipped:
+        print(f"\n♻️ Checkpoint: {checkpoint.skipped} searches reused from a previous run")
+    # Stale offers served from the cache are refreshed in the background, let them finish
+    flight_search.wait_for_refreshes()
+    # Deliver the queued deal alerts now instead of waiting for the digest window
+    notification_stats = notification_manager.close()
+    # The alerts were handed over (delivered, or given up on like in any run), the journal can drop them
+    checkpoint.clear_alerts()
+    checkpoint.compact()
+    if notification_stats:
+        print(f"📱 Notifications: {notification_stats['messages_sent']} SMS sent, "
+              f"{notification_stats['messages_failed']} failed, {notification_stats['retries']} retries")
+
+    cache_stats = flight_search.iata_cache.stats()
+    print(f"\n💾 IATA cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+    offer_stats = flight_search.offer_cache.stats()
+    print(f"💾 Offer cache: {offer_stats['hits']} fresh + {offer_stats['stale_hits']} stale hits, "
+          f"{offer_stats['misses']} misses ({offer_stats['hit_ratio']:.0%} hit ratio, "
+          f"{offer_stats['bytes_saved'] / 1024:.1f} KB saved)")
+
+    # Print the updates that were sent to Sheety
+    updates_made = [result for result in results if result.should_update]
+    print(f"\n📋 {len(updates_made)} updates sent to Google Sheets:")
+    for result in updates_made:
+        deal_indicator = "🎉 DEAL!" if result.is_deal else "📊 UPDATE"
+        print(f"   {deal_indicator} {result.city}: ${result.flight.price}")
+
+    summary = write_back.summary
+    # The queued row updates are sent in the background, wait for them before reporting
+    queue_stats = data_manager.close() or {"sent": 0, "failed": 0, "pending": 0}
+    print(f"📊 Sheet rows updated: {summary['updated'] + queue_stats['sent']}, "
+          f"refused: {queue_stats['failed']}, still queued for the next run: {queue_stats['pending']}, "
+          f"unchanged: {summary['unchanged']}")
+    if pipeline.dropped:
+        print("⚠️ Rows dropped because a stage failed on them: "
+              + ", ".join(f"{name} {count}" for name, count in pipeline.dropped.items()))
+
+    # Print the updated sheet data for verification/debugging
+    print("\n📊 Final data:")
+    pprint(sheet_data)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,58 @@
-from twilio.rest import Client
+from notification_queue import NotificationQueue, DedupStore, pack_messages, segment_count, DEFAULT_MAX_SEGMENTS
 import os
+import threading
 from dotenv import load_dotenv
 
+import repo_root
+from common.notifications import NotificationDispatcher, SmsSink, sinks_from_env
+
 # Load environment variables from .env file
 load_dotenv()
 
 class NotificationManager:
     """
-    This class is responsible for sending notifications via SMS using the Twilio API.
+    This class is responsible for sending notifications via SMS using the Twilio API
+    (plus the email, webhook and file sinks configured in the environment).
     It sends alerts when cheaper flights are found.
+    Alerts queued with queue_flight_alert() are deduplicated, coalesced into digests
+    and delivered by a background worker, so the scan never waits on Twilio.
     """
 
-    def __init__(self):
+    def __init__(self, session=None, transport=None, dedup_store=None, digest_seconds=None):
         """
         Initializes the NotificationManager with Twilio credentials from environment variables.
+
+        Args:
+            session (requests.Session): Shared pooled HTTP session used by the Twilio client and webhooks.
+                Twilio keeps its own pooled session if omitted.
+            transport: Object with a send(body) method used instead of the sinks (e.g. FakeSmsTransport).
+            dedup_store (DedupStore): Delivered alerts, to avoid repeats. A default on-disk store is created if omitted.
+            digest_seconds (float): Alerts queued within this window are sent together. Defaults to NOTIFY_DIGEST_SECONDS.
         """
         self.account_sid = os.getenv("TWILIO_ACCOUNT_SID")
         self.auth_token = os.getenv("TWILIO_AUTH_TOKEN")
         self.twilio_phone_number = os.getenv("TWILIO_PHONE_NUMBER")
         self.recipient_phone_number = os.getenv("TWILIO_TO_NUMBER")
-        
-        # Initialize Twilio client
-        if self.account_sid and self.auth_token:
-            self.client = Client(self.account_sid, self.auth_token)
-            print("✅ Twilio client initialized successfully")
+        self.max_segments = int(os.getenv("NOTIFY_MAX_SEGMENTS", DEFAULT_MAX_SEGMENTS))
+        self.digest_seconds = digest_seconds
+        self.dedup_store = dedup_store or DedupStore()
+        self.duplicates_skipped = 0
+        self._queue = None
+        self._queue_lock = threading.Lock()
+
+        # Every message is fanned out to the configured sinks (the Twilio client is built on the first SMS)
+        self.sms_sink = SmsSink.from_env(session=session, from_var="TWILIO_PHONE_NUMBER", to_var="TWILIO_TO_NUMBER")
+        if self.sms_sink:
+            print("✅ Twilio SMS configured")
         else:
             print("❌ Twilio credentials not found in environment variables")
-            self.client = None
+        if transport is not None:
+            self.transport = transport
+            self.sink_names = [type(transport).__name__]
+        else:
+            dispatcher = NotificationDispatcher([self.sms_sink] + sinks_from_env(session=session))
+            self.transport = dispatcher if dispatcher.sinks else None
+            self.sink_names = dispatcher.sink_names
 
     def send_sms(self, message_body):
         """
@@ -38,21 +64,13 @@ class NotificationManager:
         Returns:
             bool: True if message was sent successfully, False otherwise.
         """
-        if not self.client:
-            print("❌ Cannot send SMS: Twilio client not initialized")
-            return False
-
-        if not self.recipient_phone_number:
-            print("❌ Cannot send SMS: Recipient phone number not configured")
+        if not self.transport:
+            print("❌ Cannot send SMS: no notification sink configured")
             return False
 
         try:
-            message = self.client.messages.create(
-                body=message_body,
-                from_=self.twilio_phone_number,
-                to=self.recipient_phone_number
-            )
-            print(f"✅ SMS sent successfully! Message SID: {message.sid}")
+            sid = self.transport.send(message_body)
+            print(f"✅ Alert delivered by: {sid} ({segment_count(message_body)} SMS segments)")
             return True
         except Exception as e:
             print(f"❌ Failed to send SMS: {e}")
@@ -71,44 +89,150 @@ class NotificationManager:
         Returns:
             bool: True if message was sent successfully, False otherwise.
         """
-        # Format the message with flight details
-        message = f"🎉 ¡OFERTA DE VUELO ENCONTRADA! 🎉\n\n"
-        message += f"Destino: {destination_city}\n"
-        message += f"Precio anterior: ${current_price} MXN\n"
-        message += f"Nuevo precio: ${found_price} MXN\n"
-        message += f"¡Ahorras: ${float(current_price) - float(found_price):.2f} MXN!\n\n"
-        message += f"📍 Ruta: {flight_data.origin_airport} → {flight_data.destination_airport}\n"
-        message += f"📅 Salida: {flight_data.out_date}\n"
-        message += f"📅 Regreso: {flight_data.return_date}\n\n"
-        message += f"💡 Reserva pronto antes de que suban los precios!\n"
-        message += f"🔗 Busca en Google Flights: MEX to {flight_data.destination_airport}"
+        return self.send_sms(self._fit_single_alert(flight_data, destination_city, current_price, found_price))
+
+    @staticmethod
+    def _format_single_alert(flight_data, destination_city, current_price, found_price):
+        """Builds the detailed message of one deal."""
+        return "".join([
+            f"🎉 ¡OFERTA DE VUELO ENCONTRADA! 🎉\n\n",
+            f"Destino: {destination_city}\n",
+            f"Precio anterior: ${current_price} MXN\n",
+            f"Nuevo precio: ${found_price} MXN\n",
+            f"¡Ahorras: ${float(current_price) - float(found_price):.2f} MXN!\n\n",
+            f"📍 Ruta: {flight_data.origin_airport} → {flight_data.destination_airport}\n",
+            f"📅 Salida: {flight_data.out_date}\n",
+            f"📅 Regreso: {flight_data.return_date}\n\n",
+            f"💡 Reserva pronto antes de que suban los precios!\n",
+            f"🔗 Busca en Google Flights: {flight_data.origin_airport} to {flight_data.destination_airport}",
+        ])
+
+    def _fit_single_alert(self, flight_data, destination_city, current_price, found_price):
+        """
+        Builds the message of one deal within max_segments: the detailed alert if it fits,
+        a compact one otherwise (the detailed one takes about 5 UCS-2 segments). The compact one
+        has no emoji, so it is sent as GSM-7 (160 characters per segment) unless the city needs UCS-2.
+        """
+        message = self._format_single_alert(flight_data, destination_city, current_price, found_price)
+        if segment_count(message) <= self.max_segments:
+            return message
+        savings = float(current_price) - float(found_price)
+        block = (
+            f"{destination_city}: ${found_price} MXN (antes ${current_price}, ahorro ${savings:.2f})\n"
+            f"{flight_data.origin_airport}-{flight_data.destination_airport} "
+            f"{flight_data.out_date} / {flight_data.return_date}\n"
+        )
+        # The footer is dropped if it doesn't fit
+        return pack_messages("¡OFERTA DE VUELO! ", [block], "¡Reserva pronto!", self.max_segments)[0]
+
+    def _format_multiple_alerts(self, flight_deals):
+        """Builds the summary of several deals, packed into messages of at most max_segments segments."""
+        header = f"🎉 ¡{len(flight_deals)} OFERTAS DE VUELO ENCONTRADAS! 🎉\n\n"
+        blocks = []
+        for i, deal in enumerate(flight_deals, 1):
+            savings = float(deal['current_price']) - float(deal['found_price'])
+            blocks.append(
+                f"{i}. {deal['city']}\n"
+                f"   💰 ${deal['found_price']} MXN (ahorro: ${savings:.2f})\n"
+                f"   📅 {deal['out_date']} - {deal['return_date']}\n\n"
+            )
+        return pack_messages(header, blocks, "💡 ¡Reserva pronto antes de que suban los precios!", self.max_segments)
+
+    def format_digest(self, flight_deals):
+        """
+        Builds the messages of a digest: the detailed alert for a single deal, a packed summary otherwise.
+
+        Args:
+            flight_deals (list): Deal dictionaries (city, current_price, found_price, out_date, return_date, flight_data).
+
+        Returns:
+            list: The message bodies.
+        """
+        if len(flight_deals) == 1:
+            deal = flight_deals[0]
+            return [self._fit_single_alert(deal['flight_data'], deal['city'],
+                                           deal['current_price'], deal['found_price'])]
+        return self._format_multiple_alerts(flight_deals)
+
+    def _get_queue(self):
+        """Starts the background delivery queue on first use."""
+        with self._queue_lock:
+            if self._queue is None:
+                self._queue = NotificationQueue(
+                    self.transport, self.format_digest, digest_seconds=self.digest_seconds,
+                    on_delivered=self._on_delivered
+                )
+            return self._queue
 
-        return self.send_sms(message)
+    def _on_delivered(self, flight_deals, delivered):
+        """Records delivered deals so they aren't alerted again (failed ones may be retried next run)."""
+        self.dedup_store.release([deal['dedup_key'] for deal in flight_deals], delivered)
+
+    def queue_flight_alert(self, flight_data, destination_city, current_price, found_price):
+        """
+        Queues a deal alert for background delivery and returns immediately.
+        A deal already alerted for the same route and price bucket is skipped.
+
+        Args:
+            flight_data: FlightData object containing flight details
+            destination_city (str): Name of the destination city
+            current_price (str/float): Price the deal is compared against
+            found_price (str/float): New lower price found
+
+        Returns:
+            bool: True if the alert was queued, False if it is a duplicate or SMS is not configured.
+        """
+        if not self.transport:
+            return False
+        dedup_key = self.dedup_store.key(flight_data.origin_airport, flight_data.destination_airport, found_price)
+        if not self.dedup_store.claim(dedup_key):
+            self.duplicates_skipped += 1
+            print(f"🔕 Deal to {destination_city} at ${found_price} was already alerted, skipping")
+            return False
+        self._get_queue().put({
+            'city': destination_city,
+            'current_price': current_price,
+            'found_price': found_price,
+            'out_date': flight_data.out_date,
+            'return_date': flight_data.return_date,
+            'flight_data': flight_data,
+            'dedup_key': dedup_key,
+        })
+        return True
+
+    def close(self, timeout=60):
+        """
+        Delivers the queued alerts right away and stops the background worker.
+
+        Args:
+            timeout (float): Maximum seconds to wait for the deliveries.
+
+        Returns:
+            dict: Delivery statistics of the queue (empty if nothing was queued).
+        """
+        with self._queue_lock:
+            notification_queue, self._queue = self._queue, None
+        if notification_queue is None:
+            return {}
+        if not notification_queue.close(timeout):
+            print("⚠️ Some notifications were still being delivered when the timeout expired")
+        return notification_queue.stats
 
     def send_multiple_alerts(self, flight_deals):
         """
-        Sends multiple flight deal alerts in a single SMS.
+        Sends multiple flight deal alerts in as few SMS as the segment limit allows.
 
         Args:
             flight_deals (list): List of dictionaries containing flight deal information
 
         Returns:
-            bool: True if message was sent successfully, False otherwise.
+            bool: True if every message was sent successfully, False otherwise.
         """
         if not flight_deals:
             return False
 
-        message = f"🎉 ¡{len(flight_deals)} OFERTAS DE VUELO ENCONTRADAS! 🎉\n\n"
-        
-        for i, deal in enumerate(flight_deals, 1):
-            savings = float(deal['current_price']) - float(deal['found_price'])
-            message += f"{i}. {deal['city']}\n"
-            message += f"   💰 ${deal['found_price']} MXN (ahorro: ${savings:.2f})\n"
-            message += f"   📅 {deal['out_date']} - {deal['return_date']}\n\n"
-
-        message += "💡 ¡Reserva pronto antes de que suban los precios!"
-        
-        return self.send_sms(message)
+        results = [self.send_sms(message) for message in self._format_multiple_alerts(flight_deals)]
+        return all(results)
 
     def test_connection(self):
         """
@@ -125,7 +249,7 @@ class NotificationManager:
         Validates that all required Twilio configuration is present.
 
         Returns:
-            dict: Dictionary with validation results and missing fields.
+            dict: Dictionary with validation results, missing fields and the names of the configured sinks.
         """
         missing_fields = []
         
@@ -141,7 +265,8 @@ class NotificationManager:
         return {
             "is_valid": len(missing_fields) == 0,
             "missing_fields": missing_fields,
-            "client_initialized": self.client is not None
+            "client_initialized": self.sms_sink is not None,
+            "sinks": self.sink_names
         }
 
 # Test to verify if the message is sent from twilio
@@ -0,0 +1,312 @@
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
+
+# SMS segment sizes: GSM-7 messages fit 160 characters (153 per part when split),
+# anything else (e.g. emoji or "á") is sent as UCS-2: 70 (67 per part) UTF-16 units
+GSM7_SINGLE_SEGMENT = 160
+GSM7_MULTI_SEGMENT = 153
+UCS2_SINGLE_SEGMENT = 70
+UCS2_MULTI_SEGMENT = 67
+
+GSM7_BASIC = set(
+    "@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+    "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà"
+)
+# These take two GSM-7 characters (escape + character)
+GSM7_EXTENDED = set("^{}\\[~]|€\f")
+
+# Queue defaults
+DEFAULT_DIGEST_SECONDS = 10      # Alerts arriving within 10s of the first one are sent together
+DEFAULT_MAX_SEGMENTS = 3         # Longer digests are split into several SMS of at most 3 segments
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_RETRY_BACKOFF_SECONDS = 2.0
+# Deduplication: the same route in the same price bucket is not alerted again for a week
+DEFAULT_PRICE_BUCKET = 500       # MXN
+DEFAULT_DEDUP_SECONDS = 7 * 24 * 60 * 60
+DEFAULT_DEDUP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "notification_dedup.json")
+
+# Tells the worker to flush what it has and stop
+_STOP = object()
+
+
+def is_gsm7(text):
+    """Returns True if the text can be sent with the GSM-7 alphabet."""
+    return all(character in GSM7_BASIC or character in GSM7_EXTENDED for character in text)
+
+
+def message_length(text):
+    """
+    Returns the length of a message in its SMS encoding units, and whether it is GSM-7.
+
+    Returns:
+        tuple: (length, is_gsm7). GSM-7 extended characters count twice,
+               UCS-2 characters outside the basic plane (most emoji) count twice too.
+    """
+    if is_gsm7(text):
+        return sum(2 if character in GSM7_EXTENDED else 1 for character in text), True
+    return len(text.encode("utf-16-le")) // 2, False
+
+
+def segment_count(text):
+    """
+    Returns the number of SMS segments (billed parts) needed to send a message.
+
+    Args:
+        text (str): The message.
+
+    Returns:
+        int: Segments, 1 for an empty message.
+    """
+    length, gsm7 = message_length(text)
+    single, multi = (GSM7_SINGLE_SEGMENT, GSM7_MULTI_SEGMENT) if gsm7 else (UCS2_SINGLE_SEGMENT, UCS2_MULTI_SEGMENT)
+    if length <= single:
+        return 1
+    return -(-length // multi)
+
+
+def pack_messages(header, blocks, footer="", max_segments=DEFAULT_MAX_SEGMENTS):
+    """
+    Packs text blocks into as few messages as possible, each at most max_segments long.
+    Every message starts with the header; the footer goes at the end of the last one
+    if it fits (it is dropped rather than sent as an extra message).
+    A block that doesn't fit even on its own is sent alone rather than cut.
+
+    Args:
+        header (str): Text at the top of every message.
+        blocks (list): Blocks that must not be split between messages (e.g. one per deal).
+        footer (str): Text at the end of the last message.
+        max_segments (int): Segment budget of one message.
+
+    Returns:
+        list: The messages (str).
+    """
+    messages = []
+    current = []
+    for block in blocks:
+        if current and segment_count("".join([header] + current + [block])) > max_segments:
+            messages.append("".join([header] + current))
+            current = []
+        current.append(block)
+
+    last = [header] + current
+    if footer and (not current or segment_count("".join(last + [footer])) <= max_segments):
+        last.append(footer)
+    messages.append("".join(last))
+    return messages
+
+
+class FakeSmsTransport:
+    """
+    This class stands in for Twilio in tests and dry runs: messages are recorded, not sent.
+    The first `fail_times` sends raise an error so retries can be exercised; with a `status`
+    (e.g. 400 or 503) the error carries that HTTP status, like Twilio's.
+    """
+
+    def __init__(self, fail_times=0, delay=0.0, status=None):
+        self.fail_times = fail_times
+        self.delay = delay
+        self.status = status
+        self.messages = []
+        self.attempts = 0
+        self._lock = threading.Lock()
+
+    def send(self, body):
+        time.sleep(self.delay)
+        with self._lock:
+            self.attempts += 1
+            if self.attempts <= self.fail_times:
+                error = ConnectionError(f"fake transport failure {self.attempts}")
+                error.status = self.status
+                raise error
+            self.messages.append(body)
+            return f"FAKE{len(self.messages):06d}"
+
+
+class DedupStore:
+    """
+    This class remembers which (route, price bucket) alerts were delivered, on disk,
+    so the same deal isn't sent again on every run.
+    """
+
+    def __init__(self, path=None, bucket_size=None, window_seconds=None):
+        """
+        Loads the delivered alerts that are still within the window.
+
+        Args:
+            path (str): JSON file. Defaults to NOTIFY_DEDUP_PATH or a file next to this module.
+            bucket_size (float): Prices within the same bucket count as the same deal. Defaults to NOTIFY_PRICE_BUCKET.
+            window_seconds (float): How long a delivered alert blocks repeats. Defaults to NOTIFY_DEDUP_DAYS (7 days).
+        """
+        self.path = path or os.getenv("NOTIFY_DEDUP_PATH", DEFAULT_DEDUP_PATH)
+        self.bucket_size = bucket_size or float(os.getenv("NOTIFY_PRICE_BUCKET", DEFAULT_PRICE_BUCKET))
+        if window_seconds is None:
+            window_seconds = float(os.getenv("NOTIFY_DEDUP_DAYS", DEFAULT_DEDUP_SECONDS / 86400)) * 86400
+        self.window_seconds = window_seconds
+        self._sent = {}
+        self._pending = set()
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                cutoff = time.time() - self.window_seconds
+                self._sent = {key: sent_at for key, sent_at in json.load(file).items() if sent_at > cutoff}
+        except (OSError, ValueError, AttributeError):
+            pass
+
+    def key(self, origin, destination, price):
+        """Returns the dedup key of a deal, e.g. "MEX-PAR:25" for 12,700 MXN with 500 MXN buckets."""
+        return f"{origin}-{destination}:{int(float(price) // self.bucket_size)}"
+
+    def claim(self, key):
+        """
+        Reserves a key for delivery.
+
+        Returns:
+            bool: False if the alert was already delivered (within the window) or is queued.
+        """
+        with self._lock:
+            sent_at = self._sent.get(key)
+            if key in self._pending or (sent_at and time.time() - sent_at < self.window_seconds):
+                return False
+            self._pending.add(key)
+            return True
+
+    def release(self, keys, delivered):
+        """Marks claimed keys as delivered (saved to disk) or frees them after a failed delivery."""
+        with self._lock:
+            self._pending.difference_update(keys)
+            if not delivered:
+                return
+            now = time.time()
+            for key in keys:
+                self._sent[key] = now
+            snapshot = dict(self._sent)
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        try:
+            file_descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix=".notification_dedup_")
+            with os.fdopen(file_descriptor, "w", encoding="utf-8") as file:
+                json.dump(snapshot, file)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"⚠️ Could not save notification dedup file: {e}")
+
+
+def _is_retryable(error):
+    """Client errors (e.g. an invalid phone number) won't succeed on retry; throttling, timeouts and 5xx might."""
+    # A DeliveryError from the dispatcher already knows whether any of its sinks may succeed later
+    retryable = getattr(error, "retryable", None)
+    if isinstance(retryable, bool):
+        return retryable
+    status = getattr(error, "status", None)
+    return not isinstance(status, int) or status == 429 or status >= 500
+
+
+class NotificationQueue:
+    """
+    This class delivers alerts from a background worker so the caller never waits on the transport.
+    Alerts arriving within the digest window are coalesced into one digest,
+    formatted into segment-sized messages and sent with retries.
+    """
+
+    def __init__(self, transport, format_digest, digest_seconds=None, max_retries=DEFAULT_MAX_RETRIES,
+                 retry_backoff=DEFAULT_RETRY_BACKOFF_SECONDS, on_delivered=None):
+        """
+        Starts the worker thread.
+
+        Args:
+            transport: Object with a send(body) method (NotificationDispatcher, FakeSmsTransport...).
+            format_digest (callable): Turns a list of alerts into a list of message bodies.
+            digest_seconds (float): Coalescing window. Defaults to NOTIFY_DIGEST_SECONDS (10s).
+            max_retries (int): Retries per message.
+            retry_backoff (float): First wait between retries (doubled each time).
+            on_delivered (callable): Called with (alerts, delivered) after every digest.
+        """
+        self.transport = transport
+        self.format_digest = format_digest
+        if digest_seconds is None:
+            digest_seconds = float(os.getenv("NOTIFY_DIGEST_SECONDS", DEFAULT_DIGEST_SECONDS))
+        self.digest_seconds = digest_seconds
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.on_delivered = on_delivered
+        self.stats = {"queued": 0, "digests": 0, "messages_sent": 0, "messages_failed": 0, "retries": 0}
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="notification-queue", daemon=True)
+        self._worker.start()
+
+    def put(self, alert):
+        """Queues an alert and returns immediately."""
+        self.stats["queued"] += 1
+        self._queue.put(alert)
+
+    def close(self, timeout=None):
+        """
+        Sends what is still queued (without waiting for the digest window) and stops the worker.
+
+        Args:
+            timeout (float): Maximum seconds to wait for the deliveries.
+
+        Returns:
+            bool: True if the worker finished in time.
+        """
+        self._queue.put(_STOP)
+        self._worker.join(timeout)
+        return not self._worker.is_alive()
+
+    def _run(self):
+        """Worker loop: waits for an alert, collects the digest window, delivers."""
+        stopping = False
+        while not stopping:
+            alert = self._queue.get()
+            if alert is _STOP:
+                break
+            alerts = [alert]
+            deadline = time.monotonic() + self.digest_seconds
+            while True:
+                remaining = deadline - time.monotonic()
+                try:
+                    alert = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if alert is _STOP:
+                    stopping = True
+                    break
+                alerts.append(alert)
+            self._deliver(alerts)
+
+    def _deliver(self, alerts):
+        """Formats and sends one digest."""
+        self.stats["digests"] += 1
+        try:
+            bodies = self.format_digest(alerts)
+        except Exception as e:
+            print(f"❌ Could not format notification digest: {e}")
+            bodies = []
+        delivered = bool(bodies)
+        for body in bodies:
+            delivered = self._send(body) and delivered
+        if self.on_delivered:
+            self.on_delivered(alerts, delivered)
+
+    def _send(self, body):
+        """Sends one message, retrying with exponential backoff."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                sid = self.transport.send(body)
+                self.stats["messages_sent"] += 1
+                print(f"✅ Alert delivered by: {sid} ({segment_count(body)} SMS segments)")
+                return True
+            except Exception as e:
+                if attempt == self.max_retries or not _is_retryable(e):
+                    print(f"❌ Failed to send SMS: {e}")
+                    self.stats["messages_failed"] += 1
+                    return False
+                wait = self.retry_backoff * 2 ** attempt
+                print(f"⏳ SMS failed ({e}), retrying in {wait:.1f}s")
+                self.stats["retries"] += 1
+                time.sleep(wait)
+        return False
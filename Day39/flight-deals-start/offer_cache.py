@@ -0,0 +1,175 @@
+from urllib.parse import urlencode
+import os
+import sqlite3
+import threading
+import time
+
+# Flight prices move quickly: a response is fresh for 15 minutes, then served stale
+# (and refreshed in the background) for up to one more hour
+DEFAULT_TTL_SECONDS = 15 * 60
+DEFAULT_STALE_SECONDS = 60 * 60
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "offer_cache.sqlite3")
+
+# Results of OfferCache.get()
+FRESH = "fresh"
+STALE = "stale"
+
+
+def normalize_query(url, params):
+    """
+    Builds the cache key of a query: the URL plus the parameters sorted by name,
+    trimmed and upper-cased, so {"max": 1, "originLocationCode": "mex"} and
+    {"originLocationCode": "MEX ", "max": "1"} share one entry.
+
+    Args:
+        url (str): The endpoint.
+        params (dict): The query parameters.
+
+    Returns:
+        str: The cache key.
+    """
+    items = sorted((str(name), str(value).strip().upper()) for name, value in (params or {}).items())
+    return f"{url}?{urlencode(items)}"
+
+
+class OfferCache:
+    """
+    This class is an on-disk (SQLite) cache of raw flight-offer responses, keyed on the normalized query.
+    Entries are fresh for `ttl` seconds and may be served stale for `stale_ttl` more seconds
+    while the caller refreshes them. The least recently used responses are evicted
+    once the stored bodies exceed `max_bytes`.
+    """
+
+    def __init__(self, path=None, ttl=None, stale_ttl=None, max_bytes=None):
+        """
+        Opens (or creates) the cache database.
+
+        Args:
+            path (str): Location of the SQLite file. Defaults to OFFER_CACHE_PATH or a file next to this module.
+            ttl (float): Seconds a response is fresh. Defaults to OFFER_CACHE_TTL or 15 minutes.
+            stale_ttl (float): Extra seconds a response may be served while it is refreshed
+                (0 disables stale-while-revalidate). Defaults to OFFER_CACHE_STALE_TTL or 1 hour.
+            max_bytes (int): Maximum total size of the stored bodies. Defaults to OFFER_CACHE_MAX_MB or 50 MB.
+        """
+        self.path = path or os.getenv("OFFER_CACHE_PATH", DEFAULT_CACHE_PATH)
+        self.ttl = ttl if ttl is not None else float(os.getenv("OFFER_CACHE_TTL", DEFAULT_TTL_SECONDS))
+        self.stale_ttl = stale_ttl if stale_ttl is not None else float(
+            os.getenv("OFFER_CACHE_STALE_TTL", DEFAULT_STALE_SECONDS))
+        if max_bytes is None:
+            max_bytes = int(float(os.getenv("OFFER_CACHE_MAX_MB", DEFAULT_MAX_BYTES / 1024 / 1024)) * 1024 * 1024)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+
+        # The connection is shared by the search threads, access is serialized with the lock
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS offers (
+                query TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS idx_offers_last_used ON offers (last_used)")
+        self._connection.commit()
+
+    def get(self, url, params):
+        """
+        Looks up a query in the cache.
+
+        Args:
+            url (str): The endpoint.
+            params (dict): The query parameters.
+
+        Returns:
+            tuple: (body bytes, FRESH or STALE), or (None, None) if the query must be sent.
+        """
+        query = normalize_query(url, params)
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT body, fetched_at FROM offers WHERE query = ?", (query,)
+            ).fetchone()
+
+            age = now - row[1] if row is not None else None
+            if row is None or age >= self.ttl + self.stale_ttl:
+                if row is not None:
+                    self._connection.execute("DELETE FROM offers WHERE query = ?", (query,))
+                    self._connection.commit()
+                self.misses += 1
+                return None, None
+
+            self._connection.execute("UPDATE offers SET last_used = ? WHERE query = ?", (now, query))
+            self._connection.commit()
+            body = bytes(row[0])
+            self.bytes_saved += len(body)
+            if age < self.ttl:
+                self.hits += 1
+                return body, FRESH
+            self.stale_hits += 1
+            return body, STALE
+
+    def set(self, url, params, body):
+        """
+        Stores the raw body of a successful response.
+
+        Args:
+            url (str): The endpoint.
+            params (dict): The query parameters.
+            body (bytes): The response body.
+        """
+        query = normalize_query(url, params)
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO offers (query, body, size, fetched_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                (query, sqlite3.Binary(body), len(body), now, now)
+            )
+            self._evict()
+            self._connection.commit()
+
+    def _evict(self):
+        """Removes expired responses and, if still over the size limit, the least recently used ones."""
+        self._connection.execute("DELETE FROM offers WHERE fetched_at <= ?",
+                                 (time.time() - self.ttl - self.stale_ttl,))
+        total = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM offers").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = []
+        for query, size in self._connection.execute("SELECT query, size FROM offers ORDER BY last_used ASC"):
+            if total <= self.max_bytes:
+                break
+            evicted.append((query,))
+            total -= size
+        self._connection.executemany("DELETE FROM offers WHERE query = ?", evicted)
+
+    def stats(self):
+        """
+        Returns the counters of this cache.
+
+        Returns:
+            dict: Fresh hits, stale hits, misses, hit ratio (both kinds of hits)
+                  and response bytes that didn't have to be downloaded.
+        """
+        served = self.hits + self.stale_hits
+        total = served + self.misses
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_ratio": served / total if total else 0.0,
+            "bytes_saved": self.bytes_saved,
+        }
+
+    def close(self):
+        """Closes the underlying database connection."""
+        with self._lock:
+            self._connection.close()
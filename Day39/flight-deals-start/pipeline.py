@@ -0,0 +1,446 @@
+from flight_data import FlightBatch
+from price_history import score_deals
+from datetime import date, timedelta
+import queue
+import threading
+import numpy as np
+
+# Default size of the queues between stages (back-pressure: a fast stage waits for a slow one)
+DEFAULT_QUEUE_SIZE = 32
+
+# Marks the end of the stream in a queue
+_END = object()
+
+
+class DestinationResult:
+    """
+    This class carries one sheet row through the pipeline, together with what each stage found.
+    """
+    __slots__ = ("row", "flights", "reused", "flight", "route", "should_update", "is_deal", "reference_price")
+
+    def __init__(self, row):
+        self.row = row
+        self.flights = {}            # origin -> FlightData
+        self.reused = set()          # Origins whose result came from the checkpoint journal
+        self.flight = None           # Cheapest FlightData over all origins
+        self.route = None            # (origin, destination) of the cheapest flight
+        self.should_update = False
+        self.is_deal = False
+        self.reference_price = None  # Price the deal is compared against
+
+    @property
+    def city(self):
+        return self.row.get('city', 'Unknown City')  # Column: City
+
+
+class Stage:
+    """
+    This class is the base of every pipeline stage.
+    Subclasses implement process() (one item) or process_batch() (a micro-batch of items)
+    and may emit more items at the end of the stream from finish().
+    """
+    name = "stage"
+    workers = 1       # Threads running this stage
+    batch_size = 1    # Up to this many waiting items are processed together
+
+    def process(self, item):
+        """Processes one item. Returns the items to pass on to the next stage."""
+        return [item]
+
+    def process_batch(self, items):
+        """Processes a micro-batch. Returns the items to pass on to the next stage."""
+        outputs = []
+        for item in items:
+            outputs.extend(self.process(item))
+        return outputs
+
+    def finish(self):
+        """Called once after the last item. Returns extra items to pass on."""
+        return []
+
+
+class Pipeline:
+    """
+    This class runs stages concurrently, each in its own thread(s), connected by bounded queues.
+    Items flow to the next stage as soon as they are processed, so results are persisted as they arrive.
+    """
+
+    def __init__(self, stages, queue_size=DEFAULT_QUEUE_SIZE):
+        self.stages = stages
+        self.queue_size = queue_size
+        # Stage name -> items dropped because processing them failed (reported in the run summary)
+        self.dropped = {}
+        self._dropped_lock = threading.Lock()
+
+    def _run_stage(self, stage, input_queue, output_queue, remaining_workers, lock):
+        """Worker loop of one stage thread."""
+        while True:
+            item = input_queue.get()
+            if item is _END:
+                # Let the sibling workers see the end too
+                input_queue.put(_END)
+                break
+
+            batch = [item]
+            while len(batch) < stage.batch_size:
+                try:
+                    extra = input_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if extra is _END:
+                    input_queue.put(_END)
+                    break
+                batch.append(extra)
+
+            for output in self._process(stage, batch):
+                output_queue.put(output)
+
+        # The last worker of the stage flushes it and closes the stream downstream
+        with lock:
+            remaining_workers[0] -= 1
+            last_worker = remaining_workers[0] == 0
+        if last_worker:
+            try:
+                for output in stage.finish():
+                    output_queue.put(output)
+            except Exception as e:
+                print(f"❌ Stage '{stage.name}' failed to finish: {e}")
+            output_queue.put(_END)
+
+    def _process(self, stage, batch):
+        """
+        Runs a micro-batch through a stage. If the batch fails, its items are retried one by one,
+        so one bad row only drops itself (and is counted in `dropped`).
+        """
+        try:
+            return stage.process_batch(batch)
+        except Exception as e:
+            if len(batch) == 1:
+                print(f"❌ Stage '{stage.name}' failed, item dropped: {e}")
+                self._count_dropped(stage, 1)
+                return []
+            print(f"⚠️ Stage '{stage.name}' failed on {len(batch)} items ({e}), retrying them one by one")
+
+        outputs = []
+        for item in batch:
+            try:
+                outputs.extend(stage.process_batch([item]))
+            except Exception as e:
+                print(f"❌ Stage '{stage.name}' failed, item dropped: {e}")
+                self._count_dropped(stage, 1)
+        return outputs
+
+    def _count_dropped(self, stage, count):
+        with self._dropped_lock:
+            self.dropped[stage.name] = self.dropped.get(stage.name, 0) + count
+
+    def stream(self, source):
+        """
+        Feeds the source items through every stage.
+
+        Args:
+            source (iterable): Items for the first stage.
+
+        Yields:
+            The items produced by the last stage, as soon as they are ready.
+
+        Raises:
+            Exception: Whatever reading the source raised, once the items already fed have gone through.
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        threads = []
+        source_error = []
+
+        def feed():
+            try:
+                for item in source:
+                    queues[0].put(item)
+            except Exception as e:
+                source_error.append(e)
+            finally:
+                # The stages (and the consumer) must always see the end, or they wait forever
+                queues[0].put(_END)
+
+        threads.append(threading.Thread(target=feed, name="pipeline-source", daemon=True))
+        for position, stage in enumerate(self.stages):
+            remaining_workers = [stage.workers]
+            lock = threading.Lock()
+            for worker in range(stage.workers):
+                threads.append(threading.Thread(
+                    target=self._run_stage,
+                    args=(stage, queues[position], queues[position + 1], remaining_workers, lock),
+                    name=f"pipeline-{stage.name}-{worker}",
+                    daemon=True
+                ))
+
+        for thread in threads:
+            thread.start()
+
+        while True:
+            item = queues[-1].get()
+            if item is _END:
+                break
+            yield item
+
+        for thread in threads:
+            thread.join()
+        if source_error:
+            raise source_error[0]
+
+    def run(self, source):
+        """Runs the pipeline to completion and returns the items of the last stage."""
+        return list(self.stream(source))
+
+
+class IataLookupStage(Stage):
+    """Fills in missing IATA codes; rows whose city can't be found are dropped."""
+    name = "iata"
+
+    def __init__(self, flight_search):
+        self.flight_search = flight_search
+
+    def process(self, row):
+        city = row.get('city', 'Unknown City')  # Column: City
+        current_iata = row.get('iataCode', '')  # Column: IATA Code
+
+        # If no IATA code exists, try to get it first
+        if not current_iata:
+            print(f"   🔍 No IATA code found, looking up for {city}")
+            new_iata = self.flight_search.get_iata_code(city)
+            if not new_iata:
+                print(f"   ❌ Could not find IATA code for {city}")
+                return []
+            row["iataCode"] = new_iata  # This will update the IATA Code column
+            print(f"   ✅ Found IATA code for {city}: {new_iata}")
+
+        return [DestinationResult(row)]
+
+
+class SearchStage(Stage):
+    """
+    Searches every origin for a row's destination (plain search or flexible-date grid).
+    The searches themselves run on FlightSearch's shared bounded pool, which also skips the
+    origin x destination jobs another row already scheduled; the stage workers only keep
+    enough rows in flight to fill it.
+    With a checkpoint journal, jobs finished recently are reused instead of searched again.
+    """
+    name = "search"
+
+    def __init__(self, flight_search, origins, workers=5, departure_dates=None, trip_lengths=None,
+                 checkpoint=None):
+        self.flight_search = flight_search
+        self.origins = origins
+        self.workers = workers
+        self.departure_dates = departure_dates
+        self.trip_lengths = trip_lengths
+        self.checkpoint = checkpoint
+        self.dates_key = self._dates_key()
+
+    def _dates_key(self):
+        """Describes the searched dates, so a job is only reused for the same dates."""
+        if self.departure_dates:
+            lengths = ",".join(str(days) for days in self.trip_lengths)
+            return f"grid:{self.departure_dates[0].isoformat()}+{len(self.departure_dates)}d:{lengths}"
+        # Same defaults as FlightSearch.search_flights: tomorrow to 180 days from now
+        today = date.today()
+        return f"{(today + timedelta(days=1)).isoformat()}/{(today + timedelta(days=180)).isoformat()}"
+
+    def process(self, result):
+        destination = result.row["iataCode"]
+        origins = [origin for origin in self.origins if origin != destination]
+        reused = {}
+        if self.checkpoint:
+            for origin in origins:
+                flight = self.checkpoint.get(origin, destination, self.dates_key)
+                if flight is not None:
+                    reused[origin] = flight
+                    result.reused.add(origin)
+
+        # Every origin of the row is scheduled at once on the shared search pool (a date grid fans out its own cells)
+        searches = {} if self.departure_dates else {
+            origin: self.flight_search.submit_search(origin, destination)
+            for origin in origins if origin not in reused
+        }
+
+        for origin in origins:
+            if origin in reused:
+                flight = reused[origin]
+                source = " (checkpoint)"
+            else:
+                source = ""
+                if self.departure_dates:
+                    flight = self.flight_search.search_date_grid(
+                        origin, destination, self.departure_dates, self.trip_lengths
+                    ).best_flight
+                else:
+                    flight = searches[origin].result()
+                # Failed searches (errors, quota) look like "not found", so only prices are journaled
+                if self.checkpoint and flight.found:
+                    self.checkpoint.record(origin, destination, self.dates_key, flight)
+            result.flights[origin] = flight
+            found = f"${flight.price}" if flight.found else "no flights"
+            print(f"   📥 {origin} → {destination}: {found}{source}")
+        return [result]
+
+
+class CompareStage(Stage):
+    """
+    Picks the cheapest origin of each row, scores it against the route history
+    (vectorized over the micro-batch), records the prices and decides update / deal.
+    """
+    name = "compare"
+    batch_size = 64
+
+    def __init__(self, price_history):
+        self.price_history = price_history
+
+    def process_batch(self, results):
+        # All the prices of the micro-batch in parallel arrays
+        batch = FlightBatch()
+        routes = []
+        reused = []
+        for result in results:
+            for origin, flight in result.flights.items():
+                batch.append(flight)
+                routes.append((origin, result.row["iataCode"]))
+                # Prices reused from the checkpoint or answered by the offer cache were already
+                # recorded by the run that found them; recording them again would skew the statistics
+                reused.append(origin in result.reused or flight.from_cache)
+
+        scores = score_deals(self.price_history.recent_prices(routes), batch.prices)
+        self.price_history.append_prices(routes, np.where(reused, np.nan, batch.prices))
+
+        position = 0
+        for result in results:
+            count = len(result.flights)
+            prices = batch.prices[position:position + count]
+            if count and not np.all(np.isnan(prices)):
+                best = position + int(np.nanargmin(prices))
+                result.flight = batch[best]
+                result.route = routes[best]
+                self._compare(result, scores, best)
+            else:
+                print(f"   ❌ {result.city}: No flights found")
+            position += count
+
+        return results
+
+    @staticmethod
+    def _compare(result, scores, index):
+        """Compares the cheapest flight of a row with the sheet and the route history."""
+        row, flight, city = result.row, result.flight, result.city
+        current_lowest_price = row.get('lowestPrice', None)  # Column: Lowest Price
+        found_price = flight.price
+
+        print(f"\n🏙️ {city}: ${found_price}, from {flight.origin_airport} to {flight.destination_airport}")
+        print(f"   Departure: {flight.out_date} - Return: {flight.return_date}")
+        has_history = scores["has_history"][index]
+
+        if current_lowest_price is None or current_lowest_price == "" or current_lowest_price == 0:
+            # No previous price, so update with found price
+            result.should_update = True
+            current_price = None
+            print(f"   📊 No previous price recorded, updating with ${found_price}")
+        else:
+            current_price = float(current_lowest_price)
+            if found_price < current_price:
+                result.should_update = True
+                # Without enough history, any price below the recorded one is a deal
+                result.is_deal = not has_history
+                print(f"   📉 New lowest price ${found_price} (was ${current_price})")
+            elif found_price == current_price:
+                print(f"   ℹ️ Same price as recorded: ${found_price}")
+            else:
+                print(f"   📈 Price increased: ${found_price} (was ${current_price})")
+
+        if has_history:
+            typical_price = float(scores["mean"][index])
+            print(f"   📈 History: min ${scores['rolling_min'][index]:.2f}, "
+                  f"p10 ${scores['percentile_price'][index]:.2f}, "
+                  f"mean ${typical_price:.2f}, z-score {scores['z_score'][index]:.2f}")
+            # With enough history, a deal must be statistically unusual for this route
+            result.is_deal = bool(scores["is_deal"][index])
+            # Savings are measured against the typical price of the route
+            result.reference_price = typical_price
+        else:
+            result.reference_price = current_price
+
+        if result.is_deal:
+            savings = result.reference_price - found_price
+            print(f"   🎉 DEAL FOUND! New price ${found_price} is ${savings:.2f} cheaper than "
+                  f"${result.reference_price:.2f}")
+
+        # Update the row data if we should
+        if result.should_update:
+            row["iataCode"] = flight.destination_airport    # IATA Code column
+            row["lowestPrice"] = found_price                # Lowest Price column
+
+
+class WriteBackStage(Stage):
+    """
+    Hands the changed cells of each micro-batch to the DataManager's write-behind queue right away.
+    With a checkpoint journal, the deals of the batch are journaled first: once their new price is in
+    the sheet a resumed run no longer sees them as deals, so it sends their alerts from the journal.
+    """
+    name = "write-back"
+    batch_size = 16
+
+    def __init__(self, data_manager, checkpoint=None):
+        self.data_manager = data_manager
+        self.checkpoint = checkpoint
+        self.summary = {"updated": 0, "queued": 0, "failed": 0, "unchanged": 0}
+
+    def process_batch(self, results):
+        if self.checkpoint:
+            for result in results:
+                if result.is_deal:
+                    self.checkpoint.record_alert(result.city, round(result.reference_price, 2), result.flight)
+        write_summary = self.data_manager.update_destination_codes([result.row for result in results])
+        for key in self.summary:
+            self.summary[key] += write_summary[key]
+        return results
+
+
+class NotifyStage(Stage):
+    """
+    Queues every deal with the NotificationManager as soon as it is found.
+    Delivery (dedup, digest, retries) happens in the background, the pipeline never waits on Twilio.
+    """
+    name = "notify"
+
+    def __init__(self, notification_manager, enabled=True):
+        self.notification_manager = notification_manager
+        self.enabled = enabled
+        self.flight_deals = []
+        self.queued = 0
+
+    def process(self, result):
+        if result.is_deal:
+            current_price = round(result.reference_price, 2)
+            self.flight_deals.append({
+                'city': result.city,
+                'current_price': current_price,
+                'found_price': result.flight.price,
+                'out_date': result.flight.out_date,
+                'return_date': result.flight.return_date,
+                'flight_data': result.flight
+            })
+            if self.enabled and self.notification_manager.queue_flight_alert(
+                    result.flight, result.city, current_price, result.flight.price):
+                self.queued += 1
+        return [result]
+
+    def finish(self):
+        flight_deals = self.flight_deals
+        if flight_deals and self.enabled:
+            print(f"\n📱 {self.queued} of {len(flight_deals)} deals queued for notification "
+                  f"({len(flight_deals) - self.queued} already alerted)")
+        elif flight_deals:
+            print(f"\n⚠️ {len(flight_deals)} deals found but notifications are disabled "
+                  f"(no Twilio configuration or other notification sink)")
+            for deal in flight_deals:
+                savings = deal['current_price'] - deal['found_price']
+                print(f"   🎉 {deal['city']}: ${deal['found_price']} (save ${savings:.2f})")
+        else:
+            print("\n📊 No deals found this time. All current prices are still the best available.")
+        return []
@@ -0,0 +1,154 @@
+import os
+import time
+import warnings
+import numpy as np
+
+DEFAULT_HISTORY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "price_history")
+
+# One fixed-size record per observation, appended to one binary file per route
+RECORD_DTYPE = np.dtype([("timestamp", "<f8"), ("price", "<f8")])
+
+# Deal detection defaults
+DEFAULT_WINDOW_DAYS = 90         # Only prices seen in the last 90 days count
+DEFAULT_MAX_POINTS = 256         # ...and at most the 256 most recent ones per route
+DEFAULT_PERCENTILE = 10          # A deal must be in the cheapest 10% of recent prices
+DEFAULT_Z_THRESHOLD = -1.5       # ...and at least 1.5 standard deviations below the mean
+DEFAULT_MIN_HISTORY = 5          # Routes with fewer observations fall back to the sheet comparison
+
+
+class PriceHistoryStore:
+    """
+    This class stores every price found for a route in an append-only binary file
+    (one file per origin-destination pair), so price trends survive between runs.
+    """
+
+    def __init__(self, directory=None):
+        """
+        Initializes the store.
+
+        Args:
+            directory (str): Folder for the route files. Defaults to PRICE_HISTORY_DIR or ./price_history.
+        """
+        self.directory = directory or os.getenv("PRICE_HISTORY_DIR", DEFAULT_HISTORY_DIR)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _route_path(self, origin, destination):
+        """Returns the file used for a route, e.g. price_history/MEX-PAR.bin"""
+        return os.path.join(self.directory, f"{origin.upper()}-{destination.upper()}.bin")
+
+    def append(self, origin, destination, price, timestamp=None):
+        """
+        Appends one observed price to the route's file.
+
+        Args:
+            origin (str): IATA code of the origin.
+            destination (str): IATA code of the destination.
+            price (float): The price found.
+            timestamp (float): When the price was seen (Unix time). Defaults to now.
+        """
+        record = np.array([(timestamp if timestamp is not None else time.time(), float(price))], dtype=RECORD_DTYPE)
+        with open(self._route_path(origin, destination), "ab") as file:
+            record.tofile(file)
+
+    def append_prices(self, routes, prices, timestamp=None):
+        """
+        Appends one price per route, skipping routes without a price (NaN).
+
+        Args:
+            routes (list): (origin, destination) tuples that were searched, e.g. ("MEX", "PAR").
+                The searched codes are used (not the airports of the offer) so a route keeps one file.
+            prices (array-like): The price found for each route, NaN if none (e.g. FlightBatch.prices).
+            timestamp (float): When the prices were seen. Defaults to now.
+        """
+        timestamp = timestamp if timestamp is not None else time.time()
+        for (origin, destination), price in zip(routes, prices):
+            if not np.isnan(price):
+                self.append(origin, destination, price, timestamp)
+
+    def load(self, origin, destination):
+        """
+        Reads all the observations of a route.
+
+        Args:
+            origin (str): IATA code of the origin.
+            destination (str): IATA code of the destination.
+
+        Returns:
+            numpy.ndarray: Structured array with "timestamp" and "price" fields (empty if no history).
+        """
+        path = self._route_path(origin, destination)
+        if not os.path.exists(path):
+            return np.empty(0, dtype=RECORD_DTYPE)
+        # A partially written last record (e.g. crash during append) is ignored
+        record_count = os.path.getsize(path) // RECORD_DTYPE.itemsize
+        return np.fromfile(path, dtype=RECORD_DTYPE, count=record_count)
+
+    def recent_prices(self, routes, window_days=DEFAULT_WINDOW_DAYS, max_points=DEFAULT_MAX_POINTS, now=None):
+        """
+        Builds a (routes x max_points) price matrix with the most recent prices of every route.
+        Missing observations are NaN, so the statistics can be computed for all routes at once.
+
+        Args:
+            routes (list): (origin, destination) tuples.
+            window_days (float): Only prices seen in the last window_days are used.
+            max_points (int): Maximum number of recent prices per route.
+            now (float): Reference time (Unix time). Defaults to now.
+
+        Returns:
+            numpy.ndarray: The price matrix.
+        """
+        cutoff = (now if now is not None else time.time()) - window_days * 24 * 60 * 60
+        matrix = np.full((len(routes), max_points), np.nan)
+        for index, (origin, destination) in enumerate(routes):
+            history = self.load(origin, destination)
+            prices = history["price"][history["timestamp"] >= cutoff][-max_points:]
+            matrix[index, :len(prices)] = prices
+        return matrix
+
+
+def score_deals(history_matrix, current_prices, percentile=DEFAULT_PERCENTILE,
+                z_threshold=DEFAULT_Z_THRESHOLD, min_history=DEFAULT_MIN_HISTORY):
+    """
+    Scores the current price of every route against its history in one vectorized pass.
+
+    A price is a deal when it is a new rolling minimum, or when it is both within the
+    cheapest `percentile` % of recent prices and at least |z_threshold| standard deviations
+    below the recent mean. Routes with less than `min_history` observations are never
+    flagged (has_history is False) so the caller can fall back to a simpler rule.
+
+    Args:
+        history_matrix (numpy.ndarray): (routes x points) prices, NaN where missing.
+        current_prices (array-like): The price found now for each route (NaN if none).
+        percentile (float): Percentile threshold (0-100).
+        z_threshold (float): Z-score threshold (negative = below the mean).
+        min_history (int): Minimum observations needed to score a route.
+
+    Returns:
+        dict: Arrays (one value per route) "is_deal", "has_history", "rolling_min",
+              "percentile_price", "mean", "z_score".
+    """
+    current = np.asarray(current_prices, dtype=float)
+    counts = np.count_nonzero(~np.isnan(history_matrix), axis=1)
+
+    # Routes without history produce all-NaN rows, their warnings are expected
+    with warnings.catch_warnings(), np.errstate(invalid="ignore", divide="ignore"):
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        rolling_min = np.nanmin(history_matrix, axis=1)
+        percentile_price = np.nanpercentile(history_matrix, percentile, axis=1)
+        mean = np.nanmean(history_matrix, axis=1)
+        std = np.nanstd(history_matrix, axis=1)
+        z_score = np.where(std > 0, (current - mean) / std, 0.0)
+
+    has_history = (counts >= min_history) & ~np.isnan(current)
+    is_deal = has_history & (
+        (current < rolling_min) | ((current <= percentile_price) & (z_score <= z_threshold))
+    )
+
+    return {
+        "is_deal": is_deal,
+        "has_history": has_history,
+        "rolling_min": rolling_min,
+        "percentile_price": percentile_price,
+        "mean": mean,
+        "z_score": z_score,
+    }
@@ -0,0 +1,101 @@
+import json
+import os
+import tempfile
+import time
+
+DEFAULT_SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sheet_snapshot.json")
+
+
+class SheetSnapshotStore:
+    """
+    This class keeps a local copy of the destination sheet so unchanged sheets don't need a full download.
+    Rows are stored column by column (one array per column, keyed by row id), together with the
+    ETag / Last-Modified validators returned by Sheety for conditional requests.
+    """
+
+    def __init__(self, path=None):
+        """
+        Initializes the store.
+
+        Args:
+            path (str): Location of the snapshot file. Defaults to SHEET_SNAPSHOT_PATH or a file next to this module.
+        """
+        self.path = path or os.getenv("SHEET_SNAPSHOT_PATH", DEFAULT_SNAPSHOT_PATH)
+
+    def load(self):
+        """
+        Reads the snapshot from disk.
+
+        Returns:
+            dict: {"rows", "etag", "last_modified", "fetched_at"} or None if there is no usable snapshot.
+        """
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                stored = json.load(file)
+            columns = stored["columns"]
+            values = stored["values"]
+            rows = [
+                {column: values[column][index] for column in columns if values[column][index] is not None}
+                for index in range(len(stored["ids"]))
+            ]
+        except (OSError, ValueError, KeyError, IndexError, TypeError):
+            return None
+
+        return {
+            "rows": rows,
+            "etag": stored.get("etag"),
+            "last_modified": stored.get("last_modified"),
+            "fetched_at": stored.get("fetched_at", 0),
+        }
+
+    def save(self, rows, etag=None, last_modified=None, fetched_at=None):
+        """
+        Writes the rows to disk in a compact columnar layout (atomically).
+
+        Args:
+            rows (list): The sheet rows (dictionaries with an "id" key).
+            etag (str): The ETag of the response the rows came from, if any.
+            last_modified (str): The Last-Modified header of that response, if any.
+            fetched_at (float): When the rows were read from Sheety. Defaults to now.
+        """
+        columns = []
+        for row in rows:
+            for column in row:
+                if column not in columns:
+                    columns.append(column)
+
+        snapshot = {
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched_at": fetched_at if fetched_at is not None else time.time(),
+            "columns": columns,
+            "ids": [row.get("id") for row in rows],
+            "values": {column: [row.get(column) for row in rows] for column in columns},
+        }
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        try:
+            file_descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix=".sheet_snapshot_")
+            with os.fdopen(file_descriptor, "w", encoding="utf-8") as file:
+                json.dump(snapshot, file, separators=(",", ":"))
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"⚠️ Could not save sheet snapshot: {e}")
+
+    def apply_changes(self, changes):
+        """
+        Applies cells written back to Sheety to the local snapshot.
+        The validators are cleared because our own write changed the remote sheet.
+
+        Args:
+            changes (dict): {row_id: {column: new_value}} as sent to Sheety.
+        """
+        snapshot = self.load()
+        if snapshot is None or not changes:
+            return
+
+        for row in snapshot["rows"]:
+            if row.get("id") in changes:
+                row.update(changes[row["id"]])
+
+        self.save(snapshot["rows"], etag=None, last_modified=None, fetched_at=snapshot["fetched_at"])
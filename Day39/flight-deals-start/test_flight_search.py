@@ -0,0 +1,184 @@
+"""
+Tests of the parallel flight searches against a local HTTP stand-in for Amadeus.
+
+Run with:
+    python -m unittest test_flight_search
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from flight_search import FlightSearch
+from http_session import create_session
+from iata_cache import IataCache
+from offer_cache import OfferCache
+
+
+class AmadeusStandIn(BaseHTTPRequestHandler):
+    """Answers the token and flight-offer requests, counting the searches in flight at once."""
+    protocol_version = "HTTP/1.1"
+    lock = threading.Lock()
+    in_flight = 0
+    max_in_flight = 0
+    searches = []
+    latency = None    # Fixed seconds per search (by default the first destinations answer last)
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, body):
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self._send({"access_token": "test-token", "expires_in": 1799})
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        origin = query["originLocationCode"][0]
+        destination = query["destinationLocationCode"][0]
+        number = int(destination[1:])
+        cls = type(self)
+        with cls.lock:
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+            cls.searches.append((origin, destination))
+        # The first destinations answer last, so completion order differs from input order
+        time.sleep(cls.latency if cls.latency is not None else 0.02 * (12 - number % 12))
+        with cls.lock:
+            cls.in_flight -= 1
+
+        departure = query["departureDate"][0]
+        self._send({"data": [{
+            "price": {"total": f"{100 + number}.00"},
+            "itineraries": [
+                {"segments": [{"departure": {"iataCode": origin, "at": f"{departure}T10:00:00"},
+                               "arrival": {"iataCode": destination, "at": f"{departure}T20:00:00"}}]},
+                {"segments": [{"departure": {"iataCode": destination, "at": f"{departure}T10:00:00"},
+                               "arrival": {"iataCode": origin, "at": f"{departure}T20:00:00"}}]},
+            ],
+        }]})
+
+
+class FlightSearchConcurrencyTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), AmadeusStandIn)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        AmadeusStandIn.in_flight = 0
+        AmadeusStandIn.max_in_flight = 0
+        AmadeusStandIn.searches = []
+        AmadeusStandIn.latency = None
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        environment = mock.patch.dict(os.environ, {
+            "AMADEUS_BASE_URL": f"http://127.0.0.1:{self.server.server_port}",
+            "AMADEUS_API_KEY": "key",
+            "AMADEUS_API_SECRET": "secret",
+            "AMADEUS_TOKEN_CACHE": os.path.join(directory.name, "token.json"),
+            "AMADEUS_REQUESTS_PER_SECOND": "1000",
+            "FLIGHT_SEARCH_CONCURRENCY": "3",
+        })
+        environment.start()
+        self.addCleanup(environment.stop)
+        self.flight_search = FlightSearch(
+            iata_cache=IataCache(os.path.join(directory.name, "iata.sqlite3")),
+            session=create_session(pool_maxsize=10),
+            offer_cache=OfferCache(os.path.join(directory.name, "offers.sqlite3")),
+        )
+
+    def test_results_keep_the_input_order(self):
+        destinations = [f"D{number:02d}" for number in range(12)]
+        flights = self.flight_search.search_flights_many("MEX", destinations)
+
+        self.assertEqual([flight.destination_airport for flight in flights], destinations)
+        self.assertEqual([flight.price for flight in flights], [100.0 + number for number in range(12)])
+
+    def test_concurrency_scales_up_to_the_pool_size(self):
+        self.flight_search.search_flights_many("MEX", [f"D{number:02d}" for number in range(12)])
+
+        self.assertEqual(len(AmadeusStandIn.searches), 12)
+        self.assertGreater(AmadeusStandIn.max_in_flight, 1)
+        self.assertLessEqual(AmadeusStandIn.max_in_flight, 3)
+
+    def test_wall_time_scales_with_concurrency_not_row_count(self):
+        searches, latency = 16, 0.1
+        AmadeusStandIn.latency = latency
+        self.flight_search.get_access_token()
+
+        def timed_run(workers):
+            self.flight_search.max_workers = workers
+            self.flight_search._search_executor = None
+            # New destinations every run, so the offer cache can't answer them
+            destinations = [f"D{number:02d}" for number in range(workers * 100, workers * 100 + searches)]
+            started = time.perf_counter()
+            self.flight_search.search_flights_many("MEX", destinations)
+            return time.perf_counter() - started
+
+        # One worker: one round-trip per row (stand-in latency plus the client's own work per search)
+        sequential = timed_run(1)
+        self.assertGreaterEqual(sequential, searches * latency)
+        for workers in (2, 4):
+            elapsed = timed_run(workers)
+            # About searches / workers round-trips: never faster than the latency allows...
+            self.assertGreaterEqual(elapsed, searches / workers * latency * 0.9)
+            # ...and close to the sequential time divided by the number of workers
+            self.assertLess(elapsed, sequential / workers * 1.4)
+
+    def test_pool_is_shared_and_duplicate_routes_are_searched_once(self):
+        destinations = [f"D{number:02d}" for number in range(6)]
+        results = {}
+
+        def search(origins):
+            for origin, destination, flight in self.flight_search.search_routes(origins, destinations + destinations):
+                results[(origin, destination)] = flight.price
+
+        # Two callers at once still share the bound of 3 searches in flight
+        callers = [threading.Thread(target=search, args=(["MEX", "GDL"],)) for _ in range(2)]
+        for caller in callers:
+            caller.start()
+        for caller in callers:
+            caller.join()
+
+        self.assertEqual(len(AmadeusStandIn.searches), 12)
+        self.assertEqual(len(set(AmadeusStandIn.searches)), 12)
+        self.assertLessEqual(AmadeusStandIn.max_in_flight, 3)
+        self.assertEqual(results[("GDL", "D04")], 104.0)
+
+    def test_offers_answered_by_the_cache_are_flagged(self):
+        first = self.flight_search.search_flights("MEX", "D03")
+        second = self.flight_search.search_flights("MEX", "D03")
+
+        self.assertFalse(first.from_cache)
+        self.assertTrue(second.from_cache)
+        self.assertEqual(second.price, first.price)
+        self.assertEqual(len(AmadeusStandIn.searches), 1)
+
+    def test_finished_searches_are_not_kept(self):
+        self.flight_search.search_flights_many("MEX", [f"D{number:02d}" for number in range(6)])
+
+        # Only in-flight searches are kept for dedup, finished ones are left to the offer cache
+        self.assertEqual(self.flight_search._search_jobs, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,394 @@
+"""
+Tests of the background notification queue, driven with FakeSmsTransport (nothing is sent).
+
+Run with:
+    python -m unittest test_notification_queue
+"""
+import os
+import socketserver
+import tempfile
+import threading
+import time
+import unittest
+
+from flight_data import FlightData
+from notification_manager import NotificationManager
+from notification_queue import (DedupStore, FakeSmsTransport, NotificationQueue, is_gsm7, message_length,
+                                pack_messages, segment_count)
+
+import repo_root
+from common.notifications import DeliveryError, EmailSink, FileSink, NotificationDispatcher, Sink
+
+
+def join_digest(alerts):
+    """Formats a digest as one message with all its alerts."""
+    return [" | ".join(alerts)]
+
+
+def deliver_one(transport, max_retries=3):
+    """Queues one alert with no digest window and returns the queue stats and the on_delivered results."""
+    delivered = []
+    notification_queue = NotificationQueue(transport, join_digest, digest_seconds=0, max_retries=max_retries,
+                                           retry_backoff=0.01,
+                                           on_delivered=lambda alerts, ok: delivered.append(ok))
+    notification_queue.put("MEX-PAR")
+    if not notification_queue.close(timeout=5):
+        raise AssertionError("the notification queue did not drain")
+    return notification_queue.stats, delivered
+
+
+class RefusingSink(Sink):
+    """Sink whose sends always fail with an HTTP status, like a Twilio error."""
+    name = "refusing"
+
+    def __init__(self, status):
+        self.status = status
+        self.attempts = 0
+
+    def send(self, body, subject):
+        self.attempts += 1
+        error = RuntimeError(f"HTTP {self.status}")
+        error.status = self.status
+        raise error
+
+
+class SlowSink(Sink):
+    """Sink that takes longer than its timeout, like an SMS gateway that hangs."""
+    name = "slow"
+
+    def __init__(self, delay, timeout):
+        self.delay = delay
+        self.timeout = timeout
+        self.attempts = 0
+        self.messages = []
+
+    def send(self, body, subject):
+        self.attempts += 1
+        time.sleep(self.delay)
+        self.messages.append(body)
+
+
+class FlakySink(RefusingSink):
+    """Sink that fails with an HTTP status the first `fail_times` sends, then delivers."""
+    name = "flaky"
+
+    def __init__(self, status, fail_times):
+        super().__init__(status)
+        self.fail_times = fail_times
+        self.messages = []
+
+    def send(self, body, subject):
+        if self.attempts < self.fail_times:
+            return super().send(body, subject)
+        self.attempts += 1
+        self.messages.append(body)
+
+
+class SmtpStandIn(socketserver.StreamRequestHandler):
+    """Minimal SMTP server that keeps the messages it receives in `messages`."""
+    messages = []
+
+    def _reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self._reply("220 localhost ready")
+        for raw in self.rfile:
+            command = raw.decode().strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                self._reply("250 localhost")
+            elif command == "DATA":
+                self._reply("354 end with <CRLF>.<CRLF>")
+                lines = []
+                for line in self.rfile:
+                    if line in (b".\r\n", b".\n"):
+                        break
+                    lines.append(line.decode())
+                type(self).messages.append("".join(lines))
+                self._reply("250 queued")
+            elif command == "QUIT":
+                self._reply("221 bye")
+                return
+            else:
+                self._reply("250 ok")
+
+
+class SegmentTest(unittest.TestCase):
+
+    def test_gsm7_segments(self):
+        self.assertTrue(is_gsm7("Paris $12,700 MXN"))
+        self.assertEqual(segment_count(""), 1)
+        self.assertEqual(segment_count("a" * 160), 1)
+        self.assertEqual(segment_count("a" * 161), 2)
+        self.assertEqual(segment_count("a" * 306), 2)
+        self.assertEqual(segment_count("a" * 307), 3)
+
+    def test_gsm7_extended_characters_count_twice(self):
+        self.assertEqual(message_length("€[]"), (6, True))
+        self.assertEqual(segment_count("€" * 80), 1)
+        self.assertEqual(segment_count("€" * 81), 2)
+
+    def test_ucs2_segments(self):
+        self.assertFalse(is_gsm7("Cancún"))
+        self.assertEqual(segment_count("á" * 70), 1)
+        self.assertEqual(segment_count("á" * 71), 2)
+        self.assertEqual(segment_count("á" * 134), 2)
+        # Emoji outside the basic plane take two UTF-16 units
+        self.assertEqual(message_length("🎉"), (2, False))
+        self.assertEqual(segment_count("🎉" * 35), 1)
+        self.assertEqual(segment_count("🎉" * 36), 2)
+
+    def test_pack_messages_respects_the_segment_budget(self):
+        header = "3 deals\n"
+        blocks = [f"{number}. {'x' * 140}\n" for number in range(5)]
+        messages = pack_messages(header, blocks, footer="Book soon!", max_segments=2)
+
+        self.assertGreater(len(messages), 1)
+        for message in messages:
+            self.assertTrue(message.startswith(header))
+            self.assertLessEqual(segment_count(message), 2)
+        # Every block is sent exactly once, in order, and never split
+        sent = "".join(message[len(header):] for message in messages).replace("Book soon!", "")
+        self.assertEqual(sent, "".join(blocks))
+
+    def test_pack_messages_drops_a_footer_that_does_not_fit(self):
+        header = "Deals\n"
+        blocks = ["a" * 150]
+        # 6 + 150 + 4 characters still fit in one segment, 6 + 150 + 5 don't
+        self.assertEqual(pack_messages(header, blocks, footer="!" * 4, max_segments=1), [header + "a" * 150 + "!!!!"])
+        self.assertEqual(pack_messages(header, blocks, footer="!" * 5, max_segments=1), [header + "a" * 150])
+
+    def test_pack_messages_sends_an_oversized_block_alone(self):
+        messages = pack_messages("H\n", ["short\n", "b" * 400, "tail\n"], max_segments=1)
+        self.assertEqual(messages, ["H\nshort\n", "H\n" + "b" * 400, "H\ntail\n"])
+
+
+class SingleDealFormatTest(unittest.TestCase):
+
+    def test_single_deal_fits_the_segment_limit(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        flight = FlightData(12700, "MEX", "CDG", "2026-11-01", "2026-11-15")
+        deal = {"flight_data": flight, "city": "París", "current_price": 15000.0, "found_price": 12700.0}
+        manager = NotificationManager(transport=FakeSmsTransport(),
+                                      dedup_store=DedupStore(os.path.join(directory.name, "dedup.json")))
+
+        for max_segments in (2, 3, 5):
+            with self.subTest(max_segments=max_segments):
+                manager.max_segments = max_segments
+                messages = manager.format_digest([deal])
+                self.assertEqual(len(messages), 1)
+                self.assertLessEqual(segment_count(messages[0]), max_segments)
+                self.assertIn("París", messages[0])
+                self.assertIn("12700", messages[0])
+        # With room for it, the detailed alert is kept
+        self.assertIn("Google Flights", messages[0])
+
+
+class NotificationQueueTest(unittest.TestCase):
+
+    def test_alerts_within_the_window_are_sent_as_one_digest(self):
+        transport = FakeSmsTransport()
+        delivered = []
+        notification_queue = NotificationQueue(transport, join_digest, digest_seconds=0.3,
+                                               on_delivered=lambda alerts, ok: delivered.append((alerts, ok)))
+        for alert in ("MEX-PAR", "MEX-BER", "MEX-TYO"):
+            notification_queue.put(alert)
+        time.sleep(0.6)
+        notification_queue.put("MEX-LIM")
+
+        self.assertTrue(notification_queue.close(timeout=5))
+        self.assertEqual(transport.messages, ["MEX-PAR | MEX-BER | MEX-TYO", "MEX-LIM"])
+        self.assertEqual(delivered, [(["MEX-PAR", "MEX-BER", "MEX-TYO"], True), (["MEX-LIM"], True)])
+        self.assertEqual(notification_queue.stats["queued"], 4)
+        self.assertEqual(notification_queue.stats["digests"], 2)
+        self.assertEqual(notification_queue.stats["messages_sent"], 2)
+
+    def test_close_sends_without_waiting_for_the_window(self):
+        transport = FakeSmsTransport()
+        notification_queue = NotificationQueue(transport, join_digest, digest_seconds=60)
+        notification_queue.put("MEX-PAR")
+        notification_queue.put("MEX-BER")
+
+        started = time.monotonic()
+        self.assertTrue(notification_queue.close(timeout=5))
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(transport.messages, ["MEX-PAR | MEX-BER"])
+
+    def test_server_errors_are_retried(self):
+        transport = FakeSmsTransport(fail_times=2, status=503)
+        stats, delivered = deliver_one(transport)
+
+        self.assertEqual(transport.attempts, 3)
+        self.assertEqual(transport.messages, ["MEX-PAR"])
+        self.assertEqual(stats["retries"], 2)
+        self.assertEqual(delivered, [True])
+
+    def test_network_errors_and_throttling_are_retried(self):
+        for status in (None, 429):
+            with self.subTest(status=status):
+                transport = FakeSmsTransport(fail_times=1, status=status)
+                stats, delivered = deliver_one(transport)
+                self.assertEqual(transport.attempts, 2)
+                self.assertEqual(delivered, [True])
+
+    def test_client_errors_are_not_retried(self):
+        transport = FakeSmsTransport(fail_times=10, status=400)
+        stats, delivered = deliver_one(transport)
+
+        self.assertEqual(transport.attempts, 1)
+        self.assertEqual(transport.messages, [])
+        self.assertEqual(stats["retries"], 0)
+        self.assertEqual(stats["messages_failed"], 1)
+        self.assertEqual(delivered, [False])
+
+    def test_retries_stop_after_max_retries(self):
+        transport = FakeSmsTransport(fail_times=10, status=500)
+        stats, delivered = deliver_one(transport, max_retries=2)
+
+        self.assertEqual(transport.attempts, 3)
+        self.assertEqual(stats["messages_failed"], 1)
+        self.assertEqual(delivered, [False])
+
+    def test_dispatcher_refusals_follow_the_same_split(self):
+        for status, attempts in ((400, 1), (404, 1), (503, 4)):
+            with self.subTest(status=status):
+                sink = RefusingSink(status)
+                dispatcher = NotificationDispatcher([sink])
+                try:
+                    deliver_one(dispatcher)
+                finally:
+                    dispatcher.close()
+                self.assertEqual(sink.attempts, attempts)
+
+
+class DispatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        SmtpStandIn.messages = []
+        server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), SmtpStandIn)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.email = EmailSink("127.0.0.1", server.server_address[1], "alerts@localhost", ["me@localhost"], timeout=1)
+        self.file = FileSink(os.path.join(directory.name, "sent.log"), timeout=1)
+
+    def _dispatcher(self, sink):
+        dispatcher = NotificationDispatcher([sink, self.email, self.file])
+        self.addCleanup(dispatcher.close)
+        return dispatcher
+
+    def test_slow_sink_does_not_hold_up_the_others(self):
+        slow = SlowSink(delay=0.8, timeout=0.2)
+        dispatcher = self._dispatcher(slow)
+
+        started = time.monotonic()
+        with self.assertRaises(DeliveryError) as raised:
+            dispatcher.send("MEX-PAR $12700")
+        # The email and the file went out within their own timeouts, the slow sink was given up on
+        self.assertLess(time.monotonic() - started, 0.6)
+        self.assertTrue(raised.exception.retryable)
+        self.assertEqual(raised.exception.results, {"slow": False, "email": True, "file": True})
+        self.assertEqual(len(SmtpStandIn.messages), 1)
+        self.assertIn("MEX-PAR $12700", SmtpStandIn.messages[0])
+
+        # The retry waits for the send still in progress instead of queueing a second copy
+        time.sleep(0.8)
+        self.assertEqual(dispatcher.send("MEX-PAR $12700"), "slow, email, file")
+        self.assertEqual(slow.attempts, 1)
+        self.assertEqual(slow.messages, ["MEX-PAR $12700"])
+        self.assertEqual(len(SmtpStandIn.messages), 1)
+
+    def test_retryable_failure_of_one_sink_is_raised_and_only_that_sink_retried(self):
+        sms = FlakySink(status=503, fail_times=1)
+        dispatcher = self._dispatcher(sms)
+
+        with self.assertRaises(DeliveryError) as raised:
+            dispatcher.send("MEX-PAR $12700")
+        self.assertTrue(raised.exception.retryable)
+        self.assertEqual(raised.exception.results, {"flaky": False, "email": True, "file": True})
+
+        self.assertEqual(dispatcher.send("MEX-PAR $12700"), "flaky, email, file")
+        self.assertEqual(sms.messages, ["MEX-PAR $12700"])
+        self.assertEqual(len(SmtpStandIn.messages), 1)
+        with open(self.file.path, encoding="utf-8") as file:
+            self.assertEqual(file.read().count("MEX-PAR $12700"), 2)    # Subject and body of one entry
+
+    def test_client_error_of_one_sink_is_not_raised(self):
+        dispatcher = self._dispatcher(RefusingSink(400))
+
+        self.assertEqual(dispatcher.send("MEX-PAR $12700"), "email, file")
+
+    def test_queue_retries_the_failed_sink_until_it_delivers(self):
+        sms = FlakySink(status=503, fail_times=2)
+        stats, delivered = deliver_one(self._dispatcher(sms))
+
+        self.assertEqual(sms.attempts, 3)
+        self.assertEqual(stats["retries"], 2)
+        self.assertEqual(delivered, [True])
+        self.assertEqual(len(SmtpStandIn.messages), 1)
+
+
+class DedupTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "dedup.json")
+
+    def test_same_route_and_price_bucket_is_claimed_once(self):
+        store = DedupStore(self.path, bucket_size=500, window_seconds=3600)
+        key = store.key("MEX", "PAR", 12700)
+
+        self.assertEqual(key, "MEX-PAR:25")
+        self.assertEqual(store.key("MEX", "PAR", 12999), key)
+        self.assertNotEqual(store.key("MEX", "PAR", 13000), key)
+        self.assertTrue(store.claim(key))
+        self.assertFalse(store.claim(key))
+
+    def test_failed_delivery_frees_the_key(self):
+        store = DedupStore(self.path, bucket_size=500, window_seconds=3600)
+        key = store.key("MEX", "PAR", 12700)
+        store.claim(key)
+        store.release([key], delivered=False)
+
+        self.assertTrue(store.claim(key))
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_delivered_keys_survive_a_restart_until_the_window_ends(self):
+        store = DedupStore(self.path, bucket_size=500, window_seconds=0.2)
+        key = store.key("MEX", "PAR", 12700)
+        store.claim(key)
+        store.release([key], delivered=True)
+
+        self.assertFalse(DedupStore(self.path, bucket_size=500, window_seconds=0.2).claim(key))
+        time.sleep(0.3)
+        self.assertTrue(DedupStore(self.path, bucket_size=500, window_seconds=0.2).claim(key))
+
+    def test_manager_skips_deals_already_alerted(self):
+        flight = FlightData(12700, "MEX", "PAR", "2026-11-01", "2026-11-15")
+
+        def run():
+            transport = FakeSmsTransport()
+            manager = NotificationManager(transport=transport, digest_seconds=0,
+                                          dedup_store=DedupStore(self.path, bucket_size=500, window_seconds=3600))
+            queued = [manager.queue_flight_alert(flight, "Paris", 15000, price) for price in (12700, 12800)]
+            manager.close(timeout=5)
+            return queued, transport.messages
+
+        queued, messages = run()
+        self.assertEqual(queued, [True, False])
+        self.assertEqual(len(messages), 1)
+        self.assertIn("Paris", messages[0])
+
+        # The next run doesn't alert the same deal again
+        queued, messages = run()
+        self.assertEqual(queued, [False, False])
+        self.assertEqual(messages, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+"""
+Tests of the streaming pipeline runner.
+
+Run with:
+    python -m unittest test_pipeline
+"""
+import os
+import tempfile
+import threading
+import unittest
+
+from checkpoint import CheckpointJournal
+from flight_data import FlightData
+from pipeline import CompareStage, DestinationResult, Pipeline, Stage, WriteBackStage
+from price_history import PriceHistoryStore
+
+
+class Double(Stage):
+    name = "double"
+    workers = 2
+
+    def process(self, item):
+        return [item * 2]
+
+
+class FailOnSeven(Stage):
+    """Processes micro-batches, failing on any batch that contains the doubled 7."""
+    name = "fail-on-seven"
+    batch_size = 8
+
+    def process_batch(self, items):
+        if 14 in items:
+            raise ValueError("bad row")
+        return items
+
+
+class CrashingDataManager:
+    """Writes the rows to the sheet, then the run dies before the alerts go out."""
+
+    def __init__(self):
+        self.rows = []
+
+    def update_destination_codes(self, rows):
+        self.rows.extend(rows)
+        raise SystemExit("killed after the write-back")
+
+
+def broken_source():
+    yield 1
+    yield 2
+    raise OSError("snapshot unreadable")
+
+
+class PipelineTest(unittest.TestCase):
+
+    def test_source_error_ends_the_stream_and_is_raised(self):
+        pipeline = Pipeline([Double()])
+        outputs = []
+
+        def consume():
+            with self.assertRaises(OSError):
+                for item in pipeline.stream(broken_source()):
+                    outputs.append(item)
+
+        consumer = threading.Thread(target=consume)
+        consumer.start()
+        consumer.join(5)
+        self.assertFalse(consumer.is_alive(), "the pipeline hung after the source failed")
+        self.assertEqual(sorted(outputs), [2, 4])
+
+    def test_failed_batch_is_retried_item_by_item(self):
+        pipeline = Pipeline([Double(), FailOnSeven()])
+        outputs = pipeline.run(range(20))
+
+        self.assertEqual(sorted(outputs), [item * 2 for item in range(20) if item != 7])
+        self.assertEqual(pipeline.dropped, {"fail-on-seven": 1})
+
+
+class CompareStageTest(unittest.TestCase):
+
+    def test_only_new_observations_are_recorded(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        history = PriceHistoryStore(directory.name)
+        result = DestinationResult({"city": "Paris", "iataCode": "PAR", "lowestPrice": 15000})
+        result.flights = {
+            "MEX": FlightData(12000, "MEX", "PAR", "2026-11-01", "2026-11-15"),
+            "GDL": FlightData(11000, "GDL", "PAR", "2026-11-01", "2026-11-15", from_cache=True),
+            "MTY": FlightData(13000, "MTY", "PAR", "2026-11-01", "2026-11-15"),
+        }
+        result.reused.add("MTY")
+
+        CompareStage(history).process_batch([result])
+
+        # The offer-cache hit and the checkpoint reuse were already recorded when first seen
+        self.assertEqual(list(history.load("MEX", "PAR")["price"]), [12000])
+        self.assertEqual(len(history.load("GDL", "PAR")), 0)
+        self.assertEqual(len(history.load("MTY", "PAR")), 0)
+        self.assertEqual(result.route, ("GDL", "PAR"))
+
+
+class PendingAlertTest(unittest.TestCase):
+
+    def test_deals_written_before_a_crash_are_still_alerted_on_resume(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "checkpoint.jsonl")
+        result = DestinationResult({"city": "Paris", "iataCode": "PAR", "lowestPrice": 12000})
+        result.flight = FlightData(12000, "MEX", "PAR", "2026-11-01", "2026-11-15")
+        result.is_deal = True
+        result.reference_price = 15000.0
+
+        data_manager = CrashingDataManager()
+        with self.assertRaises(SystemExit):
+            WriteBackStage(data_manager, checkpoint=CheckpointJournal(path)).process_batch([result])
+        self.assertEqual(len(data_manager.rows), 1)
+
+        # The resumed run no longer sees the deal in the sheet, but finds its alert in the journal
+        journal = CheckpointJournal(path)
+        [(city, current_price, flight)] = journal.pending_alerts()
+        self.assertEqual((city, current_price, flight.price), ("Paris", 15000.0, 12000))
+        self.assertEqual((flight.origin_airport, flight.out_date), ("MEX", "2026-11-01"))
+
+        # Once handed to the notifications, the alerts are dropped from the log
+        journal.clear_alerts()
+        journal.compact()
+        self.assertEqual(CheckpointJournal(path).pending_alerts(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import requests
+
+# Refresh the token a little before Amadeus expires it
+DEFAULT_REFRESH_MARGIN_SECONDS = 60
+DEFAULT_TOKEN_CACHE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class TokenManager:
+    """
+    This class is responsible for the Amadeus OAuth2 access token.
+    It requests a token only when needed, refreshes it shortly before it expires
+    (or after a 401), and caches it on disk so back-to-back runs can reuse it.
+    Only one refresh is in flight at a time, even when many searches run in parallel.
+    """
+
+    def __init__(self, token_url, api_key, api_secret, cache_path=None,
+                 refresh_margin=DEFAULT_REFRESH_MARGIN_SECONDS, session=None):
+        """
+        Initializes the TokenManager. No network call is made here.
+
+        Args:
+            token_url (str): The Amadeus OAuth2 token endpoint.
+            api_key (str): The Amadeus API key (client id).
+            api_secret (str): The Amadeus API secret (client secret).
+            cache_path (str): File used to share the token between processes.
+                Defaults to AMADEUS_TOKEN_CACHE or a file next to this module.
+            refresh_margin (int): Seconds before expiry at which the token is refreshed.
+            session: Object with a ``post`` method used for the token request (defaults to ``requests``).
+        """
+        self.token_url = token_url
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.refresh_margin = refresh_margin
+        self.session = session or requests
+
+        # One cache file per API key, so switching credentials never reuses a foreign token
+        key_hash = hashlib.sha256((api_key or "").encode()).hexdigest()[:12]
+        default_path = os.path.join(DEFAULT_TOKEN_CACHE_DIR, f".amadeus_token_{key_hash}.json")
+        self.cache_path = cache_path or os.getenv("AMADEUS_TOKEN_CACHE", default_path)
+
+        self._token = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+
+    def _is_fresh(self, expires_at):
+        """Checks whether a token that expires at ``expires_at`` is still usable."""
+        return expires_at - self.refresh_margin > time.time()
+
+    def get_token(self):
+        """
+        Returns a valid access token, refreshing it if it is missing or about to expire.
+
+        Returns:
+            str: The access token.
+        """
+        # Fast path without the lock, the common case once a token is loaded
+        token, expires_at = self._token, self._expires_at
+        if token and self._is_fresh(expires_at):
+            return token
+
+        with self._lock:
+            # Another thread may have refreshed while we were waiting for the lock
+            if self._token and self._is_fresh(self._expires_at):
+                return self._token
+
+            if self._load_from_disk():
+                return self._token
+
+            self._refresh()
+            return self._token
+
+    def invalidate(self, rejected_token):
+        """
+        Marks a token as rejected (e.g. after a 401) so the next get_token() refreshes it.
+        If another thread already replaced the token, nothing happens.
+
+        Args:
+            rejected_token (str): The token the API rejected.
+        """
+        with self._lock:
+            if self._token == rejected_token:
+                self._token = None
+                self._expires_at = 0.0
+                self._delete_cache_file(rejected_token)
+
+    def _refresh(self):
+        """Requests a new token from Amadeus and stores it in memory and on disk."""
+        print("🔑 Requesting a new Amadeus access token...")
+        headers = {
+            'Content-Type': 'application/x-www-form-urlencoded'
+        }
+        body = {
+            "grant_type": "client_credentials",
+            "client_id": self.api_key,
+            "client_secret": self.api_secret
+        }
+        response = self.session.post(self.token_url, headers=headers, data=body)
+        response.raise_for_status()
+        data = response.json()
+
+        self._token = data["access_token"]
+        # Amadeus tokens usually last 1799 seconds
+        self._expires_at = time.time() + int(data.get("expires_in", 1799))
+        self._save_to_disk()
+
+    def _load_from_disk(self):
+        """
+        Loads a token cached by a previous (or parallel) process.
+
+        Returns:
+            bool: True if a fresh token was loaded, False otherwise.
+        """
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as file:
+                cached = json.load(file)
+            token = cached["access_token"]
+            expires_at = float(cached["expires_at"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+
+        if not self._is_fresh(expires_at):
+            return False
+
+        self._token = token
+        self._expires_at = expires_at
+        print("💾 Reusing cached Amadeus access token")
+        return True
+
+    def _save_to_disk(self):
+        """Writes the token atomically so other processes never read a half-written file."""
+        directory = os.path.dirname(os.path.abspath(self.cache_path))
+        try:
+            file_descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix=".amadeus_token_")
+            with os.fdopen(file_descriptor, "w", encoding="utf-8") as file:
+                json.dump({"access_token": self._token, "expires_at": self._expires_at}, file)
+            os.replace(temp_path, self.cache_path)
+        except OSError as e:
+            print(f"⚠️ Could not cache Amadeus token on disk: {e}")
+
+    def _delete_cache_file(self, rejected_token):
+        """Removes the on-disk token if it is the rejected one, so the next process doesn't reuse it."""
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as file:
+                if json.load(file).get("access_token") != rejected_token:
+                    return
+            os.remove(self.cache_path)
+        except (OSError, ValueError, AttributeError):
+            pass
@@ -0,0 +1,187 @@
+"""
+Benchmark: startup cost of the day scripts on their "nothing to do" cron runs.
+
+Each scenario runs a script the way cron does, offline and with local fixtures:
+the stock watcher and the TSLA/XRP scripts with a fresh price history and no significant
+move, the Pixela script with a fresh mirror that already has yesterday's pixel,
+ingest.py --dry-run with every description already cached, and the flight-deals
+scan with no sheet to read. Every run uses `python -X importtime`, so the report shows
+the wall time of the process, the time spent importing modules, the heaviest top-level
+imports, and whether requests, numpy or twilio were loaded at all.
+A scenario whose script exits with another code than expected (it crashed instead of
+finding nothing to do) is reported as failed with the end of its stderr, and the
+benchmark then exits with status 1.
+
+Usage:
+    python benchmark_startup.py [rounds]
+"""
+from datetime import date, timedelta
+from pathlib import Path
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = Path(__file__).resolve().parent
+sys.path.append(str(ROOT / "Day36" / "stock_watcher"))
+sys.path.append(str(ROOT / "Day37"))
+sys.path.append(str(ROOT / "Day38"))
+
+# "import time: self [us] | cumulative | imported package"
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+WATCHED_MODULES = ("requests", "numpy", "twilio", "smtplib", "sqlite3")
+# Lines of stderr (besides the import times) shown for a failed scenario
+STDERR_TAIL_LINES = 8
+
+
+class ScenarioError(Exception):
+    """Raised when a scenario's script exits with an unexpected return code."""
+
+
+def write_fixtures(directory):
+    """Writes a fresh, flat price history, a Pixela mirror and a filled exercise cache, and returns the environment to use."""
+    from types import SimpleNamespace
+    from exercise_cache import ExerciseCache
+    from history_store import HistoryStore
+    from market_data import CRYPTO, EQUITY
+    from pixel_mirror import PixelMirror
+    from workouts import load_profile
+    import numpy as np
+
+    history = HistoryStore(os.path.join(directory, "history"))
+    days = np.array([date.today() - timedelta(days=offset) for offset in reversed(range(60))], dtype="datetime64[D]")
+    closes = 100 + 0.01 * np.sin(np.arange(len(days)))
+    for symbol, kind in (("TSLA", EQUITY), ("AAPL", EQUITY), ("XRP", CRYPTO)):
+        history.merge(symbol, kind, days, closes)
+
+    # Day37's main.py sets yesterday's pixel to 2.0
+    mirror = PixelMirror(SimpleNamespace(graph_id="graph13"), os.path.join(directory, "pixela_mirror.bin"))
+    mirror.quantities[mirror._ensure(date.today() - timedelta(days=1))] = 2.0
+    mirror.synced_through = date.today()
+    mirror.refreshed_at = time.time()
+    mirror.save()
+
+    workouts_path = os.path.join(directory, "workouts.txt")
+    cache = ExerciseCache(os.path.join(directory, "exercises.sqlite3"))
+    with open(workouts_path, "w", encoding="utf-8") as file:
+        for day in range(1, 29):
+            description = "I ran 5 kilometers" if day % 2 else "45 minutes of yoga"
+            file.write(f"2025-02-{day:02d} 07:30 | {description}\n")
+            cache.set(description, load_profile(),
+                      [{"name": "running", "duration_min": 30, "nf_calories": 300}])
+    cache.close()
+
+    environment = {key: value for key, value in os.environ.items() if not key.startswith("TWILIO")}
+    environment.update({
+        "STOCK_HISTORY_DIR": history.directory,
+        "STOCK_HISTORY_MAX_AGE_HOURS": "24",
+        "WATCHLIST": "TSLA,AAPL,XRP:crypto",
+        "NEWS_INDEX_PATH": os.path.join(directory, "news.sqlite3"),
+        "PIXELA_MIRROR_PATH": mirror.path,
+        "PIXELA_GRAPH_ID": "graph13",
+        "EXERCISE_CACHE_PATH": os.path.join(directory, "exercises.sqlite3"),
+        "SHEETY_QUEUE_PATH": os.path.join(directory, "sheety_queue.sqlite3"),
+        "SHEET_SYNC_MODE": "snapshot",
+        "SHEET_SNAPSHOT_PATH": os.path.join(directory, "missing_snapshot.json"),
+        "IATA_CACHE_PATH": os.path.join(directory, "iata.sqlite3"),
+        "OFFER_CACHE_PATH": os.path.join(directory, "offers.sqlite3"),
+        "NOTIFY_DEDUP_PATH": os.path.join(directory, "dedup.json"),
+        "AMADEUS_TOKEN_CACHE": os.path.join(directory, "token.json"),
+        "CHECKPOINT_PATH": os.path.join(directory, "checkpoint.jsonl"),
+        "PRICE_HISTORY_DIR": os.path.join(directory, "price_history"),
+    })
+    return environment, workouts_path
+
+
+def run(script, arguments, environment, expected_returncode=0):
+    """
+    Runs a script once under -X importtime.
+
+    Args:
+        expected_returncode (int): Exit status of a normal run of the scenario.
+
+    Returns:
+        tuple: (wall seconds, import seconds, {top-level module: cumulative seconds}, set of imported modules)
+
+    Raises:
+        ScenarioError: If the script exits with another status (the message ends with its stderr).
+    """
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", script.name] + arguments,
+        cwd=script.parent, env=environment, capture_output=True, text=True
+    )
+    wall = time.perf_counter() - started
+
+    if completed.returncode != expected_returncode:
+        errors = [line for line in completed.stderr.splitlines() if not line.startswith("import time:")]
+        raise ScenarioError(f"exit status {completed.returncode} (expected {expected_returncode})\n"
+                            + "\n".join(f"      {line}" for line in errors[-STDERR_TAIL_LINES:]))
+
+    import_seconds = 0.0
+    top_level = {}
+    imported = set()
+    for line in completed.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        import_seconds += int(self_us) / 1e6
+        imported.add(name.split(".")[0])
+        # Interpreter startup (site, encodings) is the same for every script
+        if not indent and name not in ("site", "encodings"):
+            top_level[name] = int(cumulative_us) / 1e6
+    return wall, import_seconds, top_level, imported
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    with tempfile.TemporaryDirectory() as directory:
+        environment, workouts_path = write_fixtures(directory)
+        # (title, script, arguments, expected exit status)
+        scenarios = [
+            ("Day36 stock watcher, no move", ROOT / "Day36" / "stock_watcher" / "main.py", [], 0),
+            ("Day36 TSLA script, no move", ROOT / "Day36" / "TESLA_stock-news-hard-start" / "main.py", [], 0),
+            ("Day36 XRP script, no move", ROOT / "Day36" / "XRP_stock-news-hard-start" / "main.py", [], 0),
+            ("Day37 Pixela script, pixel unchanged", ROOT / "Day37" / "main.py", [], 0),
+            ("Day38 ingest --dry-run, cached", ROOT / "Day38" / "ingest.py", [workouts_path, "--dry-run"], 0),
+            # main.py exits with 1 when the sheet returns no rows
+            ("Day39 scan, no sheet data", ROOT / "Day39" / "flight-deals-start" / "main.py", [], 1),
+        ]
+
+        baseline = statistics.median(_bare_interpreter(environment) for _ in range(rounds))
+        print(f"Bare interpreter start: {baseline * 1000:.0f} ms ({rounds} rounds per scenario, medians)\n")
+        print(f"{'Scenario':<38}{'Wall':>9}{'Imports':>10}   Loaded                          Heaviest top-level imports")
+        failed = []
+        for title, script, arguments, expected_returncode in scenarios:
+            try:
+                runs = [run(script, arguments, environment, expected_returncode) for _ in range(rounds)]
+            except ScenarioError as e:
+                print(f"{title:<38}   ❌ FAILED: {e}")
+                failed.append(title)
+                continue
+            wall = statistics.median(result[0] for result in runs)
+            imports = statistics.median(result[1] for result in runs)
+            top_level, imported = runs[-1][2], runs[-1][3]
+            loaded = ",".join(name for name in WATCHED_MODULES if name in imported) or "-"
+            heaviest = sorted(top_level.items(), key=lambda item: -item[1])[:3]
+            print(f"{title:<38}{wall * 1000:>7.0f}ms{imports * 1000:>8.0f}ms   {loaded:<32}"
+                  + ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in heaviest))
+
+    if failed:
+        print(f"\n❌ {len(failed)} scenarios failed, their timings are not meaningful: {', '.join(failed)}")
+        sys.exit(1)
+
+
+def _bare_interpreter(environment):
+    """Wall time of `python -c pass`, the floor of every scenario."""
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "pass"], env=environment, check=True)
+    return time.perf_counter() - started
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""
+Incremental JSON reading for large API responses.
+
+Only the part of the document that is needed is decoded: the reader walks the raw bytes
+(chunk by chunk, e.g. from `response.iter_content()`), skips to one top-level key and
+decodes its members one at a time with `json.JSONDecoder.raw_decode`, so nothing after
+the last member used is downloaded or parsed.
+
+Usage:
+    from common.json_stream import first_array_item, iter_object_items
+    with session.get(url, params=..., stream=True) as response:
+        offer = first_array_item(response.iter_content(STREAM_CHUNK_SIZE), "data")
+"""
+import codecs
+import json
+import re
+
+# Bytes read from the network (or a bytes object) at a time
+STREAM_CHUNK_SIZE = 64 * 1024
+
+_NON_WHITESPACE = re.compile(r"\S")
+_DECODER = json.JSONDecoder()
+
+
+class MissingKeyError(KeyError):
+    """
+    Raised when the top-level object doesn't have the requested key.
+    `top_level` holds the other top-level members (e.g. an API error message).
+    """
+
+    def __init__(self, key, top_level):
+        super().__init__(key)
+        self.key = key
+        self.top_level = top_level
+
+    def __str__(self):
+        return f"{self.key!r} not found in the JSON document (top-level keys: {list(self.top_level)})"
+
+
+class JsonStream:
+    """
+    This class reads a JSON document incrementally from bytes or an iterable of byte chunks.
+    Consumed text is dropped from the buffer, so memory stays around one chunk plus the value being decoded.
+    """
+
+    def __init__(self, source, chunk_size=STREAM_CHUNK_SIZE):
+        """
+        Args:
+            source (bytes/iterable): The whole document, or its chunks (e.g. response.iter_content()).
+            chunk_size (int): Size of the slices read from a bytes source.
+        """
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            view = memoryview(source)
+            source = (view[start:start + chunk_size] for start in range(0, len(view), chunk_size))
+        self._chunks = iter(source)
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._position = 0
+        self.eof = False
+        self.bytes_read = 0
+
+    def _fill(self):
+        """Appends the next chunk to the buffer. Returns False at the end of the input."""
+        if self.eof:
+            return False
+        if self._position:
+            self._buffer = self._buffer[self._position:]
+            self._position = 0
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            self.eof = True
+            self._buffer += self._decoder.decode(b"", final=True)
+            return False
+        self.bytes_read += len(chunk)
+        self._buffer += self._decoder.decode(chunk)
+        return True
+
+    def peek(self):
+        """Returns the next non-whitespace character without consuming it ("" at the end)."""
+        while True:
+            match = _NON_WHITESPACE.search(self._buffer, self._position)
+            if match:
+                self._position = match.start()
+                return self._buffer[self._position]
+            self._position = len(self._buffer)
+            if not self._fill():
+                return ""
+
+    def expect(self, characters):
+        """
+        Consumes the next non-whitespace character.
+
+        Args:
+            characters (str): The characters allowed here, e.g. ",}".
+
+        Returns:
+            str: The character read.
+
+        Raises:
+            ValueError: If another character (or the end of the input) comes next.
+        """
+        character = self.peek()
+        if not character or character not in characters:
+            raise ValueError(f"Expected one of {characters!r} but found {character or 'the end'!r} "
+                             f"after {self.bytes_read} bytes")
+        self._position += 1
+        return character
+
+    def value(self):
+        """Decodes the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self._buffer, self._position)
+            except json.JSONDecodeError:
+                # The value continues in the next chunks: read until the pending text doubles,
+                # so a large value is decoded a few times rather than once per chunk
+                pending = len(self._buffer) - self._position
+                filled = False
+                while len(self._buffer) - self._position <= 2 * pending and self._fill():
+                    filled = True
+                if filled:
+                    continue
+                raise
+            # A number at the very end of the buffer may continue in the next chunk
+            if end == len(self._buffer) and self._fill():
+                continue
+            self._position = end
+            return value
+
+    def find_key(self, key):
+        """
+        Moves to the value of a key of the top-level object.
+
+        Returns:
+            dict: The top-level members that came before the key.
+
+        Raises:
+            MissingKeyError: If the object has no such key.
+        """
+        top_level = {}
+        self.expect("{")
+        if self.peek() == "}":
+            raise MissingKeyError(key, top_level)
+        while True:
+            name = self.value()
+            self.expect(":")
+            if name == key:
+                return top_level
+            top_level[name] = self.value()
+            if self.expect(",}") == "}":
+                raise MissingKeyError(key, top_level)
+
+    def iter_object_items(self, key):
+        """Yields the (name, value) members of the top-level object `key` one at a time."""
+        self.find_key(key)
+        self.expect("{")
+        if self.peek() == "}":
+            return
+        while True:
+            name = self.value()
+            self.expect(":")
+            yield name, self.value()
+            if self.expect(",}") == "}":
+                return
+
+    def first_array_item(self, key):
+        """Returns the first element of the top-level array `key` (None if it is empty)."""
+        self.find_key(key)
+        self.expect("[")
+        if self.peek() == "]":
+            return None
+        return self.value()
+
+
+def iter_object_items(source, key, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Yields the members of a top-level object one at a time; reading stops when the caller stops iterating.
+
+    Args:
+        source (bytes/iterable): The document or its byte chunks.
+        key (str): Top-level key of the object, e.g. "Time Series (Daily)".
+        chunk_size (int): Size of the slices read from a bytes source.
+
+    Raises:
+        MissingKeyError: If the document has no such key.
+    """
+    return JsonStream(source, chunk_size).iter_object_items(key)
+
+
+def first_array_item(source, key, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Decodes only the first element of a top-level array.
+
+    Args:
+        source (bytes/iterable): The document or its byte chunks.
+        key (str): Top-level key of the array, e.g. "data".
+        chunk_size (int): Size of the slices read from a bytes source.
+
+    Returns:
+        The first element (None if the array is empty).
+
+    Raises:
+        MissingKeyError: If the document has no such key.
+    """
+    return JsonStream(source, chunk_size).first_array_item(key)
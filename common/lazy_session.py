@@ -0,0 +1,63 @@
+"""
+Lazily built HTTP session shared by the day projects.
+
+Most cron runs of the day scripts end without a single request (the price history is
+fresh, the move is below the threshold, every description is cached...), yet importing
+requests alone costs about 100 ms. A LazySession can be created and handed around at
+startup like a real session: requests is only imported, and the session only built,
+when the first attribute (get, post, rate_limits...) is used.
+
+Usage:
+    from common.lazy_session import LazySession
+    session = LazySession(lambda session: session.rate_limits.configure(STOCK_ENDPOINT, 5 / 60, burst=1))
+    ...
+    if session.built:       # Only close what was actually opened
+        session.close()
+"""
+import threading
+
+
+class LazySession:
+    """
+    This class stands in for a RateLimitedSession (or any session made by `factory`)
+    and builds it on first use. Every attribute is then forwarded to the real session.
+    """
+
+    def __init__(self, configure=None, factory=None):
+        """
+        Nothing is imported or built here.
+
+        Args:
+            configure (callable): Called with the new session right after it is built
+                (e.g. to set the rate limit of a host).
+            factory (callable): Builds the session. Defaults to common.rate_limiter.RateLimitedSession.
+        """
+        self._configure = configure
+        self._factory = factory
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def built(self):
+        """True once the real session exists."""
+        return self._session is not None
+
+    def get_session(self):
+        """Returns the real session, importing and building it the first time."""
+        with self._lock:
+            if self._session is None:
+                factory = self._factory
+                if factory is None:
+                    from common.rate_limiter import RateLimitedSession
+                    factory = RateLimitedSession
+                session = factory()
+                if self._configure is not None:
+                    self._configure(session)
+                self._session = session
+            return self._session
+
+    def __getattr__(self, name):
+        # Only called for attributes LazySession itself doesn't have
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return getattr(self.get_session(), name)
@@ -0,0 +1,366 @@
+"""
+Notification dispatcher shared by the day projects.
+
+A message is fanned out to every configured sink (SMS, email, webhook, file) at the
+same time. Each sink runs in its own worker thread and has its own timeout, so a slow
+or hanging sink only delays itself, never the other sinks or the caller's scan.
+
+Usage:
+    from common.notifications import NotificationDispatcher, SmsSink, sinks_from_env
+    sinks = [SmsSink.from_env(session=session)] + sinks_from_env(session=session)
+    dispatcher = NotificationDispatcher(sinks)
+    results = dispatcher.dispatch("TSLA: 🔺5%\\nHeadline: ...", subject="TSLA news")
+"""
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from datetime import datetime
+from email.message import EmailMessage
+import os
+import smtplib
+import threading
+import time
+import requests
+
+
+def error_status(error):
+    """
+    Returns the HTTP status carried by a sink error, if any.
+    Twilio's TwilioRestException has a `status`, a requests HTTPError has its `response`.
+
+    Returns:
+        int: The status code, or None (network errors, timeouts, SMTP errors...).
+    """
+    status = getattr(error, "status", None)
+    if isinstance(status, int):
+        return status
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_retryable_error(error):
+    """
+    Returns True if a sink error may go away on a later attempt: network errors and timeouts
+    (no status), throttling (429) and server errors (5xx). Other 4xx would fail again.
+    """
+    status = error_status(error)
+    return status is None or status == 429 or status >= 500
+
+
+class DeliveryError(Exception):
+    """
+    Raised by NotificationDispatcher.send() when a sink could not deliver the message.
+    `errors` keeps the exception of every failed sink. The message is worth retrying unless every
+    failed sink refused it with a client error (4xx other than 429, e.g. an invalid phone number);
+    `status` is then that status code, so callers that look at `status` don't retry either.
+    """
+
+    def __init__(self, message, results, errors=None):
+        super().__init__(message)
+        self.results = results
+        self.errors = errors or {}
+        statuses = [error_status(error) for error in self.errors.values()]
+        self.retryable = not statuses or any(is_retryable_error(error) for error in self.errors.values())
+        if not results:
+            # No sink at all: retrying can't deliver it either
+            self.retryable = False
+        self.status = None if self.retryable else next((status for status in statuses if status), None)
+
+
+class Sink:
+    """
+    This class is the base of every notification sink.
+    Subclasses implement send(), which raises on failure and may return a delivery id.
+    """
+    name = "sink"
+    timeout = 10     # Seconds the dispatcher waits for this sink
+
+    def send(self, body, subject):
+        raise NotImplementedError
+
+
+class SmsSink(Sink):
+    """
+    This class sends the message as an SMS through Twilio.
+    The Twilio client is only imported and built when the first SMS is sent.
+    """
+    name = "sms"
+
+    def __init__(self, account_sid, auth_token, from_number, to_number, session=None, timeout=15):
+        """
+        Args:
+            account_sid (str): Twilio account SID.
+            auth_token (str): Twilio auth token.
+            from_number (str): Twilio phone number.
+            to_number (str): Recipient phone number.
+            session (requests.Session): Shared session for Twilio's HTTP calls (e.g. a RateLimitedSession).
+            timeout (float): Seconds to wait for Twilio.
+        """
+        self.account_sid = account_sid
+        self.auth_token = auth_token
+        self.from_number = from_number
+        self.to_number = to_number
+        self.session = session
+        self.timeout = timeout
+        self._client = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, session=None, account_sid_var="TWILIO_ACCOUNT_SID", auth_token_var="TWILIO_AUTH_TOKEN",
+                 from_var="TWILIO_PHONE_NUMBER", to_var="TWILIO_TO_NUMBER"):
+        """
+        Builds the sink from environment variables (the names differ between the days).
+
+        Returns:
+            SmsSink: The sink, or None if any of the variables is missing.
+        """
+        values = [os.getenv(var) for var in (account_sid_var, auth_token_var, from_var, to_var)]
+        if not all(values):
+            return None
+        return cls(*values, session=session)
+
+    @property
+    def client(self):
+        """twilio.rest.Client: Created on first use."""
+        with self._lock:
+            if self._client is None:
+                from twilio.rest import Client
+                from twilio.http.http_client import TwilioHttpClient
+                http_client = TwilioHttpClient(pool_connections=True, timeout=self.timeout)
+                if self.session is not None:
+                    # A LazySession is swapped for the real session Twilio's client expects
+                    http_client.session = getattr(self.session, "get_session", lambda: self.session)()
+                self._client = Client(self.account_sid, self.auth_token, http_client=http_client)
+            return self._client
+
+    def send(self, body, subject):
+        message = self.client.messages.create(body=body, from_=self.from_number, to=self.to_number)
+        return message.sid
+
+
+class EmailSink(Sink):
+    """
+    This class sends the message by email through an SMTP server (e.g. a local relay).
+    """
+    name = "email"
+
+    def __init__(self, host, port, from_address, to_addresses, username=None, password=None,
+                 starttls=False, timeout=10):
+        """
+        Args:
+            host (str): SMTP server.
+            port (int): SMTP port.
+            from_address (str): Sender address.
+            to_addresses (list): Recipient addresses.
+            username (str): Login, if the server needs one.
+            password (str): Password for the login.
+            starttls (bool): Upgrade the connection with STARTTLS before logging in.
+            timeout (float): Socket timeout in seconds.
+        """
+        self.host = host
+        self.port = port
+        self.from_address = from_address
+        self.to_addresses = list(to_addresses)
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+
+    def send(self, body, subject):
+        message = EmailMessage()
+        message["Subject"] = subject
+        message["From"] = self.from_address
+        message["To"] = ", ".join(self.to_addresses)
+        message.set_content(body)
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+            smtp.send_message(message)
+        return None
+
+
+class WebhookSink(Sink):
+    """
+    This class POSTs the message as JSON ({"subject": ..., "text": ...}) to a webhook URL
+    (Slack, Discord, Teams and most chat tools accept a "text" field).
+    """
+    name = "webhook"
+
+    def __init__(self, url, session=None, timeout=5):
+        self.url = url
+        self.session = session or requests
+        self.timeout = timeout
+
+    def send(self, body, subject):
+        response = self.session.post(self.url, json={"subject": subject, "text": body}, timeout=self.timeout)
+        response.raise_for_status()
+        return response.status_code
+
+
+class FileSink(Sink):
+    """
+    This class appends the message to a text file (handy as a log of what was sent, or for dry runs).
+    """
+    name = "file"
+
+    def __init__(self, path, timeout=2):
+        self.path = path
+        self.timeout = timeout
+        self._lock = threading.Lock()
+
+    def send(self, body, subject):
+        entry = f"[{datetime.now().isoformat(timespec='seconds')}] {subject}\n{body}\n\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as file:
+            file.write(entry)
+        return self.path
+
+
+def sinks_from_env(session=None):
+    """
+    Builds the non-SMS sinks configured in the environment:
+    email (SMTP_HOST, SMTP_PORT, SMTP_USERNAME, SMTP_PASSWORD, SMTP_STARTTLS, NOTIFY_EMAIL_FROM, NOTIFY_EMAIL_TO),
+    webhook (NOTIFY_WEBHOOK_URL) and file (NOTIFY_FILE_PATH).
+
+    Args:
+        session (requests.Session): Shared session for the webhook calls.
+
+    Returns:
+        list: The configured sinks (possibly empty).
+    """
+    sinks = []
+    if os.getenv("SMTP_HOST") and os.getenv("NOTIFY_EMAIL_TO"):
+        sinks.append(EmailSink(
+            host=os.getenv("SMTP_HOST"),
+            port=int(os.getenv("SMTP_PORT", 25)),
+            from_address=os.getenv("NOTIFY_EMAIL_FROM", "alerts@localhost"),
+            to_addresses=[address.strip() for address in os.getenv("NOTIFY_EMAIL_TO").split(",") if address.strip()],
+            username=os.getenv("SMTP_USERNAME"),
+            password=os.getenv("SMTP_PASSWORD"),
+            starttls=os.getenv("SMTP_STARTTLS", "").lower() in ("1", "true", "yes"),
+        ))
+    if os.getenv("NOTIFY_WEBHOOK_URL"):
+        sinks.append(WebhookSink(os.getenv("NOTIFY_WEBHOOK_URL"), session=session))
+    if os.getenv("NOTIFY_FILE_PATH"):
+        sinks.append(FileSink(os.getenv("NOTIFY_FILE_PATH")))
+    return sinks
+
+
+class NotificationDispatcher:
+    """
+    This class fans every message out to all its sinks concurrently.
+    Each sink has a dedicated worker thread, so a sink that hangs only queues up its own messages.
+    """
+
+    # Messages whose sends are remembered for send() retries (oldest forgotten first)
+    MAX_TRACKED_MESSAGES = 128
+
+    def __init__(self, sinks):
+        """
+        Args:
+            sinks (list): Sink objects. None entries (e.g. from SmsSink.from_env) are ignored.
+        """
+        self.sinks = [sink for sink in sinks if sink is not None]
+        self._executors = {
+            id(sink): ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"sink-{sink.name}")
+            for sink in self.sinks
+        }
+        # (body, subject) -> {sink name: future} of the messages send() may be asked to retry
+        self._attempts = OrderedDict()
+        self._attempts_lock = threading.Lock()
+
+    @property
+    def sink_names(self):
+        """list: Names of the configured sinks."""
+        return [sink.name for sink in self.sinks]
+
+    def dispatch(self, body, subject=None):
+        """
+        Sends a message to every sink at once and waits at most each sink's timeout.
+
+        Args:
+            body (str): The message.
+            subject (str): Subject for the sinks that use one. Defaults to the first line of the body.
+
+        Returns:
+            dict: {sink name: True if delivered, False if it failed or timed out}.
+        """
+        return self._dispatch(body, subject)[0]
+
+    def _dispatch(self, body, subject, previous=None):
+        """
+        Sends a message to every sink (see dispatch()).
+
+        Args:
+            previous (dict): {sink name: future} of an earlier attempt. A sink whose earlier send
+                succeeded isn't sent the message again, and one still sending it (it timed out)
+                is waited for again instead of being sent a second copy.
+
+        Returns:
+            tuple: (results, {sink name: exception} for the sinks that failed, {sink name: future})
+        """
+        subject = subject or body.strip().split("\n", 1)[0][:78]
+        started_at = time.monotonic()
+        previous = previous or {}
+        futures = {}
+        for sink in self.sinks:
+            future = previous.get(sink.name)
+            if future is None or (future.done() and future.exception() is not None):
+                future = self._executors[id(sink)].submit(sink.send, body, subject)
+            futures[sink.name] = future
+
+        results = {}
+        errors = {}
+        for sink in self.sinks:
+            remaining = max(0.0, sink.timeout - (time.monotonic() - started_at))
+            try:
+                futures[sink.name].result(timeout=remaining)
+                results[sink.name] = True
+            except TimeoutError as e:
+                print(f"⏱️ Notification sink '{sink.name}' timed out after {sink.timeout}s")
+                results[sink.name] = False
+                errors[sink.name] = e
+            except Exception as e:
+                print(f"❌ Notification sink '{sink.name}' failed: {e}")
+                results[sink.name] = False
+                errors[sink.name] = e
+        return results, errors, futures
+
+    def send(self, body, subject=None):
+        """
+        Dispatches a message and raises if a sink may still deliver it later (so callers can retry).
+        A retry of the same message only goes to the sinks that haven't delivered it yet.
+
+        Returns:
+            str: The sinks that delivered the message, e.g. "sms, file".
+
+        Raises:
+            DeliveryError: If a sink failed with an error worth retrying (network error, timeout,
+                429, 5xx), or if no sink delivered it at all (or there are no sinks). Its `retryable`
+                is False when every failed sink refused the message with a 4xx other than 429.
+        """
+        key = (body, subject)
+        with self._attempts_lock:
+            previous = self._attempts.pop(key, None)
+        results, errors, futures = self._dispatch(body, subject, previous)
+        delivered = [name for name, ok in results.items() if ok]
+        retryable = [name for name, error in errors.items() if is_retryable_error(error)]
+
+        if retryable:
+            # Remembered so the retry skips the sinks that delivered and waits for the ones still sending
+            with self._attempts_lock:
+                self._attempts[key] = futures
+                while len(self._attempts) > self.MAX_TRACKED_MESSAGES:
+                    self._attempts.popitem(last=False)
+        if not delivered:
+            raise DeliveryError("no notification sink delivered the message", results, errors)
+        if retryable:
+            raise DeliveryError(f"not delivered by {', '.join(retryable)} yet (delivered by "
+                                f"{', '.join(delivered)})", results, errors)
+        return ", ".join(delivered)
+
+    def close(self):
+        """Stops the sink workers (messages still being sent are not waited for)."""
+        for executor in self._executors.values():
+            executor.shutdown(wait=False)
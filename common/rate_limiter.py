@@ -0,0 +1,304 @@
+"""
+Shared rate limiting for every API used in the day projects.
+
+Each host gets a token bucket (requests per second + burst) and an adaptive
+concurrency limit (AIMD: +1 slot per window of successes, halved when throttled).
+429 / Retry-After responses and Alpha Vantage's "Note" messages pause the host
+and the request is retried, so parallel runs go as fast as the quota allows.
+
+Usage:
+    from common.rate_limiter import RateLimitedSession
+    session = RateLimitedSession()
+    response = session.get("https://www.alphavantage.co/query", params=...)
+"""
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+import math
+import threading
+import time
+import requests
+
+# Known quotas (requests per second, burst, maximum concurrent requests)
+DEFAULT_HOST_LIMITS = {
+    "test.api.amadeus.com": (10, 10, 10),       # 10 TPS in the test environment
+    "api.amadeus.com": (40, 40, 20),
+    "api.sheety.co": (2, 4, 4),
+    "www.alphavantage.co": (5 / 60, 1, 1),      # Free tier: 5 calls per minute
+    "newsapi.org": (1, 5, 4),
+    "trackapi.nutritionix.com": (2, 4, 4),
+    "pixe.la": (2, 4, 4),
+    "api.twilio.com": (1, 1, 1),                # One SMS per second per number
+}
+# Used for hosts that are not in the table above
+DEFAULT_LIMIT = (5, 10, 8)
+
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_SECONDS = 1.0
+MAX_RETRY_WAIT_SECONDS = 120     # Longer Retry-After values are not waited for, the response is returned
+# Streamed bodies up to this size are still read by the throttle detectors (quota messages are small)
+MAX_STREAMED_INSPECT_BYTES = 4096
+
+
+def parse_retry_after(response):
+    """
+    Reads the Retry-After header of a response.
+
+    Args:
+        response (requests.Response): The throttled response.
+
+    Returns:
+        float: Seconds to wait, or None if the header is missing or invalid.
+    """
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_small_body(response):
+    """True if the response announces a body short enough to be read before it is streamed."""
+    try:
+        return 0 <= int(response.headers.get("Content-Length", -1)) <= MAX_STREAMED_INSPECT_BYTES
+    except ValueError:
+        return False
+
+
+def alphavantage_throttle(response):
+    """
+    Alpha Vantage answers 200 OK with a "Note" (per-minute limit) or an "Information"
+    (daily limit) message instead of data when the quota is exceeded.
+
+    Returns:
+        float: Seconds to wait before retrying, math.inf if retrying is pointless, None if not throttled.
+    """
+    if response.status_code != 200 or "json" not in response.headers.get("Content-Type", "json"):
+        return None
+    try:
+        data = response.json()
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+    if "Note" in data:
+        return 60.0
+    if "Information" in data and "rate limit" in str(data["Information"]).lower():
+        # Daily quota exhausted, retrying today won't help
+        return math.inf
+    return None
+
+
+# Host-specific throttle detectors on top of the standard 429 handling
+THROTTLE_DETECTORS = {
+    "www.alphavantage.co": alphavantage_throttle,
+}
+
+
+class TokenBucket:
+    """
+    This class is a thread-safe token bucket: `rate` tokens per second, up to `capacity` saved up.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until one token is available (and any pause requested by the server is over)."""
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            # Taking the token now (even below zero) reserves a place in line for this caller
+            self.tokens -= 1
+            wait = max(-self.tokens / self.rate, self.paused_until - now)
+        if wait > 0:
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Stops handing out tokens for `seconds` (used for Retry-After)."""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class AdaptiveConcurrency:
+    """
+    This class limits the number of requests in flight with AIMD:
+    the limit grows by one after a full window of successes and is halved when throttled.
+    """
+
+    def __init__(self, maximum, minimum=1, initial=None):
+        self.maximum = max(1, maximum)
+        self.minimum = max(1, min(minimum, self.maximum))
+        self.limit = float(initial or self.maximum)
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """Blocks until a request slot is free."""
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self, throttled=False):
+        """
+        Frees a slot and adapts the limit.
+
+        Args:
+            throttled (bool): True if the request was rejected for exceeding the quota.
+        """
+        with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(self.minimum, self.limit / 2)
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+
+class HostRateLimiter:
+    """
+    This class combines the token bucket and the adaptive concurrency limit of one host.
+    """
+
+    def __init__(self, host, requests_per_second, burst, max_concurrency):
+        self.host = host
+        self.bucket = TokenBucket(requests_per_second, burst)
+        self.concurrency = AdaptiveConcurrency(max_concurrency)
+        self.throttle_detector = THROTTLE_DETECTORS.get(host)
+        self.throttled_count = 0
+
+    def acquire(self):
+        """Waits for a concurrency slot and a token."""
+        self.concurrency.acquire()
+        self.bucket.acquire()
+
+    def release(self, throttled=False):
+        """Frees the slot, feeding back whether the request was throttled."""
+        if throttled:
+            self.throttled_count += 1
+        self.concurrency.release(throttled)
+
+    def check_throttled(self, response, streamed=False):
+        """
+        Checks whether a response means "slow down".
+
+        Args:
+            response (requests.Response): The response.
+            streamed (bool): True if the body must not be read here
+                (unless its Content-Length is small enough to be a quota message).
+
+        Returns:
+            float: Seconds to wait before retrying (0 = unknown, math.inf = don't retry), None if not throttled.
+        """
+        if response.status_code == 429 or (response.status_code == 503 and "Retry-After" in response.headers):
+            retry_after = parse_retry_after(response)
+            # 0 = no hint from the server, send() falls back to exponential backoff
+            return retry_after if retry_after is not None else 0.0
+        if self.throttle_detector and (not streamed or _is_small_body(response)):
+            return self.throttle_detector(response)
+        return None
+
+
+class RateLimiterRegistry:
+    """
+    This class hands out one HostRateLimiter per host, using the known quotas by default.
+    """
+
+    def __init__(self, host_limits=None):
+        """
+        Args:
+            host_limits (dict): {host: (requests_per_second, burst, max_concurrency)} overriding the defaults.
+        """
+        self.host_limits = dict(DEFAULT_HOST_LIMITS)
+        self.host_limits.update(host_limits or {})
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def configure(self, host, requests_per_second, burst=None, max_concurrency=None):
+        """
+        Sets the quota of a host (replacing its limiter).
+
+        Args:
+            host (str): Host name or URL, e.g. "api.sheety.co" or "https://api.sheety.co/...".
+            requests_per_second (float): Sustained request rate (0 = unlimited).
+            burst (float): Requests allowed at once after an idle period. Defaults to the rate (at least 1).
+            max_concurrency (int): Maximum requests in flight. Defaults to the burst.
+        """
+        host = urlparse(host).netloc if "://" in host else host
+        burst = burst if burst is not None else max(1, requests_per_second)
+        max_concurrency = max_concurrency if max_concurrency is not None else max(1, int(burst))
+        with self._lock:
+            self.host_limits[host] = (requests_per_second, burst, max_concurrency)
+            self._limiters.pop(host, None)
+
+    def for_url(self, url):
+        """Returns the limiter of the URL's host, creating it on first use."""
+        host = urlparse(url).netloc
+        with self._lock:
+            limiter = self._limiters.get(host)
+            if limiter is None:
+                rate, burst, max_concurrency = self.host_limits.get(host, DEFAULT_LIMIT)
+                limiter = HostRateLimiter(host, rate, burst, max_concurrency)
+                self._limiters[host] = limiter
+            return limiter
+
+
+class RateLimitedSession(requests.Session):
+    """
+    This class is a requests.Session whose requests all go through the per-host rate limiters.
+    Throttled requests are retried after Retry-After (or an exponential backoff), up to max_retries.
+    Rate limiting happens in send(), so clients that call send() directly (like Twilio's) are covered too.
+    """
+
+    def __init__(self, rate_limits=None, max_retries=DEFAULT_MAX_RETRIES):
+        """
+        Args:
+            rate_limits (RateLimiterRegistry): Limiters to use. Sessions can share one registry.
+            max_retries (int): Retries for throttled requests.
+        """
+        super().__init__()
+        self.rate_limits = rate_limits or RateLimiterRegistry()
+        self.max_retries = max_retries
+
+    def send(self, request, **kwargs):
+        """Sends a prepared request through the host's rate limiter, retrying when throttled."""
+        limiter = self.rate_limits.for_url(request.url)
+        streamed = kwargs.get("stream", False)
+
+        for attempt in range(self.max_retries + 1):
+            limiter.acquire()
+            try:
+                response = super().send(request, **kwargs)
+            except BaseException:
+                limiter.release()
+                raise
+
+            retry_after = limiter.check_throttled(response, streamed)
+            limiter.release(throttled=retry_after is not None)
+            if retry_after is None:
+                return response
+
+            wait = retry_after if retry_after > 0 else DEFAULT_BACKOFF_SECONDS * 2 ** attempt
+            if attempt == self.max_retries or wait > MAX_RETRY_WAIT_SECONDS:
+                print(f"⚠️ {limiter.host} is still throttling, giving up after {attempt + 1} attempts")
+                return response
+
+            print(f"⏳ {limiter.host} throttled the request, retrying in {wait:.1f}s")
+            limiter.bucket.pause(wait)
+            response.close()
+
+        return response
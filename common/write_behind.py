@@ -0,0 +1,317 @@
+"""
+Write-behind queue shared by the day projects.
+
+Writes to slow or flaky APIs (Sheety takes about a second per row and has no bulk endpoint)
+are stored in a local SQLite database (WAL mode, synced to disk) and the caller returns right
+away. A background flusher sends them in order, a batch at a time, and backs off while the API
+is down. Nothing is lost on a failure or a crash: whatever was not sent stays in the database
+and is sent by the next run that opens the same queue.
+
+Usage:
+    from common.write_behind import WriteBehindQueue
+    queue = WriteBehindQueue(session, "sheety_queue.sqlite3", headers={"Authorization": "Basic ..."})
+    queue.put("POST", endpoint, {"workout": row})
+    stats = queue.close(timeout=30)     # Sends what it can, the rest waits for the next run
+"""
+import json
+import sqlite3
+import threading
+import time
+import requests
+
+DEFAULT_BATCH_SIZE = 20
+DEFAULT_RETRY_BACKOFF_SECONDS = 1.0
+DEFAULT_MAX_BACKOFF_SECONDS = 60.0
+DEFAULT_TIMEOUT = (5, 30)        # (connect, read) seconds, so close() never hangs on a dead connection
+# Throttling, timeouts and server errors are retried; any other 4xx would fail again
+RETRYABLE_STATUS_CODES = (408, 425, 429)
+
+
+def _is_retryable(status_code):
+    """Returns True if a write rejected with this status may succeed later."""
+    return status_code in RETRYABLE_STATUS_CODES or status_code >= 500
+
+
+class WriteBehindQueue:
+    """
+    This class queues HTTP writes in a durable local database and sends them from a background thread.
+    Writes are sent one after the other in the order they were queued (so appended rows keep
+    their order). A write the API can't accept now (network error, 429, 5xx) pauses the flusher
+    with an exponential backoff; a write the API refuses (other 4xx) is kept aside as failed
+    instead of blocking the ones behind it.
+    """
+
+    def __init__(self, session, path, headers=None, auth=None, batch_size=DEFAULT_BATCH_SIZE,
+                 retry_backoff=DEFAULT_RETRY_BACKOFF_SECONDS, max_backoff=DEFAULT_MAX_BACKOFF_SECONDS,
+                 timeout=DEFAULT_TIMEOUT, on_sent=None, payload_variants=None):
+        """
+        Opens (or creates) the queue database and starts the flusher, which first sends
+        whatever an earlier run left behind.
+
+        Args:
+            session (requests.Session): Session used for the writes (e.g. a RateLimitedSession).
+            path (str): Location of the SQLite file.
+            headers (dict): Headers added to every write (they are not stored on disk).
+            auth (tuple): Basic Auth credentials added to every write (not stored on disk either).
+            batch_size (int): Writes read from the database per round.
+            retry_backoff (float): First pause after a failed write (doubled after each failure).
+            max_backoff (float): Longest pause between two attempts.
+            timeout (float/tuple): Timeout of each write.
+            on_sent (callable): Called by the flusher with (meta, payload) after each write is accepted.
+            payload_variants (callable): Called by the flusher with (meta, payload), returns the bodies
+                to try in order (e.g. the same data under different root keys). A body the API
+                refuses falls through to the next one. Only the stored payload is sent if omitted.
+        """
+        self.session = session
+        self.path = path
+        self.headers = headers or {}
+        self.auth = auth
+        self.batch_size = batch_size
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.on_sent = on_sent
+        self.payload_variants = payload_variants
+        self.stats = {"queued": 0, "sent": 0, "failed": 0, "retries": 0}
+
+        self._lock = threading.Lock()
+        self._changed = threading.Condition()
+        self._resume_at = 0.0
+        self._failures_in_a_row = 0
+        self._closing = False
+
+        # The connection is shared by the producers and the flusher, access is serialized with the lock
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        # WAL lets a queued write be committed without waiting for the flusher, FULL syncs every commit
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=FULL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS writes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                method TEXT NOT NULL,
+                url TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                meta TEXT,
+                queued_at REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                failed INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT
+            )
+            """
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS idx_failed ON writes (failed, id)")
+        self._connection.commit()
+
+        self._worker = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._worker.start()
+
+    def put(self, method, url, payload, meta=None):
+        """
+        Queues a write and returns as soon as it is on disk.
+
+        Args:
+            method (str): HTTP method, e.g. "POST" or "PUT".
+            url (str): Target URL.
+            payload (dict): JSON body.
+            meta (dict): JSON data handed back to on_sent (e.g. which row the write is for).
+
+        Returns:
+            int: Id of the queued write.
+        """
+        return self.put_many([(method, url, payload, meta)])[-1]
+
+    def put_many(self, writes):
+        """
+        Queues several writes in one transaction.
+
+        Args:
+            writes (list): (method, url, payload, meta) tuples, in the order they must be sent.
+
+        Returns:
+            list: Ids of the queued writes.
+        """
+        now = time.time()
+        ids = []
+        with self._lock:
+            for method, url, payload, meta in writes:
+                cursor = self._connection.execute(
+                    "INSERT INTO writes (method, url, payload, meta, queued_at) VALUES (?, ?, ?, ?, ?)",
+                    (method.upper(), url, json.dumps(payload), json.dumps(meta) if meta is not None else None, now)
+                )
+                ids.append(cursor.lastrowid)
+            self._connection.commit()
+            self.stats["queued"] += len(ids)
+        with self._changed:
+            self._changed.notify_all()
+        return ids
+
+    def pending(self):
+        """Returns the number of writes not sent yet (failed ones not included)."""
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM writes WHERE failed = 0").fetchone()[0]
+
+    def failed(self):
+        """
+        Returns the writes the API refused.
+
+        Returns:
+            list: (id, method, url, payload, last_error) tuples, oldest first.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT id, method, url, payload, last_error FROM writes WHERE failed = 1 ORDER BY id"
+            ).fetchall()
+        return [(row_id, method, url, json.loads(payload), error) for row_id, method, url, payload, error in rows]
+
+    def retry_failed(self):
+        """
+        Queues the refused writes again (e.g. after fixing the sheet's columns).
+
+        Returns:
+            int: Number of writes queued again.
+        """
+        with self._lock:
+            count = self._connection.execute("UPDATE writes SET failed = 0 WHERE failed = 1").rowcount
+            self._connection.commit()
+        with self._changed:
+            self._changed.notify_all()
+        return count
+
+    def flush(self, timeout=None):
+        """
+        Waits until every queued write has been sent (a pending backoff is skipped once).
+
+        Args:
+            timeout (float): Maximum seconds to wait. Waits as long as needed if omitted.
+
+        Returns:
+            bool: True if nothing is left to send.
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._changed:
+            self._resume_at = 0.0
+            self._changed.notify_all()
+        while self.pending():
+            remaining = deadline - time.monotonic() if deadline is not None else 1.0
+            if remaining <= 0 or not self._worker.is_alive():
+                return False
+            with self._changed:
+                self._changed.wait(min(remaining, 1.0))
+        return True
+
+    def close(self, timeout=None):
+        """
+        Sends what it can within the timeout, stops the flusher and closes the database.
+        Writes still queued are kept on disk for the next run.
+
+        Args:
+            timeout (float): Maximum seconds to wait for the writes to be sent.
+
+        Returns:
+            dict: Counters (queued, sent, failed, retries) plus "pending", the writes left on disk.
+        """
+        self.flush(timeout)
+        with self._changed:
+            self._closing = True
+            self._changed.notify_all()
+        # A write in flight is allowed to finish so it isn't sent twice by the next run
+        self._worker.join()
+        with self._lock:
+            pending = self._connection.execute("SELECT COUNT(*) FROM writes WHERE failed = 0").fetchone()[0]
+            self._connection.close()
+        return dict(self.stats, pending=pending)
+
+    def _next_batch(self):
+        """Reads the oldest writes that still have to be sent."""
+        with self._lock:
+            return self._connection.execute(
+                "SELECT id, method, url, payload, meta FROM writes WHERE failed = 0 ORDER BY id LIMIT ?",
+                (self.batch_size,)
+            ).fetchall()
+
+    def _run(self):
+        """Flusher loop: sends the queued writes batch by batch, sleeping while idle or backing off."""
+        while True:
+            with self._changed:
+                while not self._closing:
+                    wait = self._resume_at - time.monotonic()
+                    if wait <= 0 and self._has_pending():
+                        break
+                    self._changed.wait(wait if wait > 0 else None)
+                if self._closing:
+                    return
+
+            for row in self._next_batch():
+                if not self._send(*row):
+                    break
+                if self._closing:
+                    return
+            with self._changed:
+                self._changed.notify_all()
+
+    def _has_pending(self):
+        """Returns True if at least one write waits to be sent."""
+        with self._lock:
+            return self._connection.execute("SELECT 1 FROM writes WHERE failed = 0 LIMIT 1").fetchone() is not None
+
+    def _send(self, write_id, method, url, payload, meta):
+        """
+        Sends one write (trying each payload variant until one is accepted) and records the outcome.
+
+        Returns:
+            bool: False if the flusher must back off before the next write.
+        """
+        payload = json.loads(payload)
+        meta = json.loads(meta) if meta else None
+        bodies = (self.payload_variants(meta, payload) if self.payload_variants else None) or [payload]
+
+        for body in bodies:
+            try:
+                response = self.session.request(method, url, json=body, headers=self.headers, auth=self.auth,
+                                                timeout=self.timeout)
+                status_code = response.status_code
+                error = None if response.ok else f"HTTP {status_code}: {response.text[:200]}"
+            except requests.exceptions.RequestException as e:
+                status_code = None
+                error = str(e)
+
+            if error is None:
+                with self._lock:
+                    self._connection.execute("DELETE FROM writes WHERE id = ?", (write_id,))
+                    self._connection.commit()
+                self.stats["sent"] += 1
+                self._failures_in_a_row = 0
+                if self.on_sent:
+                    try:
+                        self.on_sent(meta, body)
+                    except Exception as e:
+                        print(f"⚠️ Write-behind callback failed: {e}")
+                return True
+
+            if status_code is None or _is_retryable(status_code):
+                break
+            # Refused: the next variant may be accepted
+        else:
+            print(f"❌ {method} {url} refused ({error}), kept aside as failed")
+            with self._lock:
+                self._connection.execute(
+                    "UPDATE writes SET failed = 1, attempts = attempts + 1, last_error = ? WHERE id = ?",
+                    (error, write_id)
+                )
+                self._connection.commit()
+            self.stats["failed"] += 1
+            return True
+
+        with self._lock:
+            self._connection.execute(
+                "UPDATE writes SET attempts = attempts + 1, last_error = ? WHERE id = ?", (error, write_id)
+            )
+            self._connection.commit()
+        wait = min(self.max_backoff, self.retry_backoff * 2 ** self._failures_in_a_row)
+        self._failures_in_a_row += 1
+        self.stats["retries"] += 1
+        print(f"⏳ {method} {url} failed ({error}), retrying in {wait:.1f}s")
+        with self._changed:
+            self._resume_at = time.monotonic() + wait
+        return False